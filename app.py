@@ -1,11 +1,32 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
-from io import BytesIO
-import pydeck as pdk
+import os
+import threading
+import time
+
+from ingest import is_year_col
+from instrumentation import MetricsRegistry, Profiler
+from pipeline import DerivedColumns, FrameCache, filter_key
+from query import query_backend
+from render import RENDER_MAX_WORKERS, RENDER_TIMEOUT, RenderBatch, RenderScheduler
+from prepare import (
+    cagr_extremes, coord_rows, idh_frame, labeled, map_cells, map_points, ranking_comparison, scatter_sample,
+    state_order, valid_frame,
+)
+from charts import (
+    deck_colunas, fig_cagr_municipios, fig_idh_estado, fig_idh_porte, fig_idh_ranking, fig_mapa, fig_pib_estado,
+    fig_pib_porte, fig_pop_pib, fig_populacao_bioma, fig_populacao_estado, fig_tendencia_estados,
+    fig_top_populacao,
+    SCATTER_MAX_POINTS, figure_nbytes, deck_nbytes,
+)
+from cube import AggregateCube
+from export import EXPORT_FORMATS, ExportCache
+from indexes import FilterIndex, RankingIndex
+from maps import GridPyramid, deck_payload, elevation_table
+from sources import Dataset, source_for
+from spatial import SpatialIndex, region_summary
+from timeseries import TimeSeriesStore, series_columns
 
 # Configuração da página
 st.set_page_config(
@@ -54,18 +75,133 @@ st.markdown("""
 # Header
 st.markdown('<div class="main-header">📊 Dashboard IBGE Cidades — Análise — Stremilit</div>', unsafe_allow_html=True)
 
-@st.cache_data
-def load_df(path="dados_lista.csv"):
-    df = pd.read_csv(path, sep=",", encoding="utf-8")
-    return df
+@st.cache_resource
+def get_metrics_registry():
+    # Acumulado de tempos/bytes/cache de todos os reruns do processo
+    return MetricsRegistry()
+
+# Spans do rerun atual (carga, filtros, cada gráfico e mapa)
+profiler = Profiler(get_metrics_registry())
+# Painel de desempenho na sidebar: IBGE_ADMIN=1 ou ?admin=1 na URL
+ADMIN = os.environ.get("IBGE_ADMIN") == "1" or st.query_params.get("admin") == "1"
+# Arquivo para o textfile collector do Prometheus (opcional)
+METRICS_FILE = os.environ.get("IBGE_METRICAS")
+
+# Fonte dos dados: CSV, Parquet, SQLite ou DuckDB (tabela "municipios")
+DATA_PATH = os.environ.get("IBGE_DADOS", "dados_lista.csv")
+# Backend opcional de consultas ("sqlite" ou "duckdb"); vazio usa cubo e índices
+QUERY_BACKEND = os.environ.get("IBGE_CONSULTAS", "").lower()
+# Threads que montam os gráficos em paralelo (0 = sequencial, na thread do
+# script) e prazo em segundos de cada gráfico antes de exibir o aviso
+RENDER_THREADS = int(os.environ.get("IBGE_GRAFICOS_THREADS", RENDER_MAX_WORKERS))
+RENDER_TIMEOUT_S = float(os.environ.get("IBGE_GRAFICOS_PRAZO", RENDER_TIMEOUT))
+
+@st.cache_resource
+def get_dataset(path):
+    # Snapshot da fonte compartilhado pelo processo; uma nova exportação é
+    # aplicada incrementalmente (por codigo_ibge), sem reiniciar o app
+    return Dataset(source_for(path))
+
+dataset = get_dataset(DATA_PATH)
+with profiler.span("fonte"):
+    data_changes = dataset.refresh()
+data_version = dataset.version
+if data_changes is not None:
+    st.toast("🔄 Dados atualizados" + ("" if data_changes.full else f": {len(data_changes):,} municípios alterados"))
+
+def load_clean_df(columns):
+    # Frame tipado compartilhado entre sessões; usado só para leitura
+    return dataset.frame(columns)
+
+@st.cache_resource(max_entries=16)
+def load_cube(columns, pop_col, bioma_col, version):
+    # Cubo (estado, bioma, porte) do ano de população escolhido, corrigido
+    # a partir do da versão anterior quando a atualização é incremental
+    metric_cols = [c for c in columns if is_year_col(c)]
+    df = load_clean_df(columns)
+    return dataset.derived(("cubo", columns, pop_col, bioma_col), version,
+                           lambda: AggregateCube(df, pop_col, metric_cols, bioma_col),
+                           lambda cube, changes: cube.patch(df, changes))
+
+@st.cache_resource(max_entries=16)
+def load_filter_index(columns, version):
+    # Bitmaps por estado e ordem por população, montados uma vez por frame
+    pop_cols = [c for c in columns if c.startswith("populacao_estimada_")]
+    df = load_clean_df(columns)
+    return dataset.derived(("filtros", columns), version,
+                           lambda: FilterIndex(df, pop_cols),
+                           lambda index, changes: index.patch(df, changes))
+
+@st.cache_resource(max_entries=16)
+def load_ranking_index(columns, version):
+    # Ordem pré-calculada de cada coluna anual para os rankings
+    df = load_clean_df(columns)
+    return dataset.derived(("rankings", columns), version,
+                           lambda: RankingIndex(df, [c for c in columns if is_year_col(c)]),
+                           lambda index, changes: index.patch(df, changes))
+
+@st.cache_resource(max_entries=16)
+def load_derived(columns, version):
+    # Porte por ano, rótulos "Município - UF" e presença de valores, uma vez por frame
+    pop_cols = [c for c in columns if c.startswith("populacao_estimada_")]
+    return DerivedColumns(load_clean_df(columns), pop_cols, [c for c in columns if is_year_col(c)])
+
+@st.cache_resource(max_entries=16)
+def load_map_grid(columns, version):
+    # Células do quadtree de cada município, calculadas na carga
+    return GridPyramid(load_clean_df(columns))
+
+@st.cache_resource(max_entries=16)
+def load_spatial_index(columns, version):
+    # Grade de coordenadas para consultas de raio e vizinhos mais próximos
+    return SpatialIndex(load_clean_df(columns))
+
+@st.cache_resource(max_entries=16)
+def load_elevations(columns, version):
+    # Alturas do mapa 3D normalizadas por ano de população
+    pop_cols = [c for c in columns if c.startswith("populacao_estimada_")]
+    return elevation_table(load_clean_df(columns), pop_cols)
+
+@st.cache_resource(max_entries=16)
+def load_timeseries(columns, version):
+    # Matrizes município × ano de todos os indicadores, montadas uma vez
+    return TimeSeriesStore(load_clean_df(columns))
+
+@st.cache_resource(max_entries=2)
+def load_query_backend(kind, version):
+    # Motor embutido carregado uma vez por processo e versão dos dados
+    return query_backend(kind, dataset.path)
+
+@st.cache_resource
+def get_frame_cache():
+    # Um único LRU por processo: sessões com os mesmos filtros compartilham entradas
+    cache = FrameCache(max_bytes=256 * 1024 ** 2)
+    get_metrics_registry().watch_cache("frames", cache)
+    return cache
+
+@st.cache_resource
+def get_figure_cache():
+    # Figuras prontas por (gráfico, filtros, ...), compartilhadas entre sessões;
+    # o custo de cada entrada é o tamanho do spec serializado
+    cache = FrameCache(max_bytes=128 * 1024 ** 2, sizeof=figure_nbytes)
+    get_metrics_registry().watch_cache("figuras", cache)
+    return cache
 
-# Load data
-with st.spinner("🔄 Carregando dados..."):
-    df = load_df()
+@st.cache_resource
+def get_render_scheduler(max_workers):
+    # Pool de montagem de figuras compartilhado por todas as sessões
+    return RenderScheduler(max_workers)
+
+@st.cache_resource
+def get_export_cache():
+    # Exportações prontas em disco, reaproveitadas entre downloads e sessões
+    return ExportCache(max_files=32)
+
+all_cols = dataset.columns()
 
 # Helper functions
 def available_year_cols(prefix):
-    cols = [c for c in df.columns if c.startswith(prefix + "_")]
+    cols = [c for c in all_cols if c.startswith(prefix + "_")]
     def year_of(c):
         parts = c.rsplit("_", 1)
         try:
@@ -76,15 +212,16 @@ def available_year_cols(prefix):
 
 pop_cols = available_year_cols("populacao_estimada")
 pib_cols = available_year_cols("pib_per_capita")
-idh_cols = [c for c in df.columns if c.startswith("idh_")]
-bioma_cols = [c for c in df.columns if c.startswith("bioma_")]
+idh_cols = [c for c in all_cols if c.startswith("idh_")]
+bioma_cols = [c for c in all_cols if c.startswith("bioma_")]
+bioma_col = bioma_cols[-1] if bioma_cols else None
 
 # ============ SIDEBAR ============
 st.sidebar.markdown("## 🎯 Filtros de Análise")
 
 # Filtros
-if "estado" in df.columns:
-    estados = sorted(df["estado"].dropna().unique())
+if "estado" in all_cols:
+    estados = sorted(load_clean_df(("estado",))["estado"].dropna().unique())
     estado_sel = st.sidebar.multiselect(
         "🗺️ Estados",
         estados,
@@ -100,10 +237,18 @@ pop_col = st.sidebar.selectbox("Ano - População", pop_cols, index=len(pop_cols
 pib_col = st.sidebar.selectbox("Ano - PIB per capita", pib_cols, index=len(pib_cols)-1) if pib_cols else None
 idh_col = st.sidebar.selectbox("Ano - IDH", idh_cols, index=len(idh_cols)-1) if idh_cols else None
 
+# Load data (somente as colunas usadas nesta sessão)
+session_cols = [
+    c for c in ["municipio", "estado", "latitude", "longitude", bioma_col, pop_col, pib_col, idh_col]
+    if c and c in all_cols
+]
+with st.spinner("🔄 Carregando dados..."), profiler.span("carga") as span:
+    df = load_clean_df(tuple(session_cols))
+    span.rows = len(df)
+
 # Filtro de população
 if pop_col:
-    tmp = pd.to_numeric(df[pop_col], errors="coerce")
-    max_pop = int(np.nanmax(tmp.fillna(0)))
+    max_pop = int(np.nanmax(df[pop_col].fillna(0)))
     min_pop = st.sidebar.slider(
         "👥 População mínima",
         0, max_pop, 0,
@@ -116,32 +261,113 @@ else:
 # Top N
 top_n = st.sidebar.slider("🏆 Top N municípios", 5, 50, 15, 5)
 
-# Apply filters
-df_filtered = df.copy()
-if estado_sel and "estado" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["estado"].isin(estado_sel)]
-if pop_col:
-    df_filtered[pop_col] = pd.to_numeric(df_filtered[pop_col], errors="coerce")
-    df_filtered = df_filtered[df_filtered[pop_col].fillna(0) >= min_pop]
+# Apply filters (memoizado pelo estado dos filtros)
+frame_cache = get_frame_cache()
+fkey = filter_key(estado_sel, pop_col, pib_col, idh_col, min_pop, data_version)
+
+def cached_get(cache, key, compute):
+    # get_or_compute anotando acerto/falta no span aberto
+    computed = []
+    value = cache.get_or_compute(key, lambda: computed.append(True) or compute())
+    if profiler.current is not None:
+        profiler.current.cache(hit=not computed)
+    return value
+
+def cached_frame(*name, compute):
+    value = cached_get(frame_cache, (fkey,) + name, compute)
+    span = profiler.current
+    if span is not None and hasattr(value, "__len__") and not isinstance(value, tuple):
+        span.rows = max(span.rows or 0, len(value))
+    return value
+
+with profiler.span("filtros") as span:
+    filter_index = load_filter_index(tuple(session_cols), data_version)
+    filter_mask = cached_frame("mask", compute=lambda: filter_index.mask(estado_sel, pop_col, min_pop))
+    span.rows = int(filter_mask.sum())
+
+figure_cache = get_figure_cache()
+
+def cached_figure(chart_id, *extra, build):
+    # fkey já inclui os anos selecionados; extra cobre parâmetros como top_n
+    key = (chart_id, fkey) + extra
+    fig = cached_get(figure_cache, key, build)
+    if profiler.current is not None:
+        profiler.current.bytes = figure_cache.size_of(key)
+    return fig
+
+render_batch = RenderBatch(get_render_scheduler(RENDER_THREADS), RENDER_TIMEOUT_S)
+
+def schedule(span_name, key, build, draw, cached=False):
+    # Reserva o lugar do gráfico na página e agenda a montagem no pool; o
+    # desenho acontece no fim do script. O span vai do agendamento ao desenho,
+    # e a montagem anota nele linhas, bytes e cache.
+    # As funções de montagem não chamam st.* nem funções com st.cache_*,
+    # que precisam da thread do script.
+    slot = st.empty()
+    slot.caption(f"⏳ Preparando {span_name}...")
+    span = profiler.begin(span_name)
+
+    def run():
+        with profiler.bind(span):
+            return build()
+
+    render_batch.add(key, run, (slot, span, draw), inline=cached)
+
+def show_figure(span_name, chart_id, *extra, build):
+    key = (chart_id, fkey) + extra
+    schedule(span_name, key,
+             lambda: cached_figure(chart_id, *extra, build=build),
+             lambda fig: st.plotly_chart(fig, use_container_width=True),
+             cached=figure_cache.size_of(key) is not None)
+ranking_index = None if QUERY_BACKEND else load_ranking_index(tuple(session_cols), data_version)
+derived = load_derived(tuple(session_cols), data_version)
+
+# Agregados por estado/bioma saem do cubo, sem varrer municípios; com o
+# backend de consultas, saem de consultas agregadas (mesma interface)
+cube_view = None
+query_view = None
+if QUERY_BACKEND:
+    cube_view = query_view = load_query_backend(QUERY_BACKEND, data_version).view(estado_sel, pop_col, min_pop)
+elif pop_col and "estado" in df.columns:
+    cube_view = load_cube(tuple(session_cols), pop_col, bioma_col, data_version).select(estado_sel, min_pop)
 
 # Sidebar info
 st.sidebar.markdown("---")
-st.sidebar.metric("📊 Registros Filtrados", f"{len(df_filtered):,}")
+# Contagem e total saem do cubo (ou da consulta); sem cubo, da máscara,
+# sem materializar as linhas filtradas
+n_filtered = cube_view.n() if cube_view is not None else int(filter_mask.sum())
+st.sidebar.metric("📊 Registros Filtrados", f"{n_filtered:,}")
 if pop_col:
-    total_pop = int(df_filtered[pop_col].sum(min_count=1) if df_filtered[pop_col].notna().any() else 0)
-    st.sidebar.metric("👥 População Total", f"{total_pop:,}")
+    if cube_view is not None:
+        total_pop = cube_view.total(pop_col)
+    else:
+        total_pop = np.nansum(df[pop_col].to_numpy(dtype=np.float64, na_value=np.nan)[filter_mask])
+    st.sidebar.metric("👥 População Total", f"{int(total_pop):,}")
 
 # Export button
-if st.sidebar.button("💾 Exportar CSV", use_container_width=True):
-    buf = BytesIO()
-    df_filtered.to_csv(buf, index=False)
-    st.sidebar.download_button(
-        "⬇️ Download CSV",
-        data=buf.getvalue(),
-        file_name="dados_filtrados.csv",
-        mime="text/csv",
-        use_container_width=True
-    )
+export_label = st.sidebar.selectbox("💾 Formato de exportação", list(EXPORT_FORMATS))
+export_ext, export_mime = EXPORT_FORMATS[export_label]
+
+# Snapshot parquet da versão dos dados deste rerun (mantido por
+# STALE_GRACE_SECONDS após uma atualização): a máscara só vale para ele, e o
+# clique pode chegar depois de outra sessão atualizar a fonte
+export_path = dataset.export_path()
+
+def export_data():
+    # Roda só no clique, fora do rerun: grava em lotes todas as colunas das
+    # linhas filtradas (ou reaproveita o arquivo já gerado para estes filtros)
+    key = (fkey, export_ext, export_path)
+    with open(get_export_cache().path(key, export_path, filter_mask, export_ext), "rb") as f:
+        return f.read()
+
+st.sidebar.download_button(
+    "⬇️ Exportar dados",
+    data=export_data,
+    file_name=f"dados_filtrados.{export_ext}",
+    mime=export_mime,
+    on_click="ignore",
+    use_container_width=True
+)
 
 # ============ RESEARCH QUESTIONS ============
 st.markdown("### 🔬 Perguntas de Pesquisa")
@@ -174,429 +400,404 @@ with col3:
 st.markdown("---")
 
 # ============ TABS ============
-tab1, tab2, tab3, tab4 = st.tabs([
+tab_labels = [
     "🏙️ Distribuição Populacional",
     "💰 Desenvolvimento Econômico",
     "🌟 Qualidade de Vida (IDH)",
-    "🗺️ Visão Geográfica"
-])
+    "🗺️ Visão Geográfica",
+    "📈 Tendências"
+]
+try:
+    # Abas com estado: só a aba aberta calcula seus gráficos; as demais são
+    # calculadas ao serem abertas (os frames ficam no cache dos filtros)
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(tab_labels, key="aba_ativa", on_change="rerun")
+except TypeError:
+    # Versões do Streamlit sem abas com estado
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(tab_labels)
+
+def tab_is_open(tab):
+    # .open é None quando as abas não rastreiam estado: renderiza tudo
+    return getattr(tab, "open", None) is not False
+
+# O Streamlit descarta o estado dos widgets que não são renderizados num
+# rerun (os das abas fechadas). Cada controle das abas copia o valor para uma
+# chave própria da sessão no on_change e é recriado a partir dela.
+def remember(key):
+    st.session_state[f"valor_{key}"] = st.session_state[key]
+
+def remembered(key, default, options=None):
+    value = st.session_state.get(f"valor_{key}", default)
+    if options is not None and value not in options:
+        return default
+    return value
 
 # ============ TAB 1: DISTRIBUIÇÃO POPULACIONAL ============
 with tab1:
-    st.markdown("## 📊 Pergunta 1: Como a população se distribui?")
-    
-    # Gráfico 1: Top municípios por população
-    st.markdown("### 🏆 Municípios Mais Populosos")
-    if pop_col and "municipio" in df_filtered.columns:
-        df_top = df_filtered.copy()
-        df_top[pop_col] = pd.to_numeric(df_top[pop_col], errors="coerce").fillna(0)
-        df_top = df_top.nlargest(top_n, pop_col)
-        
-        # Criar label mais informativo
-        df_top['label'] = df_top['municipio'] + ' - ' + df_top['estado']
+    if tab_is_open(tab1):
+        st.markdown("## 📊 Pergunta 1: Como a população se distribui?")
         
-        fig1 = px.bar(
-            df_top.sort_values(pop_col),
-            x=pop_col,
-            y='label',
-            orientation='h',
-            color='estado',
-            title=f'Top {top_n} Municípios por População ({pop_col.split("_")[-1]})',
-            labels={pop_col: 'População Estimada', 'label': 'Município - Estado'},
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        fig1.update_layout(
-            height=600,
-            showlegend=True,
-            xaxis_title="População",
-            yaxis_title="",
-            font=dict(size=12),
-            title={
-                'text': f"Gráfico 1: Top {top_n} Municípios por População ({pop_col.split('_')[-1]})",
-                'x': 0.5,
-                'xanchor': 'center',
-                'font': {'size': 16, 'color': '#1f77b4'}
-            }
-        )
-        st.plotly_chart(fig1, use_container_width=True)
-        st.markdown(f"<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Ranking dos {top_n} municípios com maior população estimada no ano de {pop_col.split('_')[-1]}, organizados por estado. As cores representam diferentes unidades federativas, facilitando a identificação da concentração populacional regional.</i></p>", unsafe_allow_html=True)
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Gráfico 2: Distribuição por Estado
-        st.markdown("### 🗺️ População por Estado")
-        if pop_col and "estado" in df_filtered.columns:
-            df_estado = df_filtered.groupby('estado')[pop_col].sum().reset_index()
-            df_estado = df_estado.sort_values(pop_col, ascending=False)
+        # Gráfico 1: Top municípios por população
+        st.markdown("### 🏆 Municípios Mais Populosos")
+        if pop_col and "municipio" in df.columns:
+            def build_top():
+                # Só as top_n linhas vencedoras são materializadas
+                if query_view is not None:
+                    df_top = query_view.top_k(pop_col, top_n)
+                else:
+                    df_top = df.take(ranking_index.top_k(pop_col, filter_mask, top_n))
+                return labeled(df_top, derived)
             
-            fig2 = px.bar(
-                df_estado,
-                x='estado',
-                y=pop_col,
-                color=pop_col,
-                color_continuous_scale='Blues',
-                title='População Total por Estado',
-                labels={pop_col: 'População Total', 'estado': 'Estado'}
-            )
-            fig2.update_layout(
-                height=400, 
-                showlegend=False,
-                title={
-                    'text': "Gráfico 2: População Total por Estado",
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'font': {'size': 16, 'color': '#1f77b4'}
-                }
-            )
-            st.plotly_chart(fig2, use_container_width=True)
-            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Soma total da população por unidade federativa. A intensidade da cor azul indica o volume populacional, permitindo identificar rapidamente os estados mais populosos do Brasil.</i></p>", unsafe_allow_html=True)
-    
-    with col2:
-        # Gráfico 3: Distribuição por Bioma
-        st.markdown("### 🌳 População por Bioma")
-        bioma_col = bioma_cols[-1] if bioma_cols else None
-        if bioma_col and pop_col:
-            df_bioma = df_filtered.copy()
-            df_bioma[bioma_col] = df_bioma[bioma_col].fillna("Sem informação")
-            df_bioma_grouped = df_bioma.groupby(bioma_col)[pop_col].sum().reset_index()
-            
-            fig3 = px.pie(
-                df_bioma_grouped,
-                values=pop_col,
-                names=bioma_col,
-                title='Distribuição Populacional por Bioma',
-                color_discrete_sequence=px.colors.qualitative.Set2,
-                hole=0.4
-            )
-            fig3.update_traces(textposition='inside', textinfo='percent+label')
-            fig3.update_layout(
-                height=400,
-                title={
-                    'text': "Gráfico 3: Distribuição Populacional por Bioma",
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'font': {'size': 16, 'color': '#1f77b4'}
-                }
-            )
-            st.plotly_chart(fig3, use_container_width=True)
-            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Distribuição percentual da população brasileira entre os principais biomas nacionais. Cada fatia representa a proporção populacional em Amazônia, Cerrado, Mata Atlântica, Caatinga, Pampa e Pantanal.</i></p>", unsafe_allow_html=True)
+            show_figure("Gráfico 1", "fig1", top_n, build=lambda: fig_top_populacao(
+                cached_frame("top", top_n, compute=build_top), pop_col, top_n))
+            st.markdown(f"<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Ranking dos {top_n} municípios com maior população estimada no ano de {pop_col.split('_')[-1]}, organizados por estado. As cores representam diferentes unidades federativas, facilitando a identificação da concentração populacional regional.</i></p>", unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # Gráfico 2: Distribuição por Estado
+            st.markdown("### 🗺️ População por Estado")
+            if cube_view is not None:
+                show_figure("Gráfico 2", "fig2", build=lambda: fig_populacao_estado(
+                    cube_view.sum(pop_col, 'estado').reset_index(), pop_col))
+                st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Soma total da população por unidade federativa. A intensidade da cor azul indica o volume populacional, permitindo identificar rapidamente os estados mais populosos do Brasil.</i></p>", unsafe_allow_html=True)
+        
+        with col2:
+            # Gráfico 3: Distribuição por Bioma
+            st.markdown("### 🌳 População por Bioma")
+            if bioma_col and cube_view is not None:
+                show_figure("Gráfico 3", "fig3", build=lambda: fig_populacao_bioma(
+                    cube_view.sum(pop_col, 'bioma').rename_axis(bioma_col).reset_index(), pop_col, bioma_col))
+                st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Distribuição percentual da população brasileira entre os principais biomas nacionais. Cada fatia representa a proporção populacional em Amazônia, Cerrado, Mata Atlântica, Caatinga, Pampa e Pantanal.</i></p>", unsafe_allow_html=True)
 
 # ============ TAB 2: DESENVOLVIMENTO ECONÔMICO ============
 with tab2:
-    st.markdown("## 💰 Pergunta 2: População e Desenvolvimento Econômico")
-    
-    # Gráfico 4: Scatter População x PIB
-    st.markdown("### 📈 Relação População × PIB per capita")
-    if pop_col and pib_col and "municipio" in df_filtered.columns:
-        df_scatter = df_filtered.copy()
-        df_scatter[pop_col] = pd.to_numeric(df_scatter[pop_col], errors="coerce")
-        df_scatter[pib_col] = pd.to_numeric(df_scatter[pib_col], errors="coerce")
-        df_scatter = df_scatter.dropna(subset=[pop_col, pib_col])
+    if tab_is_open(tab2):
+        st.markdown("## 💰 Pergunta 2: População e Desenvolvimento Econômico")
         
-        # Adicionar categoria de porte
-        df_scatter['porte'] = pd.cut(
-            df_scatter[pop_col],
-            bins=[0, 20000, 100000, 500000, float('inf')],
-            labels=['Pequeno', 'Médio', 'Grande', 'Metrópole']
-        )
+        # Gráfico 4: Scatter População x PIB
+        st.markdown("### 📈 Relação População × PIB per capita")
+        if pop_col and pib_col and "municipio" in df.columns:
+            # Mesmo frame do Gráfico 6: linhas com população e PIB, com porte
+            df_scatter = cached_frame("scatter", compute=lambda: valid_frame(df, derived, filter_mask, pop_col, pib_col))
+            amostrar = False
+            if len(df_scatter) > SCATTER_MAX_POINTS:
+                amostrar = st.checkbox(
+                    "Amostrar pontos (preserva a densidade, mantém extremos e outliers)",
+                    value=remembered("amostrar_scatter", True), key="amostrar_scatter",
+                    on_change=remember, args=("amostrar_scatter",))
+
+            df_fig4 = df_scatter
+            if amostrar:
+                df_fig4 = cached_frame("scatter_thin", compute=lambda: scatter_sample(df_scatter, pop_col, pib_col))
+            show_figure("Gráfico 4", "fig4", amostrar, build=lambda: fig_pop_pib(df_fig4, pop_col, pib_col))
+            if amostrar:
+                st.caption(f"Exibindo {len(df_fig4):,} de {len(df_scatter):,} municípios".replace(",", "."))
+            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Análise da relação entre tamanho populacional (eixo horizontal em escala logarítmica) e PIB per capita (eixo vertical). O tamanho das bolhas representa o PIB per capita, enquanto as cores diferenciam os estados, revelando padrões de desenvolvimento econômico.</i></p>", unsafe_allow_html=True)
         
-        fig4 = px.scatter(
-            df_scatter,
-            x=pop_col,
-            y=pib_col,
-            color='estado',
-            size=pib_col,
-            hover_name='municipio',
-            hover_data={'estado': True, pop_col: ':,', pib_col: ':,.2f', 'porte': True},
-            title='População vs PIB per capita por Estado',
-            labels={pop_col: 'População', pib_col: 'PIB per capita (R$)'},
-            log_x=True,
-            opacity=0.7
-        )
-        fig4.update_layout(
-            height=600,
-            title={
-                'text': "Gráfico 4: Relação entre População e PIB per capita",
-                'x': 0.5,
-                'xanchor': 'center',
-                'font': {'size': 16, 'color': '#1f77b4'}
-            }
-        )
-        st.plotly_chart(fig4, use_container_width=True)
-        st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Análise da relação entre tamanho populacional (eixo horizontal em escala logarítmica) e PIB per capita (eixo vertical). O tamanho das bolhas representa o PIB per capita, enquanto as cores diferenciam os estados, revelando padrões de desenvolvimento econômico.</i></p>", unsafe_allow_html=True)
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Gráfico 5: PIB médio por Estado
-        st.markdown("### 💵 PIB per capita Médio por Estado")
-        if pib_col and "estado" in df_filtered.columns:
-            df_pib_estado = df_filtered.copy()
-            df_pib_estado[pib_col] = pd.to_numeric(df_pib_estado[pib_col], errors="coerce")
-            df_pib_grouped = df_pib_estado.groupby('estado')[pib_col].mean().reset_index()
-            df_pib_grouped = df_pib_grouped.sort_values(pib_col, ascending=True)
-            
-            fig5 = px.bar(
-                df_pib_grouped,
-                x=pib_col,
-                y='estado',
-                orientation='h',
-                color=pib_col,
-                color_continuous_scale='Greens',
-                title='PIB per capita Médio por Estado',
-                labels={pib_col: 'PIB per capita Médio (R$)', 'estado': 'Estado'}
-            )
-            fig5.update_layout(
-                height=500, 
-                showlegend=False,
-                title={
-                    'text': "Gráfico 5: PIB per capita Médio por Estado",
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'font': {'size': 16, 'color': '#1f77b4'}
-                }
-            )
-            st.plotly_chart(fig5, use_container_width=True)
-            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>PIB per capita médio dos municípios por estado, ordenados do menor para o maior valor. A escala de cores verde indica a intensidade econômica, permitindo comparações diretas entre as unidades federativas.</i></p>", unsafe_allow_html=True)
-    
-    with col2:
-        # Gráfico 6: Distribuição de PIB por porte
-        st.markdown("### 📊 PIB per capita por Porte do Município")
-        if pop_col and pib_col:
-            df_porte = df_filtered.copy()
-            df_porte[pop_col] = pd.to_numeric(df_porte[pop_col], errors="coerce")
-            df_porte[pib_col] = pd.to_numeric(df_porte[pib_col], errors="coerce")
-            df_porte = df_porte.dropna(subset=[pop_col, pib_col])
-            
-            df_porte['porte'] = pd.cut(
-                df_porte[pop_col],
-                bins=[0, 20000, 100000, 500000, float('inf')],
-                labels=['Pequeno\n(<20k)', 'Médio\n(20-100k)', 'Grande\n(100-500k)', 'Metrópole\n(>500k)']
-            )
-            
-            fig6 = px.box(
-                df_porte,
-                x='porte',
-                y=pib_col,
-                color='porte',
-                title='Distribuição do PIB per capita por Porte Municipal',
-                labels={pib_col: 'PIB per capita (R$)', 'porte': 'Porte do Município'},
-                color_discrete_sequence=px.colors.qualitative.Pastel
-            )
-            fig6.update_layout(
-                height=500, 
-                showlegend=False,
-                title={
-                    'text': "Gráfico 6: PIB per capita por Porte Municipal",
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'font': {'size': 16, 'color': '#1f77b4'}
-                }
-            )
-            st.plotly_chart(fig6, use_container_width=True)
-            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Boxplot mostrando a distribuição do PIB per capita segundo o porte municipal (Pequeno: <20k hab.; Médio: 20-100k; Grande: 100-500k; Metrópole: >500k). As caixas representam a mediana e quartis, enquanto os pontos externos indicam outliers.</i></p>", unsafe_allow_html=True)
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # Gráfico 5: PIB médio por Estado
+            st.markdown("### 💵 PIB per capita Médio por Estado")
+            if pib_col and cube_view is not None:
+                show_figure("Gráfico 5", "fig5", build=lambda: fig_pib_estado(
+                    cube_view.mean(pib_col, 'estado').reset_index(), pib_col))
+                st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>PIB per capita médio dos municípios por estado, ordenados do menor para o maior valor. A escala de cores verde indica a intensidade econômica, permitindo comparações diretas entre as unidades federativas.</i></p>", unsafe_allow_html=True)
+        
+        with col2:
+            # Gráfico 6: Distribuição de PIB por porte
+            st.markdown("### 📊 PIB per capita por Porte do Município")
+            if pop_col and pib_col:
+                show_figure("Gráfico 6", "fig6", build=lambda: fig_pib_porte(
+                    cached_frame("scatter", compute=lambda: valid_frame(df, derived, filter_mask, pop_col, pib_col)), pib_col))
+                st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Boxplot mostrando a distribuição do PIB per capita segundo o porte municipal (Pequeno: <20k hab.; Médio: 20-100k; Grande: 100-500k; Metrópole: >500k). As caixas representam a mediana e quartis, enquanto os pontos externos indicam outliers.</i></p>", unsafe_allow_html=True)
 
 # ============ TAB 3: QUALIDADE DE VIDA ============
 with tab3:
-    st.markdown("## 🌟 Pergunta 3: Como varia a Qualidade de Vida (IDH)?")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Gráfico 7: IDH por Estado (Boxplot)
-        st.markdown("### 📊 Distribuição do IDH por Estado")
-        if idh_col and "estado" in df_filtered.columns:
-            df_idh = df_filtered.copy()
-            df_idh[idh_col] = pd.to_numeric(df_idh[idh_col], errors="coerce")
-            df_idh = df_idh.dropna(subset=[idh_col])
-            
-            # Calcular médias para ordenar
-            estado_order = df_idh.groupby('estado')[idh_col].mean().sort_values(ascending=False).index
-            
-            fig7 = px.box(
-                df_idh,
-                x='estado',
-                y=idh_col,
-                color='estado',
-                title=f'Distribuição do IDH por Estado ({idh_col.split("_")[-1]})',
-                labels={idh_col: 'IDH', 'estado': 'Estado'},
-                category_orders={'estado': estado_order}
-            )
-            fig7.update_layout(
-                height=500, 
-                showlegend=False,
-                title={
-                    'text': f"Gráfico 7: Distribuição do IDH por Estado ({idh_col.split('_')[-1]})",
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'font': {'size': 16, 'color': '#1f77b4'}
-                }
-            )
-            fig7.add_hline(y=0.7, line_dash="dash", line_color="red", 
-                          annotation_text="IDH Alto (0.7)")
-            st.plotly_chart(fig7, use_container_width=True)
-            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Distribuição do Índice de Desenvolvimento Humano (IDH) por estado, ordenados pela média decrescente. A linha tracejada vermelha marca o limiar de IDH Alto (0,7), conforme classificação do PNUD. As caixas mostram a variação dentro de cada estado.</i></p>", unsafe_allow_html=True)
-    
-    with col2:
-        # Gráfico 8: IDH vs População
-        st.markdown("### 👥 IDH × Tamanho Populacional")
-        if idh_col and pop_col:
-            df_idh_pop = df_filtered.copy()
-            df_idh_pop[idh_col] = pd.to_numeric(df_idh_pop[idh_col], errors="coerce")
-            df_idh_pop[pop_col] = pd.to_numeric(df_idh_pop[pop_col], errors="coerce")
-            df_idh_pop = df_idh_pop.dropna(subset=[idh_col, pop_col])
-            
-            df_idh_pop['porte'] = pd.cut(
-                df_idh_pop[pop_col],
-                bins=[0, 20000, 100000, 500000, float('inf')],
-                labels=['Pequeno', 'Médio', 'Grande', 'Metrópole']
-            )
-            
-            fig8 = px.violin(
-                df_idh_pop,
-                x='porte',
-                y=idh_col,
-                color='porte',
-                box=True,
-                title='IDH por Porte Municipal (Violino + Box)',
-                labels={idh_col: 'IDH', 'porte': 'Porte do Município'},
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig8.update_layout(
-                height=500, 
-                showlegend=False,
-                title={
-                    'text': "Gráfico 8: IDH por Porte Municipal (Violin Plot)",
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'font': {'size': 16, 'color': '#1f77b4'}
-                }
-            )
-            st.plotly_chart(fig8, use_container_width=True)
-            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Gráfico de violino combinado com boxplot, mostrando a distribuição do IDH segundo o porte populacional dos municípios. A forma do violino indica a densidade de municípios em cada faixa de IDH, revelando se municípios maiores tendem a ter melhor desenvolvimento humano.</i></p>", unsafe_allow_html=True)
-    
-    # Gráfico adicional: Top e Bottom IDH
-    st.markdown("### 🏅 Melhores e Piores IDH")
-    if idh_col and "municipio" in df_filtered.columns:
-        df_idh_ranking = df_filtered.copy()
-        df_idh_ranking[idh_col] = pd.to_numeric(df_idh_ranking[idh_col], errors="coerce")
-        df_idh_ranking = df_idh_ranking.dropna(subset=[idh_col])
+    if tab_is_open(tab3):
+        st.markdown("## 🌟 Pergunta 3: Como varia a Qualidade de Vida (IDH)?")
         
-        top_10 = df_idh_ranking.nlargest(10, idh_col)[['municipio', 'estado', idh_col]].copy()
-        top_10['categoria'] = 'Top 10 Melhores'
+        col1, col2 = st.columns(2)
         
-        bottom_10 = df_idh_ranking.nsmallest(10, idh_col)[['municipio', 'estado', idh_col]].copy()
-        bottom_10['categoria'] = 'Top 10 Piores'
+        with col1:
+            # Gráfico 7: IDH por Estado (Boxplot)
+            st.markdown("### 📊 Distribuição do IDH por Estado")
+            if idh_col and "estado" in df.columns:
+                def build_fig7():
+                    df_idh = cached_frame("idh", compute=lambda: idh_frame(df, derived, filter_mask, idh_col))
+                    return fig_idh_estado(df_idh, idh_col, state_order(cube_view, df_idh, idh_col))
+                
+                show_figure("Gráfico 7", "fig7", build=build_fig7)
+                st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Distribuição do Índice de Desenvolvimento Humano (IDH) por estado, ordenados pela média decrescente. A linha tracejada vermelha marca o limiar de IDH Alto (0,7), conforme classificação do PNUD. As caixas mostram a variação dentro de cada estado.</i></p>", unsafe_allow_html=True)
         
-        df_comparison = pd.concat([top_10, bottom_10])
-        df_comparison['label'] = df_comparison['municipio'] + ' - ' + df_comparison['estado']
+        with col2:
+            # Gráfico 8: IDH vs População
+            st.markdown("### 👥 IDH × Tamanho Populacional")
+            if idh_col and pop_col:
+                show_figure("Gráfico 8", "fig8", build=lambda: fig_idh_porte(
+                    cached_frame("idh_pop", compute=lambda: valid_frame(df, derived, filter_mask, pop_col, idh_col)), idh_col))
+                st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Gráfico de violino combinado com boxplot, mostrando a distribuição do IDH segundo o porte populacional dos municípios. A forma do violino indica a densidade de municípios em cada faixa de IDH, revelando se municípios maiores tendem a ter melhor desenvolvimento humano.</i></p>", unsafe_allow_html=True)
         
-        fig9 = px.bar(
-            df_comparison,
-            x=idh_col,
-            y='label',
-            color='categoria',
-            orientation='h',
-            title='Municípios com Melhor e Pior IDH',
-            labels={idh_col: 'IDH', 'label': 'Município'},
-            color_discrete_map={'Top 10 Melhores': '#2ecc71', 'Top 10 Piores': '#e74c3c'}
-        )
-        fig9.update_layout(
-            height=600,
-            title={
-                'text': "Gráfico 9: Municípios com Melhor e Pior IDH",
-                'x': 0.5,
-                'xanchor': 'center',
-                'font': {'size': 16, 'color': '#1f77b4'}
-            }
-        )
-        st.plotly_chart(fig9, use_container_width=True)
-        st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Comparação direta entre os 10 municípios com melhor IDH (verde) e os 10 com pior IDH (vermelho) dentre os municípios filtrados. Esta visualização evidencia as desigualdades regionais no desenvolvimento humano brasileiro.</i></p>", unsafe_allow_html=True)
+        # Gráfico adicional: Top e Bottom IDH
+        st.markdown("### 🏅 Melhores e Piores IDH")
+        if idh_col and "municipio" in df.columns:
+            def build_comparison():
+                # O índice de ranking (e a consulta) já ignora IDH ausente
+                if query_view is not None:
+                    top_10 = query_view.top_k(idh_col, 10)
+                    bottom_10 = query_view.bottom_k(idh_col, 10)
+                else:
+                    top_10 = df.take(ranking_index.top_k(idh_col, filter_mask, 10))
+                    bottom_10 = df.take(ranking_index.bottom_k(idh_col, filter_mask, 10))
+                return ranking_comparison(top_10, bottom_10, idh_col, derived)
+            
+            show_figure("Gráfico 9", "fig9", build=lambda: fig_idh_ranking(
+                cached_frame("idh_ranking", compute=build_comparison), idh_col))
+            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Comparação direta entre os 10 municípios com melhor IDH (verde) e os 10 com pior IDH (vermelho) dentre os municípios filtrados. Esta visualização evidencia as desigualdades regionais no desenvolvimento humano brasileiro.</i></p>", unsafe_allow_html=True)
 
 # ============ TAB 4: VISÃO GEOGRÁFICA ============
+def remember_click():
+    # Último ponto clicado no Mapa 1 como (lat, lon), ou None ao limpar a seleção
+    selecao = st.session_state.get("mapa1_selecao") or {}
+    clique = None
+    for point in selecao.get("selection", {}).get("points", []):
+        if point.get("lat") is not None and point.get("lon") is not None:
+            clique = float(point["lat"]), float(point["lon"])
+    st.session_state["valor_mapa1_clique"] = clique
+
+def map_click():
+    return st.session_state.get("valor_mapa1_clique")
+
 with tab4:
-    st.markdown("## 🗺️ Visualização Geográfica")
-    
-    if ("latitude" in df_filtered.columns) and ("longitude" in df_filtered.columns):
-        df_map = df_filtered.copy()
-        df_map["latitude"] = pd.to_numeric(df_map["latitude"], errors="coerce")
-        df_map["longitude"] = pd.to_numeric(df_map["longitude"], errors="coerce")
-        df_map = df_map.dropna(subset=["latitude", "longitude"])
-        
-        if pop_col in df_map.columns:
-            df_map[pop_col] = pd.to_numeric(df_map[pop_col], errors="coerce").fillna(0)
-        if idh_col in df_map.columns:
-            df_map[idh_col] = pd.to_numeric(df_map[idh_col], errors="coerce").fillna(0)
-        
-        # Mapa 2D com Plotly
-        st.markdown("### 🌎 Mapa Interativo 2D")
-        size_col = pop_col if pop_col in df_map.columns else None
-        color_col = idh_col if idh_col in df_map.columns else None
+    if tab_is_open(tab4):
+        st.markdown("## 🗺️ Visualização Geográfica")
         
-        fig_map = px.scatter_mapbox(
-            df_map,
-            lat="latitude",
-            lon="longitude",
-            hover_name="municipio",
-            hover_data={"estado": True, pop_col: ":,", idh_col: ":.3f"},
-            size=size_col,
-            color=color_col,
-            color_continuous_scale="RdYlGn",
-            size_max=20,
-            zoom=3.5,
-            height=600,
-            title="Municípios Brasileiros: Tamanho = População, Cor = IDH"
-        )
-        fig_map.update_layout(
-            mapbox_style="open-street-map",
-            title={
-                'text': "Mapa 1: Localização Geográfica dos Municípios",
-                'x': 0.5,
-                'xanchor': 'center',
-                'font': {'size': 16, 'color': '#1f77b4'}
-            }
-        )
-        st.plotly_chart(fig_map, use_container_width=True)
-        st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Visualização geoespacial interativa dos municípios brasileiros. O tamanho dos marcadores é proporcional à população, enquanto a cor representa o IDH (verde = alto, amarelo = médio, vermelho = baixo). Permite identificar concentrações populacionais e padrões de desenvolvimento regional.</i></p>", unsafe_allow_html=True)
-        
-        # Mapa 3D com PyDeck
-        st.markdown("### 🏙️ Mapa 3D com Barras (População)")
-        if pop_col in df_map.columns:
-            df_map["pop_norm"] = (df_map[pop_col] / df_map[pop_col].max()) * 500000
+        if ("latitude" in df.columns) and ("longitude" in df.columns):
+            # Mapa 2D com Plotly
+            st.markdown("### 🌎 Mapa Interativo 2D")
+            
+            # Nível de detalhe: acima de MAP_MAX_MARKERS pontos, envia agregados
+            # por célula do quadtree em vez de um marcador por município
+            map_grid = load_map_grid(tuple(session_cols), data_version) if pop_col and idh_col else None
+            
+            def build_mapa1():
+                map_level, df_cells = None, None
+                if map_grid is not None:
+                    map_level, df_cells = cached_frame("map_lod", compute=lambda: map_cells(
+                        map_grid, df, filter_mask, pop_col, idh_col))
+                fig_map = cached_figure("mapa1", build=lambda: fig_mapa(
+                    None if df_cells is not None else cached_frame(
+                        "map", compute=lambda: map_points(df, filter_mask, pop_col, idh_col)),
+                    pop_col, idh_col, df_cells))
+                return fig_map, map_level, df_cells
+            
+            def draw_mapa1(result):
+                fig_map, map_level, df_cells = result
+                # Clique num ponto vira centro da análise de vizinhança
+                st.plotly_chart(fig_map, use_container_width=True, on_select=remember_click,
+                                selection_mode="points", key="mapa1_selecao")
+                if df_cells is not None:
+                    st.caption(f"Exibindo {len(df_cells):,} agrupamentos (grade de {map_grid.cell_deg(map_level):g}°) "
+                               f"para {int(df_cells['municipios'].sum()):,} municípios. Filtre estados ou aumente a "
+                               f"população mínima para ver os municípios individualmente.")
+            
+            schedule("Mapa 1", ("mapa1", fkey), build_mapa1, draw_mapa1,
+                     cached=figure_cache.size_of(("mapa1", fkey)) is not None)
+            st.markdown("<p style='text-align: center; color: #666; font-size: 0.9rem; margin-top: -1rem;'><i>Visualização geoespacial interativa dos municípios brasileiros. O tamanho dos marcadores é proporcional à população, enquanto a cor representa o IDH (verde = alto, amarelo = médio, vermelho = baixo). Permite identificar concentrações populacionais e padrões de desenvolvimento regional.</i></p>", unsafe_allow_html=True)
             
-            view_state = pdk.ViewState(
-                latitude=df_map["latitude"].mean(),
-                longitude=df_map["longitude"].mean(),
-                zoom=3.5,
-                pitch=50,
-                bearing=-30
-            )
+            # Mapa 3D com PyDeck
+            st.markdown("### 🏙️ Mapa 3D com Barras (População)")
+            if pop_col and "municipio" in df.columns and "estado" in df.columns:
+                elevations = load_elevations(tuple(session_cols), data_version)[pop_col]
+                
+                def build_deck():
+                    return deck_payload(df, coord_rows(df, filter_mask), pop_col, elevations)
+                
+                def build_mapa2():
+                    payload = cached_frame("deck", compute=build_deck)
+                    # Tamanho estimado dos dados do deck, sem serializá-lo
+                    # de novo (o st.pydeck_chart já gera o JSON)
+                    profiler.current.bytes = deck_nbytes(payload)
+                    return deck_colunas(payload)
+                
+                schedule("Mapa 2", ("mapa2", fkey), build_mapa2,
+                         lambda r: st.pydeck_chart(r, use_container_width=True),
+                         cached=frame_cache.size_of((fkey, "deck")) is not None)
+                st.caption("**Mapa 2:** Representação tridimensional dos municípios brasileiros onde a altura das colunas é proporcional à população. Esta visualização permite identificar intuitivamente os grandes centros urbanos e suas distribuições pelo território nacional.")
             
-            column_layer = pdk.Layer(
-                "ColumnLayer",
-                data=df_map,
-                get_position=["longitude", "latitude"],
-                get_elevation="pop_norm",
-                elevation_scale=0.1,
-                radius=10000,
-                get_fill_color=[255, 140, 0, 180],
-                pickable=True,
-                auto_highlight=True,
-            )
+            # Vizinhança: municípios num raio ou K mais próximos de um ponto
+            st.markdown("### 📍 Análise de Vizinhança")
+            spatial_index = load_spatial_index(tuple(session_cols), data_version)
+            opcoes = coord_rows(df, filter_mask)
+            if pop_col:
+                # Mais populosos primeiro
+                opcoes = opcoes[np.argsort(-np.nan_to_num(df[pop_col].to_numpy()[opcoes]), kind="stable")]
+            rotulos = dict(zip(opcoes.tolist(), derived.labels_at(opcoes)))
+            clique = map_click()
             
-            tooltip = {
-                "html": "<b>{municipio}</b><br/>Estado: {estado}<br/>População: {" + pop_col + ":,}",
-                "style": {"backgroundColor": "steelblue", "color": "white"}
-            }
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                centros = ["Município"] + (["Ponto clicado no Mapa 1"] if clique else [])
+                origem = st.radio("Centro", centros, horizontal=True, key="vizinhanca_origem",
+                                  index=centros.index(remembered("vizinhanca_origem", centros[0], centros)),
+                                  on_change=remember, args=("vizinhanca_origem",))
+                centro_row = None
+                if origem == "Município" and rotulos:
+                    municipios = list(rotulos)
+                    centro_row = st.selectbox(
+                        "Município de referência", municipios, format_func=rotulos.get, key="vizinhanca_municipio",
+                        index=municipios.index(remembered("vizinhanca_municipio", municipios[0], rotulos)),
+                        on_change=remember, args=("vizinhanca_municipio",))
+            with col2:
+                modos = ["Raio", "K mais próximos"]
+                modo = st.radio("Consulta", modos, horizontal=True, key="vizinhanca_modo",
+                                index=modos.index(remembered("vizinhanca_modo", modos[0])),
+                                on_change=remember, args=("vizinhanca_modo",))
+                if modo == "Raio":
+                    raio_km = st.slider("Raio (km)", 5, 500, remembered("vizinhanca_raio", 50), 5,
+                                        key="vizinhanca_raio", on_change=remember, args=("vizinhanca_raio",))
+                else:
+                    vizinhos_k = st.slider("Vizinhos (K)", 1, 50, remembered("vizinhanca_k", 10),
+                                           key="vizinhanca_k", on_change=remember, args=("vizinhanca_k",))
+            with col3:
+                so_filtrados = st.checkbox("Só municípios dos filtros", value=remembered("vizinhanca_filtros", True),
+                                           key="vizinhanca_filtros", on_change=remember, args=("vizinhanca_filtros",))
             
-            r = pdk.Deck(
-                layers=[column_layer],
-                initial_view_state=view_state,
-                tooltip=tooltip,
-            )
-            st.pydeck_chart(r, use_container_width=True)
-            st.caption("**Mapa 2:** Representação tridimensional dos municípios brasileiros onde a altura das colunas é proporcional à população. Esta visualização permite identificar intuitivamente os grandes centros urbanos e suas distribuições pelo território nacional.")
+            if origem == "Município" and centro_row is None:
+                st.info("Nenhum município com coordenadas nos filtros atuais.")
+            else:
+                if centro_row is not None:
+                    lat0, lon0 = float(df["latitude"].iloc[centro_row]), float(df["longitude"].iloc[centro_row])
+                    centro_nome = rotulos[centro_row]
+                else:
+                    lat0, lon0 = clique
+                    centro_nome = f"({lat0:.3f}, {lon0:.3f})"
+                with profiler.span("Vizinhança") as span:
+                    inicio_consulta = time.perf_counter()
+                    mask_viz = filter_mask if so_filtrados else None
+                    if modo == "Raio":
+                        rows, dist = spatial_index.within(lat0, lon0, raio_km, mask_viz, exclude=centro_row)
+                    else:
+                        rows, dist = spatial_index.nearest(lat0, lon0, vizinhos_k, mask_viz, exclude=centro_row)
+                    consulta_ms = (time.perf_counter() - inicio_consulta) * 1000
+                    pop_viz = df[pop_col].to_numpy()[rows] if pop_col else np.full(len(rows), np.nan)
+                    idh_viz = df[idh_col].to_numpy()[rows] if idh_col else np.full(len(rows), np.nan)
+                    resumo = region_summary(dist, pop_viz, idh_viz)
+                    span.rows = len(rows)
+                
+                regiao = f"a até {raio_km} km de {centro_nome}" if modo == "Raio" else f"{vizinhos_k} mais próximos de {centro_nome}"
+                st.markdown(f"**Municípios {regiao}**")
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("🏘️ Municípios", f"{resumo['municipios']:,}")
+                m2.metric("👥 População", f"{int(resumo['populacao']):,}")
+                m3.metric("🌟 IDH (ponderado pela população)",
+                          "—" if np.isnan(resumo["idh_ponderado"]) else f"{resumo['idh_ponderado']:.3f}")
+                m4.metric("📏 Distância máxima", f"{resumo['distancia_max_km']:,.1f} km")
+                if len(rows):
+                    st.dataframe(
+                        pd.DataFrame({
+                            "Município": derived.labels_at(rows),
+                            "Distância (km)": dist.round(1),
+                            "População": pop_viz,
+                            "IDH": idh_viz,
+                        }),
+                        column_config={
+                            "População": st.column_config.NumberColumn(format="localized"),
+                            "IDH": st.column_config.NumberColumn(format="%.3f"),
+                        },
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                st.caption(f"Consulta ao índice espacial em {consulta_ms:.2f} ms sobre {len(spatial_index):,} "
+                           f"municípios com coordenadas. Clique num ponto do Mapa 1 para usá-lo como centro.")
+
+# ============ TAB 5: TENDÊNCIAS ============
+TREND_LABELS = {"populacao": "População", "pib": "PIB per capita", "idh": "IDH"}
+
+with tab5:
+    if tab_is_open(tab5):
+        st.markdown("## 📈 Tendências ao Longo dos Anos")
+        
+        # Todas as colunas anuais, em matrizes município × ano (mesma ordem de
+        # linhas do frame da sessão, então a máscara dos filtros vale aqui)
+        ts_cols = tuple(c for c in ["municipio", "estado"] if c in all_cols) + tuple(series_columns(all_cols))
+        series_store = load_timeseries(ts_cols, data_version)
+        indicadores = [name for name in TREND_LABELS if name in series_store and len(series_store.years(name)) > 1]
+        
+        if not indicadores:
+            st.info("São necessários pelo menos dois anos de algum indicador para calcular tendências.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                indicador = st.selectbox(
+                    "Indicador", indicadores, format_func=TREND_LABELS.get, key="tendencia_indicador",
+                    index=indicadores.index(remembered("tendencia_indicador", indicadores[0], indicadores)),
+                    on_change=remember, args=("tendencia_indicador",))
+            anos = [int(a) for a in series_store.years(indicador)]
+            with col2:
+                periodo = remembered("tendencia_periodo", (anos[0], anos[-1]))
+                if not set(periodo) <= set(anos):
+                    periodo = (anos[0], anos[-1])
+                inicio, fim = st.select_slider("Período", options=anos, value=periodo, key="tendencia_periodo",
+                                               on_change=remember, args=("tendencia_periodo",))
+            label = TREND_LABELS[indicador]
+            # População é somada por estado; PIB per capita e IDH, médias
+            how = "sum" if indicador == "populacao" else "mean"
+            
+            # Gráfico 10: evolução por estado
+            st.markdown(f"### 📉 Evolução de {label} por Estado")
+            show_figure("Gráfico 10", "fig10", indicador, build=lambda: fig_tendencia_estados(
+                cached_frame("tendencia", indicador, compute=lambda: series_store.state_long(indicador, filter_mask, how)),
+                label if how == "sum" else f"{label} (média)"))
+            
+            if fim <= inicio:
+                st.info("Selecione dois anos diferentes para calcular as taxas de crescimento.")
+            else:
+                periodo = f"{inicio}–{fim}"
+                # Variação do ano anterior da série até o fim do período
+                ultimo_ano = f"Variação {anos[anos.index(fim) - 1]}–{fim}"
+                col1, col2 = st.columns([1, 2])
+                
+                with col1:
+                    st.markdown(f"### 🧮 Crescimento por Estado ({periodo})")
+                    df_rates_uf = cached_frame("tendencia_uf", indicador, inicio, fim,
+                                               compute=lambda: series_store.state_rates(indicador, inicio, fim, filter_mask, how))
+                    st.dataframe(
+                        df_rates_uf.sort_values("cagr", ascending=False).rename(columns={
+                            "estado": "Estado", "crescimento": "Crescimento", "cagr": "CAGR",
+                            "variacao_ultimo_ano": ultimo_ano}),
+                        column_config={
+                            "Crescimento": st.column_config.NumberColumn(format="percent"),
+                            "CAGR": st.column_config.NumberColumn(format="percent"),
+                            ultimo_ano: st.column_config.NumberColumn(format="percent"),
+                        },
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                
+                with col2:
+                    # Gráfico 11: municípios com maior e menor CAGR
+                    st.markdown(f"### 🚀 Municípios com Maior e Menor Crescimento ({periodo})")
+                    df_cagr = cached_frame("tendencia_cagr", indicador, inicio, fim, compute=lambda: cagr_extremes(
+                        series_store.municipio_rates(indicador, inicio, fim, filter_mask), derived))
+                    if len(df_cagr):
+                        show_figure("Gráfico 11", "fig11", indicador, inicio, fim, build=lambda: fig_cagr_municipios(df_cagr, periodo, ultimo_ano))
+                    else:
+                        st.info("Sem municípios com valores nos dois anos selecionados.")
+
+# ============ GRÁFICOS AGENDADOS ============
+# Cada gráfico é desenhado no lugar reservado assim que fica pronto
+for (slot, span, draw), future in render_batch.drain():
+    if future is None:
+        with slot.container():
+            st.warning(f"⏳ {span.name} ainda está sendo preparado e aparecerá na próxima atualização.")
+            st.button("🔄 Atualizar", key=f"atualizar_{span.name}")
+    elif future.exception() is not None:
+        slot.exception(future.exception())
+    else:
+        with slot.container():
+            draw(future.result())
+    profiler.end(span)
 
 # Footer
 st.markdown("---")
@@ -619,3 +820,26 @@ st.markdown("""
     </p>
 </div>
 """, unsafe_allow_html=True)
+
+# ============ DESEMPENHO ============
+rerun_seconds = profiler.finish()
+metrics_registry = get_metrics_registry()
+if METRICS_FILE:
+    # Troca atômica para o coletor nunca ler um arquivo pela metade; o
+    # temporário é de cada processo e thread, já que sessões gravam juntas
+    tmp_path = f"{METRICS_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(metrics_registry.prometheus_text())
+    os.replace(tmp_path, METRICS_FILE)
+
+if ADMIN:
+    with st.sidebar.expander("⏱️ Desempenho do rerun", expanded=False):
+        st.metric("Tempo total", f"{rerun_seconds * 1000:,.0f} ms")
+        st.dataframe(pd.DataFrame([s.as_dict() for s in profiler.spans]), hide_index=True, use_container_width=True)
+        st.caption(f"Reruns neste processo: {metrics_registry.reruns:,}")
+        # Acertos, faltas e descartes acumulados dos caches compartilhados
+        st.dataframe(pd.DataFrame.from_dict(metrics_registry.cache_stats(), orient="index"),
+                     use_container_width=True)
+        st.download_button("⬇️ Spans (JSON)", profiler.to_json(), file_name="spans.json", mime="application/json")
+        st.download_button("⬇️ Acumulado (JSON)", metrics_registry.to_json(), file_name="metricas.json", mime="application/json")
+        st.download_button("⬇️ Prometheus", metrics_registry.prometheus_text(), file_name="metricas.prom", mime="text/plain")
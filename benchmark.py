@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+from charts import (
+    deck_colunas, fig_cagr_municipios, fig_idh_estado, fig_idh_porte,
+    fig_idh_ranking, fig_mapa, fig_pib_estado, fig_pib_porte, fig_pop_pib, fig_populacao_bioma,
+    fig_populacao_estado, fig_tendencia_estados, fig_top_populacao,
+)
+from cube import AggregateCube
+from indexes import FilterIndex, RankingIndex
+from ingest import csv_to_parquet, read_columns
+from maps import GridPyramid, deck_payload, elevation_table
+from pipeline import DerivedColumns, clean_frame
+from prepare import (
+    cagr_extremes, coord_rows, idh_frame, labeled, map_cells, map_points, ranking_comparison, scatter_sample,
+    state_order, valid_frame,
+)
+from spatial import SpatialIndex, region_summary
+from synthetic import FIRST_YEAR, UFS, synthetic_frame
+from timeseries import TimeSeriesStore
+
+# Benchmark sem navegador do pipeline por trás de cada gráfico e mapa, sobre
+# dados sintéticos no formato de dados_lista.csv:
+#   python benchmark.py --linhas 5000 50000 500000 --saida bench.json
+
+# Filtros medidos: o padrão da sidebar (5 primeiros estados) e o país inteiro
+FILTER_STATES = {
+    "5 estados": sorted(UFS)[:5],
+    "todos": [],
+}
+
+
+def measure(fn, repeats=3):
+    # Menor tempo entre as repetições (sem tracemalloc) e, numa execução à
+    # parte, o pico de alocação rastreado pelo tracemalloc (inclui NumPy)
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(seconds), peak
+
+
+class Bench:
+
+    def __init__(self, repeats):
+        self.repeats = repeats
+        self.rows = []
+
+    def run(self, size, filtro, step, fn, rows=None):
+        result, seconds, peak = measure(fn, self.repeats)
+        # Serialização medida à parte: é o que o Streamlit faz a cada envio
+        payload = serialize_ms = None
+        if hasattr(result, "to_plotly_json") or hasattr(result, "layers"):
+            start = time.perf_counter()
+            payload = len(pio.to_json(result, validate=False) if hasattr(result, "to_plotly_json") else result.to_json())
+            serialize_ms = round((time.perf_counter() - start) * 1000, 3)
+        if rows is None and hasattr(result, "__len__") and not isinstance(result, (tuple, dict)):
+            rows = len(result)
+        self.rows.append({
+            "linhas": size,
+            "filtro": filtro,
+            "etapa": step,
+            "ms": round(seconds * 1000, 3),
+            "pico_mb": round(peak / 1024 ** 2, 3),
+            "linhas_processadas": rows,
+            "serializacao_ms": serialize_ms,
+            "payload_bytes": payload,
+        })
+        return result
+
+
+def bench_size(bench, size, workdir, n_years, seed):
+    csv_path = os.path.join(workdir, f"dados_{size}.csv")
+    synthetic_frame(size, n_years, seed).to_csv(csv_path, index=False)
+    last = FIRST_YEAR + n_years - 1
+    pop_col, pib_col, idh_col = f"populacao_estimada_{last}", f"pib_per_capita_{last}", "idh_2010"
+    bioma_col = "bioma_predominante"
+
+    parquet_path = bench.run(size, "-", "carga: csv -> parquet", lambda: csv_to_parquet(csv_path), rows=size)
+    columns = ["municipio", "estado", "latitude", "longitude", bioma_col, pop_col, pib_col, idh_col]
+    df = bench.run(size, "-", "carga: parquet -> frame limpo", lambda: clean_frame(read_columns(parquet_path, columns)))
+    year_cols = [c for c in read_columns(parquet_path).columns if c.startswith(("populacao_", "pib_", "idh_"))]
+    df_series = clean_frame(read_columns(parquet_path, ["municipio", "estado"] + year_cols))
+
+    filter_index = bench.run(size, "-", "índice: filtros", lambda: FilterIndex(df, [pop_col]), rows=size)
+    ranking = bench.run(size, "-", "índice: rankings", lambda: RankingIndex(df, [pop_col, pib_col, idh_col]), rows=size)
+    cube = bench.run(size, "-", "índice: cubo", lambda: AggregateCube(df, pop_col, [pop_col, pib_col, idh_col], bioma_col), rows=size)
+    grid = bench.run(size, "-", "índice: grade do mapa", lambda: GridPyramid(df), rows=size)
+    elevations = bench.run(size, "-", "índice: alturas 3D", lambda: elevation_table(df, [pop_col]), rows=size)
+    series = bench.run(size, "-", "índice: séries anuais", lambda: TimeSeriesStore(df_series), rows=size)
+    spatial = bench.run(size, "-", "índice: espacial", lambda: SpatialIndex(df), rows=size)
+    derived = bench.run(size, "-", "índice: colunas derivadas",
+                        lambda: DerivedColumns(df, [pop_col], [pop_col, pib_col, idh_col]), rows=size)
+
+    for filtro, estados in FILTER_STATES.items():
+        def run(step, fn, rows=None):
+            return bench.run(size, filtro, step, fn, rows)
+
+        mask = run("filtro: máscara", lambda: filter_index.mask(estados, pop_col, 0))
+        n_sel = int(mask.sum())
+        run("filtro: linhas filtradas", lambda: df.take(np.flatnonzero(mask)))
+        view = cube.select(estados, 0)
+
+        run("Gráfico 1", lambda: fig_top_populacao(
+            labeled(df.take(ranking.top_k(pop_col, mask, 15)), derived), pop_col, 15), rows=n_sel)
+        run("Gráfico 2", lambda: fig_populacao_estado(view.sum(pop_col, 'estado').reset_index(), pop_col), rows=n_sel)
+        run("Gráfico 3", lambda: fig_populacao_bioma(
+            view.sum(pop_col, 'bioma').rename_axis(bioma_col).reset_index(), pop_col, bioma_col), rows=n_sel)
+
+        def scatter():
+            df_scatter = valid_frame(df, derived, mask, pop_col, pib_col)
+            return fig_pop_pib(scatter_sample(df_scatter, pop_col, pib_col), pop_col, pib_col)
+        run("Gráfico 4", scatter, rows=n_sel)
+        run("Gráfico 5", lambda: fig_pib_estado(view.mean(pib_col, 'estado').reset_index(), pib_col), rows=n_sel)
+        run("Gráfico 6", lambda: fig_pib_porte(valid_frame(df, derived, mask, pop_col, pib_col), pib_col), rows=n_sel)
+
+        def idh_estado():
+            df_idh = idh_frame(df, derived, mask, idh_col)
+            return fig_idh_estado(df_idh, idh_col, state_order(view, df_idh, idh_col))
+        run("Gráfico 7", idh_estado, rows=n_sel)
+        run("Gráfico 8", lambda: fig_idh_porte(valid_frame(df, derived, mask, pop_col, idh_col), idh_col), rows=n_sel)
+
+        run("Gráfico 9", lambda: fig_idh_ranking(ranking_comparison(
+            df.take(ranking.top_k(idh_col, mask, 10)), df.take(ranking.bottom_k(idh_col, mask, 10)),
+            idh_col, derived), idh_col), rows=n_sel)
+
+        def mapa():
+            _, cells = map_cells(grid, df, mask, pop_col, idh_col)
+            if cells is not None:
+                return fig_mapa(None, pop_col, idh_col, cells)
+            return fig_mapa(map_points(df, mask, pop_col, idh_col), pop_col, idh_col)
+        run("Mapa 1", mapa, rows=n_sel)
+
+        run("Mapa 2", lambda: deck_colunas(deck_payload(df, coord_rows(df, mask), pop_col, elevations[pop_col])),
+            rows=n_sel)
+
+        def vizinhanca():
+            # Raio de 50 km e 10 vizinhos em volta do município mais populoso do recorte
+            center = int(ranking.top_k(pop_col, mask, 1)[0])
+            lat, lon = float(df["latitude"].iloc[center]), float(df["longitude"].iloc[center])
+            rows, dist = spatial.within(lat, lon, 50, mask, exclude=center)
+            spatial.nearest(lat, lon, 10, mask, exclude=center)
+            return region_summary(dist, df[pop_col].to_numpy()[rows], df[idh_col].to_numpy()[rows])
+        run("Vizinhança", vizinhanca, rows=n_sel)
+
+        run("Gráfico 10", lambda: fig_tendencia_estados(series.state_long("populacao", mask), "População"), rows=n_sel)
+
+        def cagr():
+            rates = series.municipio_rates("populacao", FIRST_YEAR, last, mask)
+            return fig_cagr_municipios(cagr_extremes(rates, derived), f"{FIRST_YEAR}–{last}")
+        if n_years > 1:
+            run("Gráfico 11", cagr, rows=n_sel)
+
+
+def markdown_table(rows):
+    df = pd.DataFrame(rows)
+    cols = ["linhas", "filtro", "etapa", "ms", "pico_mb", "linhas_processadas", "serializacao_ms", "payload_bytes"]
+    df = df[cols].astype(object).where(df[cols].notna(), "")
+    lines = ["| " + " | ".join(cols) + " |", "|" + "---|" * len(cols)]
+    lines += ["| " + " | ".join(str(v) for v in row) + " |" for row in df.itertuples(index=False)]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline do dashboard com dados sintéticos")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[5000, 50000, 500000])
+    parser.add_argument("--anos", type=int, default=4, help="anos de população/PIB gerados")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", help="grava os resultados em JSON (ou CSV, pela extensão)")
+    args = parser.parse_args(argv)
+
+    bench = Bench(args.repeticoes)
+    with tempfile.TemporaryDirectory(prefix="ibge_bench_") as workdir:
+        for size in args.linhas:
+            bench_size(bench, size, workdir, args.anos, args.semente)
+            print(f"{size:,} linhas concluídas", flush=True)
+
+    print(markdown_table(bench.rows))
+    if args.saida:
+        if args.saida.endswith(".csv"):
+            pd.DataFrame(bench.rows).to_csv(args.saida, index=False)
+        else:
+            with open(args.saida, "w", encoding="utf-8") as f:
+                json.dump(bench.rows, f, ensure_ascii=False, indent=2)
+    return bench.rows
+
+
+if __name__ == "__main__":
+    main()
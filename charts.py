@@ -0,0 +1,469 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import pydeck as pdk
+
+from maps import deck_elevation_scale
+from summaries import box_summaries, kde_summaries
+
+# Construtores das figuras do dashboard. Recebem frames já preparados e
+# não dependem do Streamlit, para que o cache de figuras (e quem mais
+# precisar) possa chamá-los diretamente.
+
+
+def chart_title(text):
+    return {
+        'text': text,
+        'x': 0.5,
+        'xanchor': 'center',
+        'font': {'size': 16, 'color': '#1f77b4'}
+    }
+
+
+def _json_nbytes(value):
+    # Estimativa do tamanho em JSON sem serializar: arrays numéricos pelo
+    # número de valores; arrays de objetos por uma amostra de até 32 itens
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in "fiub":
+            return value.size * (value.dtype.itemsize + 4)
+        flat = value.ravel()
+        if not len(flat):
+            return 2
+        sample = flat[::max(len(flat) // 32, 1)]
+        return sum(_json_nbytes(v) for v in sample) * len(flat) // len(sample)
+    if isinstance(value, dict):
+        return sum(len(k) + 4 + _json_nbytes(v) for k, v in value.items()) + 2
+    if isinstance(value, (list, tuple)):
+        return sum(_json_nbytes(v) + 1 for v in value) + 2
+    if isinstance(value, str):
+        return len(value) + 2
+    return 8
+
+
+def figure_nbytes(fig):
+    # Custo da figura no cache de figuras. O st.plotly_chart já serializa a
+    # figura a cada envio; aqui só se percorrem as propriedades (sem a cópia
+    # de to_plotly_json), a uma fração do custo de pio.to_json e com erro
+    # de até ~25% no tamanho
+    return _json_nbytes(fig._data) + _json_nbytes(fig._layout)
+
+
+def deck_nbytes(payload):
+    # Mesma estimativa para os dados do deck pydeck (ver maps.deck_payload),
+    # que o to_json envia como registros indentados: valores por coluna mais
+    # chave, recuo e quebra de linha repetidos em cada linha
+    keys = sum(len(str(col)) + 16 for col in payload.columns) + 21
+    return sum(_json_nbytes(payload[col].to_numpy()) for col in payload.columns) + len(payload) * keys
+
+
+# Acima deste número de pontos, box e violino são desenhados a partir de
+# resumos calculados no servidor em vez de enviar cada município ao navegador
+SUMMARY_MIN_POINTS = 2000
+
+
+def _group_order(series, order=None):
+    if order is not None:
+        return list(order)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return list(series.cat.categories)
+    return list(pd.unique(series.dropna()))
+
+
+def _summary_box_traces(positions, labels, stats, colors, width=None):
+    traces = []
+    for i, label in enumerate(labels):
+        if not stats["count"][i]:
+            continue
+        color = colors[i % len(colors)]
+        traces.append(go.Box(
+            x=[positions[i]],
+            q1=[stats["q1"][i]],
+            median=[stats["median"][i]],
+            q3=[stats["q3"][i]],
+            lowerfence=[stats["lowerfence"][i]],
+            upperfence=[stats["upperfence"][i]],
+            name=str(label),
+            marker_color=color,
+            boxpoints=False,
+            width=width,
+        ))
+        outliers = stats["outliers"][i]
+        if len(outliers):
+            traces.append(go.Scatter(
+                x=[positions[i]] * len(outliers),
+                y=outliers,
+                mode='markers',
+                marker={'color': color, 'size': 4},
+                name=str(label),
+                hovertemplate='%{y}<extra></extra>',
+            ))
+    return traces
+
+
+def box_summary_figure(df, group_col, value_col, colors, labels, order=None):
+    # Box por grupo com quartis, cercas e outliers (limitados) pré-calculados
+    order = _group_order(df[group_col], order)
+    codes = pd.Categorical(df[group_col], categories=order).codes
+    stats = box_summaries(df[value_col].to_numpy(dtype=np.float64, na_value=np.nan), codes, len(order))
+    fig = go.Figure(_summary_box_traces(order, order, stats, colors))
+    fig.update_layout(
+        xaxis={'title': labels.get(group_col, group_col), 'categoryorder': 'array', 'categoryarray': order},
+        yaxis_title=labels.get(value_col, value_col),
+    )
+    return fig
+
+
+def violin_summary_figure(df, group_col, value_col, colors, labels, order=None):
+    # Violino desenhado a partir da KDE de resolução fixa de cada grupo, com o
+    # box resumido por dentro; cada violino usa a mesma largura máxima
+    order = _group_order(df[group_col], order)
+    codes = pd.Categorical(df[group_col], categories=order).codes
+    values = df[value_col].to_numpy(dtype=np.float64, na_value=np.nan)
+    stats = box_summaries(values, codes, len(order))
+    grids, densities = kde_summaries(values, codes, len(order))
+
+    traces = []
+    for i, label in enumerate(order):
+        if not len(grids[i]):
+            continue
+        half = densities[i] / densities[i].max() * 0.4 if densities[i].max() > 0 else densities[i]
+        traces.append(go.Scatter(
+            x=np.concatenate([i - half, (i + half)[::-1]]),
+            y=np.concatenate([grids[i], grids[i][::-1]]),
+            fill='toself',
+            mode='lines',
+            line={'color': colors[i % len(colors)], 'width': 1},
+            name=str(label),
+            hoverinfo='skip',
+        ))
+    traces += _summary_box_traces(list(range(len(order))), order, stats, colors, width=0.08)
+    fig = go.Figure(traces)
+    fig.update_layout(
+        xaxis={'title': labels.get(group_col, group_col), 'tickvals': list(range(len(order))),
+               'ticktext': [str(label) for label in order]},
+        yaxis_title=labels.get(value_col, value_col),
+    )
+    return fig
+
+
+def fig_top_populacao(df_top, pop_col, top_n):
+    fig = px.bar(
+        df_top.sort_values(pop_col),
+        x=pop_col,
+        y='label',
+        orientation='h',
+        color='estado',
+        title=f'Top {top_n} Municípios por População ({pop_col.split("_")[-1]})',
+        labels={pop_col: 'População Estimada', 'label': 'Município - Estado'},
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig.update_layout(
+        height=600,
+        showlegend=True,
+        xaxis_title="População",
+        yaxis_title="",
+        font=dict(size=12),
+        title=chart_title(f"Gráfico 1: Top {top_n} Municípios por População ({pop_col.split('_')[-1]})")
+    )
+    return fig
+
+
+def fig_populacao_estado(df_estado, pop_col):
+    fig = px.bar(
+        df_estado.sort_values(pop_col, ascending=False),
+        x='estado',
+        y=pop_col,
+        color=pop_col,
+        color_continuous_scale='Blues',
+        title='População Total por Estado',
+        labels={pop_col: 'População Total', 'estado': 'Estado'}
+    )
+    fig.update_layout(
+        height=400,
+        showlegend=False,
+        title=chart_title("Gráfico 2: População Total por Estado")
+    )
+    return fig
+
+
+def fig_populacao_bioma(df_bioma, pop_col, bioma_col):
+    fig = px.pie(
+        df_bioma,
+        values=pop_col,
+        names=bioma_col,
+        title='Distribuição Populacional por Bioma',
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        hole=0.4
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    fig.update_layout(
+        height=400,
+        title=chart_title("Gráfico 3: Distribuição Populacional por Bioma")
+    )
+    return fig
+
+
+# Acima deste número de pontos o scatter do Gráfico 4 usa WebGL (Scattergl)
+# e é amostrado até SCATTER_MAX_POINTS (ver summaries.thin_scatter)
+SCATTER_GL_MIN_POINTS = 2000
+SCATTER_MAX_POINTS = 5000
+
+
+def fig_pop_pib(df_scatter, pop_col, pib_col):
+    large = len(df_scatter) > SCATTER_GL_MIN_POINTS
+    if large:
+        # Só as colunas exibidas, com a precisão que o hover mostra
+        df_scatter = df_scatter[['municipio', 'estado', 'porte', pop_col, pib_col]].assign(**{
+            pop_col: df_scatter[pop_col].round(),
+            pib_col: df_scatter[pib_col].astype('float64').round(2),
+        })
+    fig = px.scatter(
+        df_scatter,
+        x=pop_col,
+        y=pib_col,
+        color='estado',
+        size=pib_col,
+        hover_name='municipio',
+        hover_data={'estado': True, pop_col: ':,', pib_col: ':,.2f', 'porte': True},
+        title='População vs PIB per capita por Estado',
+        labels={pop_col: 'População', pib_col: 'PIB per capita (R$)'},
+        log_x=True,
+        opacity=0.7,
+        render_mode='webgl' if large else 'auto'
+    )
+    fig.update_layout(
+        height=600,
+        title=chart_title("Gráfico 4: Relação entre População e PIB per capita")
+    )
+    return fig
+
+
+def fig_pib_estado(df_pib, pib_col):
+    fig = px.bar(
+        df_pib.sort_values(pib_col, ascending=True),
+        x=pib_col,
+        y='estado',
+        orientation='h',
+        color=pib_col,
+        color_continuous_scale='Greens',
+        title='PIB per capita Médio por Estado',
+        labels={pib_col: 'PIB per capita Médio (R$)', 'estado': 'Estado'}
+    )
+    fig.update_layout(
+        height=500,
+        showlegend=False,
+        title=chart_title("Gráfico 5: PIB per capita Médio por Estado")
+    )
+    return fig
+
+
+# Rótulos das faixas de porte no Gráfico 6; trocados só nas categorias
+PORTE_FAIXAS = {
+    'Pequeno': 'Pequeno\n(<20k)',
+    'Médio': 'Médio\n(20-100k)',
+    'Grande': 'Grande\n(100-500k)',
+    'Metrópole': 'Metrópole\n(>500k)',
+}
+
+
+def fig_pib_porte(df_porte, pib_col):
+    labels = {pib_col: 'PIB per capita (R$)', 'porte': 'Porte do Município'}
+    df_porte = df_porte.assign(porte=df_porte['porte'].cat.rename_categories(lambda p: PORTE_FAIXAS.get(p, p)))
+    if len(df_porte) > SUMMARY_MIN_POINTS:
+        fig = box_summary_figure(df_porte, 'porte', pib_col, px.colors.qualitative.Pastel, labels)
+    else:
+        fig = px.box(
+            df_porte,
+            x='porte',
+            y=pib_col,
+            color='porte',
+            title='Distribuição do PIB per capita por Porte Municipal',
+            labels=labels,
+            color_discrete_sequence=px.colors.qualitative.Pastel
+        )
+    fig.update_layout(
+        height=500,
+        showlegend=False,
+        title=chart_title("Gráfico 6: PIB per capita por Porte Municipal")
+    )
+    return fig
+
+
+def fig_idh_estado(df_idh, idh_col, estado_order):
+    labels = {idh_col: 'IDH', 'estado': 'Estado'}
+    if len(df_idh) > SUMMARY_MIN_POINTS:
+        fig = box_summary_figure(df_idh, 'estado', idh_col, px.colors.qualitative.Plotly, labels,
+                                 order=list(estado_order))
+    else:
+        fig = px.box(
+            df_idh,
+            x='estado',
+            y=idh_col,
+            color='estado',
+            title=f'Distribuição do IDH por Estado ({idh_col.split("_")[-1]})',
+            labels=labels,
+            category_orders={'estado': estado_order}
+        )
+    fig.update_layout(
+        height=500,
+        showlegend=False,
+        title=chart_title(f"Gráfico 7: Distribuição do IDH por Estado ({idh_col.split('_')[-1]})")
+    )
+    fig.add_hline(y=0.7, line_dash="dash", line_color="red",
+                  annotation_text="IDH Alto (0.7)")
+    return fig
+
+
+def fig_idh_porte(df_idh_pop, idh_col):
+    labels = {idh_col: 'IDH', 'porte': 'Porte do Município'}
+    if len(df_idh_pop) > SUMMARY_MIN_POINTS:
+        fig = violin_summary_figure(df_idh_pop, 'porte', idh_col, px.colors.qualitative.Set3, labels)
+    else:
+        fig = px.violin(
+            df_idh_pop,
+            x='porte',
+            y=idh_col,
+            color='porte',
+            box=True,
+            title='IDH por Porte Municipal (Violino + Box)',
+            labels=labels,
+            color_discrete_sequence=px.colors.qualitative.Set3
+        )
+    fig.update_layout(
+        height=500,
+        showlegend=False,
+        title=chart_title("Gráfico 8: IDH por Porte Municipal (Violin Plot)")
+    )
+    return fig
+
+
+def fig_idh_ranking(df_comparison, idh_col):
+    fig = px.bar(
+        df_comparison,
+        x=idh_col,
+        y='label',
+        color='categoria',
+        orientation='h',
+        title='Municípios com Melhor e Pior IDH',
+        labels={idh_col: 'IDH', 'label': 'Município'},
+        color_discrete_map={'Top 10 Melhores': '#2ecc71', 'Top 10 Piores': '#e74c3c'}
+    )
+    fig.update_layout(
+        height=600,
+        title=chart_title("Gráfico 9: Municípios com Melhor e Pior IDH")
+    )
+    return fig
+
+
+def fig_tendencia_estados(df_long, valor_label, log_y=False):
+    fig = px.line(
+        df_long,
+        x='ano',
+        y='valor',
+        color='estado',
+        markers=True,
+        title='Evolução por Estado',
+        labels={'valor': valor_label, 'ano': 'Ano', 'estado': 'Estado'},
+        log_y=log_y
+    )
+    fig.update_layout(
+        height=500,
+        xaxis={'tickmode': 'array', 'tickvals': sorted(df_long['ano'].unique())},
+        title=chart_title(f"Gráfico 10: Evolução de {valor_label} por Estado")
+    )
+    return fig
+
+
+def fig_cagr_municipios(df_rates, periodo, ultimo_ano=None):
+    fig = px.bar(
+        df_rates,
+        x='cagr',
+        y='label',
+        color='categoria',
+        orientation='h',
+        title='Municípios com Maior e Menor Crescimento Anual',
+        hover_data={'variacao_ultimo_ano': ':.1%'},
+        labels={'cagr': 'Crescimento anual composto (CAGR)', 'label': 'Município',
+                'variacao_ultimo_ano': ultimo_ano or 'Variação no último ano'},
+        color_discrete_map={'Maior crescimento': '#2ecc71', 'Menor crescimento': '#e74c3c'}
+    )
+    fig.update_layout(
+        height=600,
+        xaxis_tickformat='.1%',
+        title=chart_title(f"Gráfico 11: Municípios com Maior e Menor CAGR ({periodo})")
+    )
+    return fig
+
+
+def fig_mapa(df_map, pop_col, idh_col, df_cells=None):
+    # Com df_cells (nível de detalhe agregado), um marcador por célula
+    if df_cells is not None:
+        fig = px.scatter_mapbox(
+            df_cells,
+            lat="latitude",
+            lon="longitude",
+            hover_data={"municipios": True, "populacao": ":,", "idh": ":.3f",
+                        "latitude": False, "longitude": False},
+            size="populacao",
+            color="idh",
+            color_continuous_scale="RdYlGn",
+            size_max=20,
+            zoom=3.5,
+            height=600,
+            labels={"municipios": "Municípios", "populacao": "População", "idh": "IDH (ponderado)"},
+            title="Municípios Brasileiros: Tamanho = População, Cor = IDH"
+        )
+    else:
+        fig = px.scatter_mapbox(
+            df_map,
+            lat="latitude",
+            lon="longitude",
+            hover_name="municipio",
+            hover_data={"estado": True, pop_col: ":,", idh_col: ":.3f"},
+            size=pop_col if pop_col in df_map.columns else None,
+            color=idh_col if idh_col in df_map.columns else None,
+            color_continuous_scale="RdYlGn",
+            size_max=20,
+            zoom=3.5,
+            height=600,
+            title="Municípios Brasileiros: Tamanho = População, Cor = IDH"
+        )
+    fig.update_layout(
+        mapbox_style="open-street-map",
+        title=chart_title("Mapa 1: Localização Geográfica dos Municípios")
+    )
+    return fig
+
+
+def deck_colunas(df_deck):
+    view_state = pdk.ViewState(
+        latitude=df_deck["y"].mean(),
+        longitude=df_deck["x"].mean(),
+        zoom=3.5,
+        pitch=50,
+        bearing=-30
+    )
+
+    column_layer = pdk.Layer(
+        "ColumnLayer",
+        data=df_deck,
+        get_position=["x", "y"],
+        get_elevation="e",
+        elevation_scale=deck_elevation_scale(df_deck),
+        radius=10000,
+        get_fill_color=[255, 140, 0, 180],
+        pickable=True,
+        auto_highlight=True,
+    )
+
+    tooltip = {
+        "html": "<b>{m}</b><br/>Estado: {u}<br/>População: {v}",
+        "style": {"backgroundColor": "steelblue", "color": "white"}
+    }
+
+    return pdk.Deck(
+        layers=[column_layer],
+        initial_view_state=view_state,
+        tooltip=tooltip,
+    )
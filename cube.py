@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+from indexes import insert_sorted, kept_order
+from pipeline import PORTE_BINS, PORTE_LABELS, PORTE_MISSING, porte_codes
+
+SEM_INFORMACAO = "Sem informação"
+
+
+class AggregateCube:
+    # Agregados pré-calculados por célula (estado, bioma, porte) para um ano
+    # de população. Cada métrica guarda soma e contagem por célula,
+    # combináveis entre células. O índice extra de cada eixo guarda os
+    # valores ausentes.
+
+    def __init__(self, df, pop_col, metric_cols, bioma_col=None):
+        self.pop_col = pop_col
+        self.metric_cols = [c for c in metric_cols if c in df.columns]
+
+        estado = df["estado"].astype("category")
+        self.estados = list(estado.cat.categories)
+        estado_codes = _codes_with_missing(estado)
+
+        self._bioma_col = bioma_col if bioma_col and bioma_col in df.columns else None
+        if self._bioma_col:
+            bioma = df[bioma_col].astype("category")
+            self.biomas = list(bioma.cat.categories)
+            bioma_codes = _codes_with_missing(bioma)
+        else:
+            self.biomas = []
+            bioma_codes = np.zeros(len(df), dtype=np.int64)
+
+        pop = df[pop_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        porte = porte_codes(pop)
+
+        self.shape = (len(self.estados) + 1, len(self.biomas) + 1, PORTE_MISSING + 1)
+        self._estado_codes = estado_codes
+        self._cells = np.ravel_multi_index((estado_codes, bioma_codes, porte), self.shape)
+
+        self._values = {
+            col: df[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in self.metric_cols
+        }
+
+        self._full = self._aggregate(np.arange(len(df)))
+
+        # Linhas de cada faixa de porte ordenadas por população, para o
+        # fallback incremental do filtro de população mínima
+        self._porte_rows = []
+        self._porte_pop = []
+        for p in range(PORTE_MISSING):
+            rows = np.flatnonzero(porte == p)
+            rows = rows[np.argsort(pop[rows], kind='stable')]
+            self._porte_rows.append(rows)
+            self._porte_pop.append(pop[rows])
+
+    def _aggregate(self, rows):
+        return _bincount_cells(self._cells[rows], {col: v[rows] for col, v in self._values.items()}, self.shape)
+
+    def patch(self, df, changes):
+        # Nova versão a partir desta e do Changeset da atualização (ver
+        # sources.Changeset): só as linhas removidas e alteradas saem dos
+        # agregados das células e só as alteradas e novas entram, em vez de
+        # um bincount sobre todos os municípios. Estado ou bioma que não
+        # existia na versão anterior exige o cubo completo.
+        rows = changes.touched_new()
+        estado_codes = _codes_in(df["estado"].take(rows), self.estados)
+        if self._bioma_col:
+            bioma_codes = _codes_in(df[self._bioma_col].take(rows), self.biomas)
+        else:
+            bioma_codes = np.zeros(len(rows), dtype=np.int64)
+        if estado_codes is None or bioma_codes is None:
+            return AggregateCube(df, self.pop_col, self.metric_cols, self._bioma_col)
+
+        pop = df[self.pop_col].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        porte = porte_codes(pop)
+        cells = np.ravel_multi_index((estado_codes, bioma_codes, porte), self.shape)
+        values = {col: df[col].to_numpy(dtype=np.float64, na_value=np.nan)[rows] for col in self.metric_cols}
+
+        out = AggregateCube.__new__(AggregateCube)
+        out.pop_col, out.metric_cols, out._bioma_col = self.pop_col, self.metric_cols, self._bioma_col
+        out.estados, out.biomas, out.shape = self.estados, self.biomas, self.shape
+        stale = self._aggregate(np.flatnonzero(changes.stale_old()))
+        fresh = _bincount_cells(cells, values, self.shape)
+        out._full = _combine(_combine(self._full, stale, -1), fresh, 1)
+
+        kept = changes.kept()
+        out._estado_codes = _patch_rows(self._estado_codes, kept, rows, estado_codes, len(df))
+        out._cells = _patch_rows(self._cells, kept, rows, cells, len(df))
+        out._values = {col: _patch_rows(self._values[col], kept, rows, values[col], len(df))
+                       for col in self.metric_cols}
+
+        out._porte_rows = []
+        out._porte_pop = []
+        for p in range(PORTE_MISSING):
+            order, keep = kept_order(self._porte_rows[p], changes)
+            in_band = porte == p
+            order, band_pop = insert_sorted(order, self._porte_pop[p][keep], rows[in_band], pop[in_band])
+            out._porte_rows.append(order)
+            out._porte_pop.append(band_pop)
+        return out
+
+    def select(self, estados=None, min_pop=0):
+        # Máscara de estados (o índice de ausentes só entra sem filtro)
+        estado_mask = np.ones(self.shape[0], dtype=bool)
+        if estados:
+            estado_mask[:] = False
+            idx = pd.Index(self.estados).get_indexer(list(estados))
+            estado_mask[idx[idx >= 0]] = True
+
+        # Faixas de porte inteiramente dentro, fora ou cortadas por min_pop
+        porte_mask = np.zeros(self.shape[2], dtype=bool)
+        porte_mask[PORTE_MISSING] = min_pop <= 0
+        boundary = None
+        for p in range(PORTE_MISSING):
+            lo, hi = PORTE_BINS[p], PORTE_BINS[p + 1]
+            if lo >= min_pop:
+                porte_mask[p] = True
+            elif hi >= min_pop:
+                boundary = p
+
+        cell_mask = np.broadcast_to(
+            estado_mask[:, None, None] & porte_mask[None, None, :], self.shape
+        ).ravel()
+        partial = None
+        if boundary is not None:
+            rows = self._porte_rows[boundary]
+            start = np.searchsorted(self._porte_pop[boundary], min_pop, side='left')
+            rows = rows[start:]
+            rows = rows[estado_mask[self._estado_codes[rows]]]
+            partial = self._aggregate(rows)
+        return CubeView(self, cell_mask, partial)
+
+
+class CubeView:
+    # Recorte do cubo para um estado de filtros; todas as consultas operam
+    # sobre as células (custo independente do número de municípios)
+
+    def __init__(self, cube, cell_mask, partial=None):
+        self.cube = cube
+        self._mask = cell_mask
+        self._partial = partial
+
+    def _stat(self, stat, col=None):
+        full = self.cube._full if col is None else self.cube._full[col]
+        part = None
+        if self._partial is not None:
+            part = self._partial if col is None else self._partial[col]
+        key = "n" if col is None else stat
+        out = full[key] * self._mask
+        return out if part is None else out + part[key]
+
+    def _reduce(self, arr, by):
+        axis = {"estado": (1, 2), "bioma": (0, 2), "porte": (0, 1)}[by]
+        return arr.reshape(self.cube.shape).sum(axis=axis)
+
+    def _labels(self, by):
+        if by == "estado":
+            return self.cube.estados + [None]
+        if by == "bioma":
+            return self.cube.biomas + [SEM_INFORMACAO]
+        return PORTE_LABELS + [None]
+
+    def _series(self, values, by, present, name):
+        labels = self._labels(by)
+        keep = [i for i, ok in enumerate(present) if ok and labels[i] is not None]
+        return pd.Series(values[keep], index=pd.Index([labels[i] for i in keep], name=by), name=name)
+
+    def n(self):
+        return int(self._stat("n").sum())
+
+    def total(self, col):
+        return float(self._stat("sum", col).sum())
+
+    def sum(self, col, by):
+        n = self._reduce(self._stat("n"), by)
+        return self._series(self._reduce(self._stat("sum", col), by), by, n > 0, col)
+
+    def count(self, col, by):
+        n = self._reduce(self._stat("n"), by)
+        return self._series(self._reduce(self._stat("count", col), by), by, n > 0, col)
+
+    def mean(self, col, by):
+        n = self._reduce(self._stat("n"), by)
+        s = self._reduce(self._stat("sum", col), by)
+        c = self._reduce(self._stat("count", col), by)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._series(np.where(c > 0, s / c, np.nan), by, n > 0, col)
+
+
+def _codes_with_missing(cat):
+    codes = cat.cat.codes.to_numpy().astype(np.int64)
+    codes[codes < 0] = len(cat.cat.categories)
+    return codes
+
+
+def _codes_in(values, categories):
+    # Códigos de values nas categorias de uma versão anterior (ausente = índice
+    # extra); None se aparecer valor que ela não conhecia
+    values = values.astype(object)
+    codes = pd.Index(categories).get_indexer(values).astype(np.int64)
+    missing = values.isna().to_numpy()
+    if (codes[~missing] < 0).any():
+        return None
+    codes[missing] = len(categories)
+    return codes
+
+
+def _bincount_cells(cells, values, shape):
+    n_cells = int(np.prod(shape))
+    agg = {"n": np.bincount(cells, minlength=n_cells)}
+    for col, v in values.items():
+        ok = ~np.isnan(v)
+        c, v = cells[ok], v[ok]
+        agg[col] = {
+            "sum": np.bincount(c, weights=v, minlength=n_cells),
+            "count": np.bincount(c, minlength=n_cells),
+        }
+    return agg
+
+
+def _combine(a, b, sign):
+    # a + sign * b, célula a célula, para agregados de _bincount_cells
+    if isinstance(a, dict):
+        return {key: _combine(a[key], b[key], sign) for key in a}
+    return a + sign * b
+
+
+def _patch_rows(arr, kept, rows, values, n_rows):
+    # Valores por linha da nova versão: as linhas mantidas na ordem antiga,
+    # as novas no fim e as alteradas (e novas) sobrescritas em rows
+    out = np.empty(n_rows, dtype=arr.dtype)
+    n_kept = int(kept.sum())
+    out[:n_kept] = arr[kept]
+    out[rows] = values
+    return out
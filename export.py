@@ -0,0 +1,96 @@
+import gzip
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Formato exibido -> (extensão, MIME)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+EXPORT_BATCH_ROWS = 50000
+
+
+def open_batches(path, batch_rows=EXPORT_BATCH_ROWS):
+    # (esquema, linhas, lotes) do parquet de uma versão dos dados
+    parquet = pq.ParquetFile(path, memory_map=True)
+    return parquet.schema_arrow, parquet.metadata.num_rows, parquet.iter_batches(batch_size=batch_rows)
+
+
+def iter_filtered_batches(path, mask, batch_rows=EXPORT_BATCH_ROWS):
+    # Lê o arquivo em lotes e mantém só as linhas da máscara (mesma ordem
+    # de linhas do frame carregado); nunca materializa o conjunto inteiro
+    _, num_rows, batches = open_batches(path, batch_rows)
+    if num_rows != len(mask):
+        raise ValueError(f"Máscara de {len(mask)} linhas para {path} com {num_rows} linhas")
+    offset = 0
+    for batch in batches:
+        selected = mask[offset:offset + batch.num_rows]
+        offset += batch.num_rows
+        if selected.any():
+            yield batch.filter(pa.array(selected))
+
+
+def iter_csv_chunks(path, mask, batch_rows=EXPORT_BATCH_ROWS):
+    # Gerador de pedaços de CSV em bytes; o cabeçalho sai só no primeiro
+    header = True
+    for batch in iter_filtered_batches(path, mask, batch_rows):
+        yield batch.to_pandas().to_csv(index=False, header=header).encode("utf-8")
+        header = False
+    if header:
+        names = open_batches(path)[0].names
+        yield (",".join(names) + "\n").encode("utf-8")
+
+
+def write_export(path, mask, fmt, out_path):
+    if fmt == "csv":
+        with open(out_path, "wb") as f:
+            for chunk in iter_csv_chunks(path, mask):
+                f.write(chunk)
+    elif fmt == "csv.gz":
+        with gzip.open(out_path, "wb", compresslevel=6) as f:
+            for chunk in iter_csv_chunks(path, mask):
+                f.write(chunk)
+    elif fmt == "parquet":
+        schema = open_batches(path)[0]
+        with pq.ParquetWriter(out_path, schema) as writer:
+            for batch in iter_filtered_batches(path, mask):
+                writer.write_batch(batch)
+    else:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    return out_path
+
+
+class ExportCache:
+    # Arquivos exportados em disco por (estado dos filtros, formato), com
+    # descarte LRU; downloads repetidos só reabrem o arquivo
+
+    def __init__(self, directory=None, max_files=32):
+        self.directory = directory or tempfile.mkdtemp(prefix="ibge_export_")
+        self.max_files = max_files
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, key, source_path, mask, fmt):
+        with self._lock:
+            if key in self._files:
+                self._files.move_to_end(key)
+                return self._files[key]
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix="." + fmt)
+        os.close(fd)
+        write_export(source_path, mask, fmt, tmp_path)
+        with self._lock:
+            if key in self._files:
+                os.remove(tmp_path)
+                return self._files[key]
+            self._files[key] = tmp_path
+            while len(self._files) > self.max_files:
+                _, old_path = self._files.popitem(last=False)
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+        return tmp_path
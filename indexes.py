@@ -0,0 +1,177 @@
+import numpy as np
+
+
+class FilterIndex:
+    # Índices montados na carga para os filtros da sidebar:
+    # - um bitmap compactado (np.packbits) de linhas por estado;
+    # - a ordem das linhas por população (ausente = 0) para cada ano, de modo
+    #   que "população >= min_pop" vira uma busca binária e um sufixo.
+
+    def __init__(self, df, pop_cols=()):
+        self.n_rows = len(df)
+        self.estado_bitmaps = {}
+        if "estado" in df.columns:
+            estado = df["estado"].astype("category")
+            codes = estado.cat.codes.to_numpy()
+            for code, uf in enumerate(estado.cat.categories):
+                self.estado_bitmaps[uf] = np.packbits(codes == code)
+
+        self.pop_order = {}
+        self.pop_sorted = {}
+        for col in pop_cols:
+            if col not in df.columns:
+                continue
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            values = np.where(np.isnan(values), 0.0, values)
+            order = np.argsort(values, kind='stable')
+            self.pop_order[col] = order
+            self.pop_sorted[col] = values[order]
+
+    def patch(self, df, changes):
+        # Nova versão a partir desta e do Changeset da atualização (ver
+        # sources.Changeset): bitmaps renumerados sem as linhas removidas e
+        # reescritos só nas linhas alteradas e novas; ordens de população
+        # corrigidas por inserção, sem novo argsort
+        out = FilterIndex.__new__(FilterIndex)
+        out.n_rows = len(df)
+        rows = changes.touched_new()
+        kept = changes.kept()
+        n_kept = int(kept.sum())
+
+        out.estado_bitmaps = {}
+        if "estado" in df.columns:
+            estado = df["estado"].take(rows).astype(object).to_numpy()
+            ufs = set(self.estado_bitmaps) | {uf for uf in estado.tolist() if isinstance(uf, str)}
+            for uf in sorted(ufs):
+                bits = np.zeros(out.n_rows, dtype=bool)
+                old = self.estado_bitmaps.get(uf)
+                if old is not None:
+                    bits[:n_kept] = np.unpackbits(old, count=self.n_rows).astype(bool)[kept]
+                bits[rows] = estado == uf
+                if bits.any():
+                    out.estado_bitmaps[uf] = np.packbits(bits)
+
+        out.pop_order = {}
+        out.pop_sorted = {}
+        for col, order in self.pop_order.items():
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+            values = np.where(np.isnan(values), 0.0, values)
+            order, keep = kept_order(order, changes)
+            out.pop_order[col], out.pop_sorted[col] = insert_sorted(order, self.pop_sorted[col][keep], rows, values)
+        return out
+
+    def estado_bits(self, estado_sel):
+        if not estado_sel or not self.estado_bitmaps:
+            return None
+        bits = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        for estado in estado_sel:
+            bm = self.estado_bitmaps.get(estado)
+            if bm is not None:
+                bits |= bm
+        return bits
+
+    def pop_rows(self, pop_col, min_pop):
+        # Linhas com população >= min_pop, em ordem crescente de população
+        if pop_col not in self.pop_order:
+            return None
+        start = np.searchsorted(self.pop_sorted[pop_col], min_pop, side='left')
+        return self.pop_order[pop_col][start:]
+
+    def pop_bits(self, pop_col, min_pop):
+        rows = self.pop_rows(pop_col, min_pop)
+        if rows is None or len(rows) == self.n_rows:
+            return None
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask)
+
+    def mask(self, estado_sel, pop_col, min_pop):
+        # Interseção dos bitmaps, devolvida como máscara booleana por linha
+        bits = None
+        for part in (self.estado_bits(estado_sel), self.pop_bits(pop_col, min_pop)):
+            if part is not None:
+                bits = part if bits is None else bits & part
+        if bits is None:
+            return np.ones(self.n_rows, dtype=bool)
+        return np.unpackbits(bits, count=self.n_rows).astype(bool)
+
+
+class RankingIndex:
+    # Ordem pré-calculada (maior→menor e menor→maior) de cada coluna de
+    # métrica, sem os ausentes. Responde "top/bottom K dentro da máscara"
+    # percorrendo a ordem em blocos, sem copiar nem reordenar o frame.
+    # Empates seguem a ordem original, como nlargest/nsmallest(keep='first').
+
+    def __init__(self, df, metric_cols=()):
+        self.desc = {}
+        self.asc = {}
+        for col in metric_cols:
+            if col not in df.columns:
+                continue
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = np.flatnonzero(~np.isnan(values))
+            v = values[valid]
+            self.desc[col] = valid[np.argsort(-v, kind='stable')].astype(np.int32)
+            self.asc[col] = valid[np.argsort(v, kind='stable')].astype(np.int32)
+
+    def patch(self, df, changes):
+        # Nova versão a partir desta e do Changeset: as ordens perdem as
+        # linhas removidas e alteradas e recebem as alteradas e novas por
+        # inserção (mesmos desempates do argsort estável)
+        out = RankingIndex.__new__(RankingIndex)
+        out.desc = {}
+        out.asc = {}
+        rows = changes.touched_new()
+        for col in self.desc:
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            ok = ~np.isnan(values[rows])
+            new_rows, new_values = rows[ok], values[rows][ok]
+            desc, _ = kept_order(self.desc[col], changes)
+            asc, _ = kept_order(self.asc[col], changes)
+            out.desc[col] = insert_sorted(desc, -values[desc], new_rows, -new_values)[0]
+            out.asc[col] = insert_sorted(asc, values[asc], new_rows, new_values)[0]
+        return out
+
+    def top_k(self, col, mask, k):
+        return _first_k(self.desc[col], mask, k)
+
+    def bottom_k(self, col, mask, k):
+        return _first_k(self.asc[col], mask, k)
+
+
+def _first_k(order, mask, k, block=256):
+    # Blocos crescentes: filtros amplos resolvem no primeiro bloco, filtros
+    # seletivos (um estado pequeno) não pagam um passo por linha
+    found = []
+    total = 0
+    start = 0
+    while start < len(order) and total < k:
+        rows = order[start:start + block]
+        hits = rows if mask is None else rows[mask[rows]]
+        found.append(hits)
+        total += len(hits)
+        start += block
+        block *= 2
+    if not found:
+        return np.empty(0, dtype=np.int32)
+    return np.concatenate(found)[:k]
+
+
+def kept_order(order, changes):
+    # Ordem da versão anterior sem as linhas removidas ou alteradas, já nas
+    # posições novas; devolve também a máscara das entradas mantidas
+    keep = ~changes.stale_old()[order]
+    return changes.new_positions()[order[keep]].astype(order.dtype), keep
+
+
+def insert_sorted(order, sorted_values, rows, values):
+    # Insere rows (posições novas) numa ordem por (valor, posição), a mesma
+    # de um argsort estável sobre o frame inteiro
+    by = np.lexsort((rows, values))
+    rows, values = rows[by], values[by]
+    at = np.searchsorted(sorted_values, values, side='left')
+    end = np.searchsorted(sorted_values, values, side='right')
+    for i in np.flatnonzero(end > at):
+        # Empate com valores já presentes: entra pela posição da linha
+        at[i] += np.searchsorted(order[at[i]:end[i]], rows[i])
+    return np.insert(order, at, rows.astype(order.dtype)), np.insert(sorted_values, at, values)
@@ -0,0 +1,141 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Colunas anuais numéricas (populacao_estimada_2021, pib_per_capita_2020, idh_2010, ...)
+YEAR_PREFIXES = ("populacao_estimada_", "pib_per_capita_", "idh_")
+COORD_COLS = ("latitude", "longitude")
+
+# Strings repetidas que viram categóricas no arquivo colunar
+CATEGORY_COLS = ("estado",)
+CATEGORY_PREFIXES = ("bioma_",)
+# Inteiros que cabem em int32 (o código do IBGE tem 7 dígitos)
+INT32_COLS = ("codigo_ibge",)
+# Marcador de ausente no export do IBGE
+NA_VALUES = ["-"]
+
+
+def is_year_col(col):
+    return col.startswith(YEAR_PREFIXES)
+
+
+def is_category_col(col):
+    return col in CATEGORY_COLS or col.startswith(CATEGORY_PREFIXES)
+
+
+def parquet_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def downcast_int(s):
+    # int32 quando todos os valores são inteiros no intervalo; Int32 anulável
+    # se houver ausentes. Fora disso a coluna fica como veio.
+    values = pd.to_numeric(s, errors="coerce")
+    valid = values.dropna()
+    if len(valid) < s.notna().sum() or not (valid == valid.round()).all() or valid.abs().max() > 2 ** 31 - 1:
+        return s
+    return values.astype("Int32" if len(valid) < len(values) else "int32")
+
+
+def normalize_frame(df):
+    # Converte uma única vez o que antes era coagido a cada gráfico
+    for col in df.columns:
+        if is_year_col(col) or col in COORD_COLS:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif col in INT32_COLS:
+            df[col] = downcast_int(df[col])
+        elif is_category_col(col) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def storage_dtypes(columns):
+    # Plano de tipos sem perdas para o snapshot, decidido pelo esquema:
+    # números como float64 (ausente = NaN), códigos como Int32 anulável e
+    # strings repetidas como category. O plano compacto em memória (float32
+    # etc.) fica em pipeline.clean_frame.
+    plan = {}
+    for col in columns:
+        if is_year_col(col) or col in COORD_COLS:
+            plan[col] = "float64"
+        elif col in INT32_COLS:
+            plan[col] = "Int32"
+        elif is_category_col(col):
+            plan[col] = "category"
+    return plan
+
+
+def read_csv_planned(csv_path):
+    # Lê já nos tipos do plano, sem colunas de texto intermediárias nas
+    # colunas numéricas; se algum valor fugir do plano (texto que não é "-"
+    # numa coluna numérica), cai na leitura genérica com conversão tolerante
+    columns = pd.read_csv(csv_path, sep=",", encoding="utf-8", nrows=0).columns
+    try:
+        df = pd.read_csv(csv_path, sep=",", encoding="utf-8", dtype=storage_dtypes(columns), na_values=NA_VALUES)
+    except (ValueError, TypeError, OverflowError):
+        df = pd.read_csv(csv_path, sep=",", encoding="utf-8")
+    return normalize_frame(df)
+
+
+def memory_report(before, after):
+    # Bytes por coluna (contando o conteúdo das strings) antes e depois do
+    # plano de tipos
+    rows = []
+    for col in before.columns:
+        rows.append({
+            "coluna": col,
+            "tipo_antes": str(before[col].dtype),
+            "tipo_depois": str(after[col].dtype),
+            "bytes_antes": int(before[col].memory_usage(index=False, deep=True)),
+            "bytes_depois": int(after[col].memory_usage(index=False, deep=True)),
+        })
+    report = pd.DataFrame(rows)
+    report["reducao"] = (1 - report["bytes_depois"] / report["bytes_antes"]).round(3)
+    return report
+
+
+def write_parquet(df, parquet_path, metadata=None):
+    # Grava em arquivo temporário e troca atomicamente, para que outra
+    # sessão nunca leia um parquet pela metade. O temporário é de cada
+    # processo e thread: vários processos podem atualizar o snapshot juntos
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    tmp_path = f"{parquet_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+
+def csv_to_parquet(csv_path, parquet_path=None):
+    parquet_path = parquet_path or parquet_path_for(csv_path)
+    return write_parquet(read_csv_planned(csv_path), parquet_path)
+
+
+def read_columns(parquet_path, columns=None):
+    table = pq.read_table(
+        parquet_path,
+        columns=list(columns) if columns is not None else None,
+        memory_map=True,
+    )
+    return table.to_pandas()
+
+
+if __name__ == "__main__":
+    # Conversão offline: python ingest.py dados_lista.csv
+    # Memória antes/depois do plano de tipos: python ingest.py --memoria dados_lista.csv
+    args = sys.argv[1:]
+    if args[:1] == ["--memoria"]:
+        from pipeline import clean_frame
+        for path in args[1:] or ["dados_lista.csv"]:
+            report = memory_report(pd.read_csv(path, sep=",", encoding="utf-8"), clean_frame(read_csv_planned(path)))
+            print(report.to_string(index=False))
+            before, after = report["bytes_antes"].sum(), report["bytes_depois"].sum()
+            print(f"{path}: {before / 1024 ** 2:.2f} MB -> {after / 1024 ** 2:.2f} MB ({1 - after / before:.0%} menor)")
+    else:
+        for path in args or ["dados_lista.csv"]:
+            print(csv_to_parquet(path))
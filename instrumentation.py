@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Spans nomeados por rerun (carga, filtros, cada gráfico, mapas) e um
+# acumulado por processo exportável em JSON ou no formato texto do Prometheus
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = "ibge_dashboard"
+
+
+class Span:
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+        self.seconds = 0.0
+        self.rows = None
+        # Tamanho estimado do payload da figura (ver charts.figure_nbytes e,
+        # no mapa pydeck, charts.deck_nbytes)
+        self.bytes = None
+        self.hits = 0
+        self.misses = 0
+
+    def cache(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def as_dict(self):
+        return {
+            "span": self.name,
+            "ms": round(self.seconds * 1000, 2),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+        }
+
+
+class Profiler:
+    # Um por rerun. Spans aninhados não são somados ao pai; o rerun inteiro
+    # é medido de ponta a ponta por finish(). A pilha de spans abertos é
+    # por thread, para que gráficos montados em paralelo (ver render.py)
+    # anotem linhas, bytes e cache no próprio span.
+
+    def __init__(self, registry=None):
+        self.registry = registry
+        self.spans = []
+        self.started = time.perf_counter()
+        self.total = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name):
+        # Span medido de begin() até end(), que podem ocorrer em momentos
+        # distantes do rerun (gráfico agendado e desenhado depois)
+        span = Span(name)
+        span.started = time.perf_counter()
+        return span
+
+    def end(self, span):
+        span.seconds = time.perf_counter() - span.started
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def bind(self, span):
+        # Torna span o span corrente nesta thread sem medir tempo
+        self._stack.append(span)
+        try:
+            yield span
+        finally:
+            self._stack.pop()
+
+    @contextmanager
+    def span(self, name):
+        span = self.begin(name)
+        try:
+            with self.bind(span):
+                yield span
+        finally:
+            self.end(span)
+
+    @property
+    def current(self):
+        # Span aberto mais interno desta thread; None fora de qualquer span
+        stack = self._stack
+        return stack[-1] if stack else None
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        if self.registry is not None:
+            self.registry.record(self)
+        return self.total
+
+    def as_dict(self):
+        return {
+            "rerun_ms": round((self.total or 0.0) * 1000, 2),
+            "spans": [span.as_dict() for span in list(self.spans)],
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), ensure_ascii=False, indent=2)
+
+
+class MetricsRegistry:
+    # Acumulado do processo: histograma de duração por span e do rerun,
+    # contadores de linhas, bytes estimados de figura e acertos/faltas de cache,
+    # mais o estado dos caches compartilhados registrados em watch_cache
+
+    def __init__(self, buckets=SPAN_BUCKETS):
+        self.buckets = buckets
+        self.reruns = 0
+        self._spans = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def watch_cache(self, name, cache):
+        # cache precisa de stats() com hits, misses, evictions, entries e bytes
+        with self._lock:
+            self._caches[name] = cache
+
+    def cache_stats(self):
+        with self._lock:
+            caches = dict(self._caches)
+        return {name: cache.stats() for name, cache in caches.items()}
+
+    def _entry(self, name):
+        entry = self._spans.get(name)
+        if entry is None:
+            entry = {"count": 0, "seconds": 0.0, "buckets": [0] * len(self.buckets),
+                     "rows": 0, "bytes": 0, "hits": 0, "misses": 0}
+            self._spans[name] = entry
+        return entry
+
+    def _observe(self, entry, seconds):
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        for i, upper in enumerate(self.buckets):
+            if seconds <= upper:
+                entry["buckets"][i] += 1
+
+    def record(self, profiler):
+        with self._lock:
+            self.reruns += 1
+            self._observe(self._entry("rerun"), profiler.total)
+            for span in profiler.spans:
+                entry = self._entry(span.name)
+                self._observe(entry, span.seconds)
+                entry["rows"] += span.rows or 0
+                entry["bytes"] += span.bytes or 0
+                entry["hits"] += span.hits
+                entry["misses"] += span.misses
+
+    def as_dict(self):
+        with self._lock:
+            return {name: dict(entry, buckets=list(entry["buckets"])) for name, entry in self._spans.items()}
+
+    def to_json(self):
+        return json.dumps({"reruns": self.reruns, "spans": self.as_dict(), "caches": self.cache_stats()},
+                          ensure_ascii=False, indent=2)
+
+    def prometheus_text(self):
+        spans = self.as_dict()
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_span_seconds Duração dos spans instrumentados.",
+            f"# TYPE {p}_span_seconds histogram",
+        ]
+        for name, entry in spans.items():
+            label = _label(name)
+            for upper, count in zip(self.buckets, entry["buckets"]):
+                lines.append(f'{p}_span_seconds_bucket{{span="{label}",le="{upper}"}} {count}')
+            lines.append(f'{p}_span_seconds_bucket{{span="{label}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'{p}_span_seconds_sum{{span="{label}"}} {entry["seconds"]:.6f}')
+            lines.append(f'{p}_span_seconds_count{{span="{label}"}} {entry["count"]}')
+        for metric, key, help_text in (
+            ("span_rows_total", "rows", "Linhas processadas pelos spans."),
+            ("span_bytes_total", "bytes", "Bytes de payload de figura e do mapa pydeck, estimados (erro de até ~25%)."),
+            ("span_cache_hits_total", "hits", "Acertos de cache dentro dos spans."),
+            ("span_cache_misses_total", "misses", "Faltas de cache dentro dos spans."),
+        ):
+            lines.append(f"# HELP {p}_{metric} {help_text}")
+            lines.append(f"# TYPE {p}_{metric} counter")
+            for name, entry in spans.items():
+                if name != "rerun":
+                    lines.append(f'{p}_{metric}{{span="{_label(name)}"}} {entry[key]}')
+        caches = self.cache_stats()
+        for metric, key, kind, help_text in (
+            ("cache_hits_total", "hits", "counter", "Acertos de cada cache compartilhado."),
+            ("cache_misses_total", "misses", "counter", "Faltas de cada cache compartilhado."),
+            ("cache_evictions_total", "evictions", "counter", "Entradas descartadas pelo limite do cache."),
+            ("cache_entries", "entries", "gauge", "Entradas atualmente no cache."),
+            ("cache_bytes", "bytes", "gauge", "Custo estimado das entradas atuais do cache."),
+        ):
+            lines.append(f"# HELP {p}_{metric} {help_text}")
+            lines.append(f"# TYPE {p}_{metric} {kind}")
+            for name, stats in caches.items():
+                lines.append(f'{p}_{metric}{{cache="{_label(name)}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# Quadtree em graus: no nível 0 a célula tem 16°, e cada nível divide por 2
+# (nível 7 ≈ 0,125° ≈ 14 km). Só a célula do nível mais fino é guardada;
+# os níveis grossos saem por deslocamento de bits.
+GRID_BASE_DEG = 16.0
+GRID_LEVELS = 10
+MAP_MAX_MARKERS = 2000
+
+
+class GridPyramid:
+
+    def __init__(self, df, levels=GRID_LEVELS, base_deg=GRID_BASE_DEG):
+        self.levels = levels
+        self.base_deg = base_deg
+        lat = df["latitude"].to_numpy(dtype=np.float64, na_value=np.nan)
+        lon = df["longitude"].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.valid = ~(np.isnan(lat) | np.isnan(lon))
+        fine = base_deg / 2 ** levels
+        self.ix = np.floor((np.nan_to_num(lon) + 180.0) / fine).astype(np.int32)
+        self.iy = np.floor((np.nan_to_num(lat) + 90.0) / fine).astype(np.int32)
+        self.lat = lat
+        self.lon = lon
+
+    def cell_deg(self, level):
+        return self.base_deg / 2 ** level
+
+    def _codes(self, rows, level):
+        shift = self.levels - level
+        ny = (int(self.iy.max(initial=0)) >> shift) + 1
+        return (self.ix[rows] >> shift).astype(np.int64) * ny + (self.iy[rows] >> shift)
+
+    def choose_level(self, rows, max_markers=MAP_MAX_MARKERS):
+        # Nível mais fino cujo número de células ocupadas cabe no orçamento
+        best = 0
+        for level in range(self.levels + 1):
+            if len(np.unique(self._codes(rows, level))) > max_markers:
+                break
+            best = level
+        return best
+
+    def aggregate(self, rows, level, pop, idh):
+        # Agregados por célula: nº de municípios, soma da população, centro
+        # ponderado pela população e IDH médio ponderado pela população
+        codes, inverse = np.unique(self._codes(rows, level), return_inverse=True)
+        n_cells = len(codes)
+        p = np.nan_to_num(pop[rows])
+        w = np.where(p > 0, p, 1.0)
+        wsum = np.bincount(inverse, weights=w, minlength=n_cells)
+        lat = np.bincount(inverse, weights=self.lat[rows] * w, minlength=n_cells) / wsum
+        lon = np.bincount(inverse, weights=self.lon[rows] * w, minlength=n_cells) / wsum
+
+        idh = idh[rows]
+        has_idh = ~np.isnan(idh)
+        idh_w = np.bincount(inverse[has_idh], weights=w[has_idh], minlength=n_cells)
+        idh_sum = np.bincount(inverse[has_idh], weights=(idh * w)[has_idh], minlength=n_cells)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            idh_mean = np.where(idh_w > 0, idh_sum / idh_w, np.nan)
+
+        return pd.DataFrame({
+            "latitude": lat,
+            "longitude": lon,
+            "municipios": np.bincount(inverse, minlength=n_cells),
+            "populacao": np.bincount(inverse, weights=p, minlength=n_cells),
+            "idh": idh_mean,
+        })
+
+    def level_of_detail(self, mask, pop, idh, max_markers=MAP_MAX_MARKERS):
+        # Retorna (None, None) quando os pontos individuais cabem no orçamento;
+        # caso contrário, (nível, agregados por célula)
+        rows = np.flatnonzero(mask & self.valid)
+        if len(rows) <= max_markers:
+            return None, None
+        level = self.choose_level(rows, max_markers)
+        return level, self.aggregate(rows, level, pop, idh)
+
+
+# Altura máxima das colunas do mapa 3D (antes da elevation_scale da camada)
+DECK_MAX_ELEVATION = 500000
+
+
+def elevation_table(df, pop_cols):
+    # Altura de cada município normalizada pelo máximo nacional do ano,
+    # calculada uma vez por coluna de população
+    out = {}
+    for col in pop_cols:
+        v = np.nan_to_num(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+        top = v.max(initial=0.0)
+        scale = DECK_MAX_ELEVATION / top if top > 0 else 0.0
+        out[col] = (v * scale).astype(np.float32)
+    return out
+
+
+def deck_payload(df, rows, pop_col, elevation):
+    # Só o que a ColumnLayer e o tooltip usam, com chaves curtas e tipos
+    # compactos: evita serializar o frame inteiro como JSON
+    return pd.DataFrame({
+        "x": df["longitude"].to_numpy(dtype=np.float64)[rows].round(4),
+        "y": df["latitude"].to_numpy(dtype=np.float64)[rows].round(4),
+        "e": elevation[rows].round().astype(np.int32),
+        "m": df["municipio"].take(rows).to_numpy(),
+        "u": df["estado"].take(rows).astype(str).to_numpy(),
+        "v": np.nan_to_num(df[pop_col].to_numpy(dtype=np.float64, na_value=np.nan)[rows]).astype(np.int64),
+    })
+
+
+def deck_elevation_scale(payload, base_scale=0.1):
+    # Reescala para que a maior coluna do recorte chegue a DECK_MAX_ELEVATION,
+    # como a normalização pelo máximo filtrado fazia, sem tocar nas linhas
+    top = payload["e"].max() if len(payload) else 0
+    return base_scale * DECK_MAX_ELEVATION / top if top > 0 else base_scale
@@ -0,0 +1,188 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ingest import COORD_COLS, INT32_COLS, downcast_int, is_category_col
+
+# Tipos compactos por prefixo de coluna. População continua em float64:
+# int32 não representa ausentes e float32 perde precisão nas somas nacionais.
+FLOAT32_PREFIXES = ("pib_per_capita_", "idh_")
+# Texto livre com até esta fração de valores distintos vira category
+REPEATED_TEXT_RATIO = 0.5
+
+
+def memory_dtype(col):
+    # Plano de tipos em memória pelo nome da coluna (esquema do IBGE);
+    # None para as demais, em que só texto repetitivo muda de tipo
+    if col.startswith(FLOAT32_PREFIXES) or col in COORD_COLS:
+        return "float32"
+    if col.startswith("populacao_estimada_"):
+        return "float64"
+    if col in INT32_COLS:
+        return "int32"
+    if is_category_col(col):
+        return "category"
+    return None
+
+
+def _repeated_text(s):
+    return (pd.api.types.is_string_dtype(s.dtype) and len(s) > 0
+            and s.nunique() <= REPEATED_TEXT_RATIO * len(s))
+
+
+def clean_frame(df):
+    # Normaliza uma única vez; o resultado é compartilhado e tratado como
+    # somente leitura pelas abas (nenhuma aba deve alterá-lo)
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        dtype = memory_dtype(col)
+        if dtype in ("float32", "float64"):
+            if s.dtype != dtype:
+                s = pd.to_numeric(s, errors="coerce").astype(dtype)
+        elif dtype == "int32":
+            s = downcast_int(s)
+        elif (dtype == "category" or _repeated_text(s)) and not isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype("category")
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+# Faixas de porte municipal: (0, 20k], (20k, 100k], (100k, 500k], > 500k
+PORTE_BINS = [0, 20000, 100000, 500000, float('inf')]
+PORTE_LABELS = ['Pequeno', 'Médio', 'Grande', 'Metrópole']
+PORTE_MISSING = len(PORTE_LABELS)
+
+
+def porte_codes(pop):
+    # Mesmo critério de pd.cut(pop, PORTE_BINS); ausente ou <= 0 vira PORTE_MISSING
+    pop = np.asarray(pop, dtype=np.float64)
+    codes = np.searchsorted(PORTE_BINS[1:-1], pop, side='left').astype(np.int8)
+    codes[~(pop > 0)] = PORTE_MISSING
+    return codes
+
+
+class DerivedColumns:
+    # Colunas derivadas calculadas uma vez por frame (versão dos dados), na
+    # carga, em vez de a cada rerun:
+    # - porte de cada ano de população como código int8 (-1 = sem porte),
+    #   com PORTE_LABELS como tabela de rótulos compartilhada;
+    # - rótulo "Município - UF" como código int32 numa tabela de textos únicos;
+    # - presença de valor (not null) de cada coluna de métrica.
+    # Por rerun só há indexação pelas posições das linhas; rótulos de
+    # exibição diferentes (como as faixas do Gráfico 6) são aplicados na
+    # renderização, sobre as categorias.
+
+    def __init__(self, df, pop_cols=(), value_cols=()):
+        self.n_rows = len(df)
+        self.porte = {}
+        for col in pop_cols:
+            if col in df.columns:
+                codes = porte_codes(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+                codes[codes == PORTE_MISSING] = -1
+                self.porte[col] = codes
+        self.present = {col: df[col].notna().to_numpy() for col in value_cols if col in df.columns}
+        self.label_codes = None
+        self.label_values = None
+        if "municipio" in df.columns:
+            label = df["municipio"].astype(str)
+            if "estado" in df.columns:
+                label = label + " - " + df["estado"].astype(str)
+            codes, values = pd.factorize(label)
+            self.label_codes = codes.astype(np.int32)
+            self.label_values = np.asarray(values, dtype=object)
+
+    def rows(self, mask, *cols):
+        # Posições da máscara com valor presente em todas as colunas pedidas
+        # (equivale a df[mask].dropna(subset=cols))
+        keep = np.ones(self.n_rows, dtype=bool) if mask is None else mask.copy()
+        for col in cols:
+            keep &= self.present[col]
+        return np.flatnonzero(keep)
+
+    def porte_at(self, pop_col, rows):
+        return pd.Categorical.from_codes(self.porte[pop_col][rows], categories=PORTE_LABELS, validate=False)
+
+    def labels_at(self, rows):
+        # Só os textos das linhas pedidas; nenhum texto novo é montado
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.label_codes is None:
+            return rows.astype(str)
+        return self.label_values[self.label_codes[rows]]
+
+
+def filter_key(estado_sel, pop_col, pib_col, idh_col, min_pop, version=0):
+    # Ordem de seleção dos estados não muda o resultado; a versão dos dados
+    # separa entradas de antes e depois de uma atualização da fonte
+    return (frozenset(estado_sel or ()), pop_col, pib_col, idh_col, int(min_pop), version)
+
+
+def frame_nbytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(frame_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(frame_nbytes(v) for v in value.values())
+    return 0
+
+
+class FrameCache:
+    # LRU limitado em bytes, compartilhado entre sessões (as entradas são
+    # somente leitura). Chaves típicas: (filter_key, "mask"),
+    # (filter_key, "scatter"), ... O custo de cada entrada vem de sizeof.
+
+    def __init__(self, max_bytes=256 * 1024 ** 2, max_entries=256, sizeof=frame_nbytes):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        # Calcula fora do lock; duas sessões podem calcular a mesma chave
+        # em paralelo, e a última a terminar fica no cache
+        value = compute()
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while len(self._entries) > 1 and (
+                self.nbytes > self.max_bytes or len(self._entries) > self.max_entries
+            ):
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.nbytes -= old_size
+                self.evictions += 1
+        return value
+
+    def size_of(self, key):
+        # Custo registrado da entrada (sem contar como acesso), ou None
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+            }
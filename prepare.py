@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from charts import SCATTER_MAX_POINTS
+from summaries import thin_scatter
+
+# Preparo dos frames de entrada de cada gráfico a partir do frame da sessão,
+# das colunas derivadas (pipeline.DerivedColumns) e da máscara dos filtros.
+# app.py, report.py e benchmark.py montam os gráficos por aqui, para que os
+# três desenhem sempre os mesmos dados. Os frames devolvidos são indexados
+# pela posição da linha no frame da sessão.
+
+
+def observed(frame):
+    # Estado (todas as UFs) e porte (todas as faixas) chegam como category
+    # com categorias sem linhas no recorte; o Plotly Express 5.x trata cada
+    # categoria como grupo e falha com KeyError, então só as presentes seguem
+    cats = [c for c in frame.columns if isinstance(frame[c].dtype, pd.CategoricalDtype)]
+    return frame.assign(**{c: frame[c].cat.remove_unused_categories() for c in cats}) if cats else frame
+
+
+def labeled(frame, derived):
+    # Rótulo "Município - UF" dos Gráficos 1, 9 e 11
+    return observed(frame.assign(label=derived.labels_at(frame.index)))
+
+
+def valid_frame(df, derived, mask, pop_col, *cols):
+    # Linhas filtradas com valor na população e em cols, com o porte do ano
+    # de população já atribuído (Gráficos 4, 6 e 8)
+    rows = derived.rows(mask, pop_col, *cols)
+    out = df.take(rows)
+    if pop_col in derived.porte:
+        out = out.assign(porte=derived.porte_at(pop_col, rows))
+    return observed(out)
+
+
+def scatter_sample(df_scatter, pop_col, pib_col, max_points=SCATTER_MAX_POINTS):
+    # Pontos do Gráfico 4 quando amostrado (densidade, extremos e outliers)
+    if len(df_scatter) <= max_points:
+        return df_scatter
+    return observed(df_scatter.take(thin_scatter(df_scatter[pop_col], df_scatter[pib_col], max_points)))
+
+
+def idh_frame(df, derived, mask, idh_col):
+    # Linhas filtradas com IDH (Gráfico 7)
+    return observed(df.take(derived.rows(mask, idh_col)))
+
+
+def state_order(view, df_idh, idh_col):
+    # Estados pela média de IDH decrescente: do cubo (ou consulta) quando há,
+    # senão das linhas
+    if view is not None:
+        means = view.mean(idh_col, 'estado').dropna()
+    else:
+        means = df_idh.groupby('estado', observed=True)[idh_col].mean()
+    return means.sort_values(ascending=False).index
+
+
+def ranking_comparison(top, bottom, idh_col, derived):
+    # Gráfico 9: os 10 melhores e os 10 piores IDH lado a lado
+    cols = ['municipio', 'estado', idh_col]
+    df_comparison = pd.concat([top[cols].assign(categoria='Top 10 Melhores'),
+                               bottom[cols].assign(categoria='Top 10 Piores')])
+    return labeled(df_comparison, derived)
+
+
+def coord_rows(df, mask):
+    # Posições filtradas com latitude e longitude (mapas e vizinhança)
+    return np.flatnonzero(mask & df["latitude"].notna().to_numpy() & df["longitude"].notna().to_numpy())
+
+
+def map_cells(grid, df, mask, pop_col, idh_col):
+    # Nível de detalhe do Mapa 1: (None, None) quando os municípios cabem no
+    # orçamento de marcadores, senão (nível, agregados por célula)
+    return grid.level_of_detail(
+        mask,
+        df[pop_col].to_numpy(dtype=np.float64, na_value=np.nan),
+        df[idh_col].to_numpy(dtype=np.float64, na_value=np.nan),
+    )
+
+
+def map_points(df, mask, pop_col, idh_col):
+    # Um marcador por município com coordenadas; ausentes viram 0 no tamanho
+    # e na cor
+    df_map = df.take(coord_rows(df, mask))
+    return df_map.assign(**{c: df_map[c].fillna(0) for c in (pop_col, idh_col) if c in df_map.columns})
+
+
+def cagr_extremes(rates, derived, n=10):
+    # Gráfico 11: municípios com maior e menor CAGR (índice = posição da linha)
+    rates = rates.dropna(subset=["cagr"])
+    df_cagr = pd.concat([rates.nlargest(n, "cagr").assign(categoria="Maior crescimento"),
+                         rates.nsmallest(n, "cagr").assign(categoria="Menor crescimento")])
+    return labeled(df_cagr, derived)
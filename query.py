@@ -0,0 +1,170 @@
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cube import SEM_INFORMACAO
+from ingest import is_category_col, read_columns
+from pipeline import PORTE_BINS, PORTE_LABELS
+
+# Backend opcional de consultas: o snapshot é carregado uma vez por processo
+# num motor analítico embutido e os filtros/agrupamentos viram consultas
+# parametrizadas que devolvem só os frames pequenos usados pelos gráficos
+TABLE = "municipios"
+# Posição original da linha, para desempates iguais aos de nlargest(keep='first')
+POS_COL = "_pos"
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def porte_case(pop_col):
+    # Mesmo critério de pipeline.porte_codes; ausente ou <= 0 fica sem porte
+    col = quote(pop_col)
+    parts = [f"WHEN {col} IS NULL OR {col} <= 0 THEN NULL"]
+    for upper, label in zip(PORTE_BINS[1:-1], PORTE_LABELS):
+        parts.append(f"WHEN {col} <= {upper} THEN '{label}'")
+    parts.append(f"ELSE '{PORTE_LABELS[-1]}'")
+    return "CASE " + " ".join(parts) + " END"
+
+
+class QueryBackend:
+    # Base comum: montagem do WHERE e das consultas. As subclasses só sabem
+    # abrir a conexão e executar SQL com parâmetros "?".
+
+    def __init__(self, parquet_path, columns=None):
+        df = read_columns(parquet_path, columns)
+        for col in df.columns:
+            if is_category_col(col):
+                df[col] = df[col].astype(object)
+        self.columns = list(df.columns)
+        self.bioma_col = next((c for c in self.columns if c.startswith("bioma_")), None)
+        self._load(df.assign(**{POS_COL: np.arange(len(df))}))
+
+    def _load(self, df):
+        raise NotImplementedError
+
+    def run(self, sql, params=()):
+        raise NotImplementedError
+
+    def where(self, estado_sel, pop_col, min_pop):
+        clauses, params = [], []
+        if estado_sel and "estado" in self.columns:
+            clauses.append(f"estado IN ({', '.join('?' * len(estado_sel))})")
+            params.extend(estado_sel)
+        if pop_col:
+            clauses.append(f"COALESCE({quote(pop_col)}, 0) >= ?")
+            params.append(float(min_pop))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def view(self, estado_sel, pop_col, min_pop):
+        return QueryView(self, *self.where(estado_sel, pop_col, min_pop), pop_col=pop_col)
+
+
+class SqliteBackend(QueryBackend):
+    # Banco em memória compartilhado pelas sessões; o sqlite3 não permite uso
+    # concorrente da mesma conexão, então as consultas são serializadas
+
+    def _load(self, df):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        df.to_sql(TABLE, self._conn, index=False)
+        if "estado" in self.columns:
+            self._conn.execute(f"CREATE INDEX idx_estado ON {TABLE} (estado)")
+
+    def run(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=list(params))
+
+
+class DuckDbBackend(QueryBackend):
+    # Cada thread usa seu próprio cursor sobre o mesmo banco em memória
+
+    def _load(self, df):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("Backend DuckDB requer o pacote duckdb (pip install duckdb)")
+        self._conn = duckdb.connect(":memory:")
+        self._conn.register("carga", df)
+        self._conn.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM carga")
+        self._conn.unregister("carga")
+
+    def run(self, sql, params=()):
+        return self._conn.cursor().execute(sql, list(params)).df()
+
+
+QUERY_BACKENDS = {
+    "sqlite": SqliteBackend,
+    "duckdb": DuckDbBackend,
+}
+
+
+def query_backend(kind, parquet_path, columns=None):
+    if kind not in QUERY_BACKENDS:
+        raise ValueError(f"Backend de consultas desconhecido: {kind}")
+    return QUERY_BACKENDS[kind](parquet_path, columns)
+
+
+class QueryView:
+    # Mesma interface de cube.CubeView (n, total, sum, count, mean) para um
+    # estado de filtros, respondida por consultas agregadas
+
+    def __init__(self, backend, where, params, pop_col=None):
+        self.backend = backend
+        self.where = where
+        self.params = params
+        self.pop_col = pop_col
+
+    def _group_expr(self, by):
+        if by == "estado":
+            return "estado", "estado IS NOT NULL"
+        if by == "bioma":
+            return f"COALESCE({quote(self.backend.bioma_col)}, '{SEM_INFORMACAO}')", None
+        return porte_case(self.pop_col), None
+
+    def _grouped(self, agg, col, by):
+        expr, not_null = self._group_expr(by)
+        where = self.where
+        if not_null:
+            where = (where + " AND " if where else " WHERE ") + not_null
+        sql = f"SELECT {expr} AS grupo, {agg} AS valor FROM {TABLE}{where} GROUP BY grupo ORDER BY grupo"
+        out = self.backend.run(sql, self.params).dropna(subset=["grupo"])
+        # Mesma ordem de grupos do cubo: porte pela faixa, "Sem informação" no fim
+        if by == "porte":
+            out = out.set_index("grupo").reindex([p for p in PORTE_LABELS if p in set(out["grupo"])]).reset_index()
+        elif by == "bioma":
+            out = out.sort_values("grupo", key=lambda g: g == SEM_INFORMACAO, kind="stable")
+        return pd.Series(out["valor"].to_numpy(dtype=np.float64),
+                         index=pd.Index(out["grupo"].to_numpy(), name=by), name=col)
+
+    def n(self):
+        return int(self.backend.run(f"SELECT COUNT(*) AS n FROM {TABLE}{self.where}", self.params)["n"].iloc[0])
+
+    def total(self, col):
+        out = self.backend.run(f"SELECT SUM({quote(col)}) AS s FROM {TABLE}{self.where}", self.params)
+        value = out["s"].iloc[0]
+        return 0.0 if pd.isna(value) else float(value)
+
+    def sum(self, col, by):
+        return self._grouped(f"COALESCE(SUM({quote(col)}), 0)", col, by)
+
+    def count(self, col, by):
+        return self._grouped(f"COUNT({quote(col)})", col, by)
+
+    def mean(self, col, by):
+        return self._grouped(f"AVG({quote(col)})", col, by)
+
+    def top_k(self, col, k, columns=("municipio", "estado"), ascending=False):
+        # Top/bottom K do recorte, sem ausentes; empates pela ordem original.
+        # O índice é a posição da linha no frame, como em df.take(...)
+        where = (self.where + " AND " if self.where else " WHERE ") + f"{quote(col)} IS NOT NULL"
+        cols = ", ".join(quote(c) for c in list(columns) + [col, POS_COL])
+        order = "ASC" if ascending else "DESC"
+        sql = f"SELECT {cols} FROM {TABLE}{where} ORDER BY {quote(col)} {order}, {POS_COL} LIMIT ?"
+        return self.backend.run(sql, self.params + [int(k)]).set_index(POS_COL).rename_axis(None)
+
+    def bottom_k(self, col, k, columns=("municipio", "estado")):
+        return self.top_k(col, k, columns, ascending=True)
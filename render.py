@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+# Montagem das figuras fora da thread do script: cada gráfico é agendado no
+# ponto em que aparece na página (que reserva o lugar dele) e todos são
+# desenhados no fim do rerun, na ordem em que ficam prontos. O rerun passa a
+# custar o gráfico mais lento, não a soma de todos.
+RENDER_MAX_WORKERS = min(8, os.cpu_count() or 1)
+# Prazo por gráfico, contado do agendamento; depois dele o lugar recebe um
+# aviso e a montagem continua em segundo plano (o resultado vai para o cache)
+RENDER_TIMEOUT = 20.0
+
+
+def _run_inline(fn):
+    future = Future()
+    try:
+        future.set_result(fn())
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+class RenderScheduler:
+    # Um pool por processo. Trabalhos em andamento com a mesma chave são
+    # compartilhados entre sessões e reruns: o rerun seguinte a um estouro de
+    # prazo espera a mesma montagem em vez de começar outra.
+    # max_workers=0 monta tudo na thread de quem agenda (ordem sequencial).
+
+    def __init__(self, max_workers=RENDER_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="render") if max_workers > 0 else None
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn):
+        if self._pool is None:
+            return _run_inline(fn)
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None:
+                return future
+            future = self._pool.submit(fn)
+            self._running[key] = future
+        # Fora do lock: o callback roda na hora se o trabalho já terminou
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._running.get(key) is future:
+                del self._running[key]
+
+
+class RenderJob:
+
+    def __init__(self, future, deadline, item):
+        self.future = future
+        self.deadline = deadline
+        self.item = item
+
+
+class RenderBatch:
+    # Gráficos agendados por um rerun. item é o que o script precisa para
+    # desenhar o resultado (lugar reservado, span, função de desenho).
+
+    def __init__(self, scheduler, timeout=RENDER_TIMEOUT):
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self._jobs = []
+
+    def add(self, key, fn, item, inline=False):
+        # inline=True para o que já está em cache: resolve na hora, sem
+        # passar pelo pool (e sem risco de estourar o prazo)
+        future = _run_inline(fn) if inline else self.scheduler.submit(key, fn)
+        self._jobs.append(RenderJob(future, time.perf_counter() + self.timeout, item))
+        return future
+
+    def drain(self):
+        # Gera (item, future) conforme os trabalhos terminam, e (item, None)
+        # para os que passaram do prazo
+        pending = self._jobs
+        self._jobs = []
+        while pending:
+            now = time.perf_counter()
+            expired = [job for job in pending if job.deadline <= now and not job.future.done()]
+            for job in expired:
+                yield job.item, None
+            pending = [job for job in pending if job not in expired]
+            if not pending:
+                break
+            timeout = max(0.0, min(job.deadline for job in pending) - now)
+            done, _ = wait({job.future for job in pending}, timeout=timeout, return_when=FIRST_COMPLETED)
+            # Prontos ao mesmo tempo saem na ordem de agendamento
+            for job in pending:
+                if job.future in done:
+                    yield job.item, job.future
+            pending = [job for job in pending if job.future not in done]
@@ -0,0 +1,223 @@
+import argparse
+import html
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import plotly.io as pio
+
+from charts import (
+    deck_colunas, fig_cagr_municipios, fig_idh_estado, fig_idh_porte,
+    fig_idh_ranking, fig_mapa, fig_pib_estado, fig_pib_porte, fig_pop_pib, fig_populacao_bioma,
+    fig_populacao_estado, fig_tendencia_estados, fig_top_populacao,
+)
+from cube import AggregateCube
+from indexes import FilterIndex, RankingIndex
+from ingest import is_year_col
+from maps import GridPyramid, deck_payload, elevation_table
+from pipeline import DerivedColumns
+from prepare import (
+    cagr_extremes, coord_rows, idh_frame, labeled, map_cells, map_points, ranking_comparison, scatter_sample,
+    state_order, valid_frame,
+)
+from shared import attach_frame
+from sources import Dataset, source_for
+from timeseries import TimeSeriesStore, series_columns, year_columns
+
+# Relatório em lote, sem Streamlit: os gráficos e mapas do dashboard para o
+# país e para cada estado, em JSON (spec Plotly / pydeck) e HTML.
+#   python report.py --saida relatorio/ [--estados SP RJ] [--processos 4]
+# O frame limpo é o mesmo arquivo Arrow mapeado pelo app (shared.py); cada
+# processo monta índices, cubo e colunas derivadas uma única vez e os usa
+# para todos os estados que renderizar.
+NACIONAL = "BR"
+TOP_N = 15
+
+
+def latest(columns, prefix):
+    # Último ano disponível, o mesmo que o app seleciona por padrão
+    cols = year_columns(columns, prefix)
+    return cols[-1][1] if cols else None
+
+
+class ReportData:
+    # Mesmas estruturas que o app mantém em st.cache_resource
+
+    def __init__(self, df, df_series, pop_col, pib_col, idh_col, bioma_col):
+        self.df = df
+        self.pop_col, self.pib_col, self.idh_col, self.bioma_col = pop_col, pib_col, idh_col, bioma_col
+        metric_cols = [c for c in df.columns if is_year_col(c)]
+        self.estados = sorted(df["estado"].dropna().unique())
+        self.filter_index = FilterIndex(df, [pop_col])
+        self.ranking = RankingIndex(df, metric_cols)
+        self.cube = AggregateCube(df, pop_col, metric_cols, bioma_col)
+        self.derived = DerivedColumns(df, [pop_col], metric_cols)
+        self.grid = GridPyramid(df)
+        self.elevations = elevation_table(df, [pop_col])[pop_col]
+        self.series = TimeSeriesStore(df_series) if df_series is not None else None
+
+    @classmethod
+    def attach(cls, shared_path, columns, series_cols):
+        # Frames sem cópia a partir do arquivo Arrow publicado
+        pop_col, pib_col, idh_col, bioma_col = columns
+        session_cols = ["municipio", "estado", "latitude", "longitude", bioma_col, pop_col, pib_col, idh_col]
+        df = attach_frame(shared_path, [c for c in session_cols if c])
+        df_series = attach_frame(shared_path, series_cols) if series_cols else None
+        return cls(df, df_series, pop_col, pib_col, idh_col, bioma_col)
+
+
+def state_figures(data, estado_sel, top_n=TOP_N):
+    # Gera (id, figura) na ordem do dashboard, com o mesmo preparo de app.py
+    df, derived = data.df, data.derived
+    pop_col, pib_col, idh_col, bioma_col = data.pop_col, data.pib_col, data.idh_col, data.bioma_col
+    mask = data.filter_index.mask(estado_sel, pop_col, 0)
+    view = data.cube.select(estado_sel, 0)
+
+    df_top = df.take(data.ranking.top_k(pop_col, mask, top_n))
+    yield "grafico01", fig_top_populacao(labeled(df_top, derived), pop_col, top_n)
+    yield "grafico02", fig_populacao_estado(view.sum(pop_col, 'estado').reset_index(), pop_col)
+    if bioma_col:
+        yield "grafico03", fig_populacao_bioma(
+            view.sum(pop_col, 'bioma').rename_axis(bioma_col).reset_index(), pop_col, bioma_col)
+
+    if pib_col:
+        df_scatter = valid_frame(df, derived, mask, pop_col, pib_col)
+        yield "grafico04", fig_pop_pib(scatter_sample(df_scatter, pop_col, pib_col), pop_col, pib_col)
+        yield "grafico05", fig_pib_estado(view.mean(pib_col, 'estado').reset_index(), pib_col)
+        yield "grafico06", fig_pib_porte(df_scatter, pib_col)
+
+    if idh_col:
+        df_idh = idh_frame(df, derived, mask, idh_col)
+        yield "grafico07", fig_idh_estado(df_idh, idh_col, state_order(view, df_idh, idh_col))
+        yield "grafico08", fig_idh_porte(valid_frame(df, derived, mask, pop_col, idh_col), idh_col)
+        yield "grafico09", fig_idh_ranking(ranking_comparison(
+            df.take(data.ranking.top_k(idh_col, mask, 10)), df.take(data.ranking.bottom_k(idh_col, mask, 10)),
+            idh_col, derived), idh_col)
+
+        _, df_cells = map_cells(data.grid, df, mask, pop_col, idh_col)
+        df_map = map_points(df, mask, pop_col, idh_col) if df_cells is None else None
+        yield "mapa1", fig_mapa(df_map, pop_col, idh_col, df_cells)
+
+    yield "mapa2", deck_colunas(deck_payload(df, coord_rows(df, mask), pop_col, data.elevations))
+
+    if data.series is not None and "populacao" in data.series and len(data.series.years("populacao")) > 1:
+        anos = [int(a) for a in data.series.years("populacao")]
+        yield "grafico10", fig_tendencia_estados(data.series.state_long("populacao", mask), "População")
+        df_cagr = cagr_extremes(data.series.municipio_rates("populacao", anos[0], anos[-1], mask), derived)
+        if len(df_cagr):
+            yield "grafico11", fig_cagr_municipios(df_cagr, f"{anos[0]}–{anos[-1]}")
+
+
+def write_state(data, uf, outdir, formats, top_n=TOP_N):
+    # Grava as figuras de um estado (ou do país) em outdir/<UF>/
+    estado_sel = [] if uf == NACIONAL else [uf]
+    folder = os.path.join(outdir, uf)
+    os.makedirs(folder, exist_ok=True)
+    titulo = "Brasil" if uf == NACIONAL else uf
+    parts = []
+    written = 0
+    for chart_id, fig in state_figures(data, estado_sel, top_n):
+        is_deck = hasattr(fig, "layers")
+        if "json" in formats:
+            spec = fig.to_json() if is_deck else pio.to_json(fig, validate=False)
+            with open(os.path.join(folder, f"{chart_id}.json"), "w", encoding="utf-8") as f:
+                f.write(spec)
+            written += 1
+        if "html" in formats:
+            if is_deck:
+                # O pydeck só gera página inteira; fica ao lado e é embutida
+                fig.to_html(os.path.join(folder, f"{chart_id}.html"), open_browser=False, notebook_display=False)
+                parts.append(f'<iframe src="{chart_id}.html" width="100%" height="600" frameborder="0"></iframe>')
+                written += 1
+            else:
+                parts.append(pio.to_html(fig, full_html=False, include_plotlyjs="cdn" if not parts else False,
+                                         validate=False))
+    if "html" in formats:
+        with open(os.path.join(folder, "index.html"), "w", encoding="utf-8") as f:
+            f.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>IBGE Cidades — "
+                    f"{html.escape(titulo)}</title></head><body><h1>Dashboard IBGE Cidades — {html.escape(titulo)}</h1>"
+                    + "\n".join(parts) + "</body></html>")
+        written += 1
+    return written
+
+
+# Dados do processo trabalhador, montados uma vez no initializer
+_worker_data = None
+
+
+def _init_worker(shared_path, columns, series_cols):
+    global _worker_data
+    _worker_data = ReportData.attach(shared_path, columns, series_cols)
+
+
+def _render(uf, outdir, formats, top_n):
+    start = time.perf_counter()
+    written = write_state(_worker_data, uf, outdir, formats, top_n)
+    return uf, written, time.perf_counter() - start
+
+
+def write_index(outdir, ufs):
+    links = "".join(f'<li><a href="{uf}/index.html">{"Brasil" if uf == NACIONAL else uf}</a></li>' for uf in ufs)
+    with open(os.path.join(outdir, "index.html"), "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Relatório IBGE Cidades</title></head>"
+                f"<body><h1>Relatório IBGE Cidades</h1><ul>{links}</ul></body></html>")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera os gráficos do dashboard para o país e cada estado, sem Streamlit")
+    parser.add_argument("--dados", default=os.environ.get("IBGE_DADOS", "dados_lista.csv"),
+                        help="fonte dos dados (CSV, Parquet, SQLite ou DuckDB)")
+    parser.add_argument("--saida", default="relatorio", help="pasta de saída")
+    parser.add_argument("--estados", nargs="+", help="UFs a gerar (padrão: todas)")
+    parser.add_argument("--sem-nacional", action="store_true", help="não gera a página do país")
+    parser.add_argument("--formatos", nargs="+", choices=["json", "html"], default=["json", "html"])
+    parser.add_argument("--top", type=int, default=TOP_N, help="municípios no Gráfico 1")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1,
+                        help="processos em paralelo (0 = tudo no processo atual)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dataset = Dataset(source_for(args.dados))
+    dataset.refresh()
+    all_cols = dataset.columns()
+    columns = (
+        latest(all_cols, "populacao_estimada_"),
+        latest(all_cols, "pib_per_capita_"),
+        latest(all_cols, "idh_"),
+        next((c for c in reversed(all_cols) if c.startswith("bioma_")), None),
+    )
+    if columns[0] is None or "estado" not in all_cols:
+        parser.error("os dados precisam das colunas estado e populacao_estimada_<ano>")
+    series_cols = [c for c in ["municipio", "estado"] if c in all_cols] + series_columns(all_cols)
+    # Publicado uma vez; os processos só mapeiam o arquivo
+    shared_path = dataset.shared_path()
+    estados = sorted(attach_frame(shared_path, ["estado"])["estado"].dropna().unique())
+    ufs = ([] if args.sem_nacional else [NACIONAL]) + [uf for uf in estados if not args.estados or uf in args.estados]
+    if not ufs:
+        parser.error("nenhuma página a gerar: nenhum estado corresponde a --estados e --sem-nacional foi usado")
+    os.makedirs(args.saida, exist_ok=True)
+    print(f"Dados prontos em {time.perf_counter() - start:.1f} s; {len(ufs)} páginas", flush=True)
+
+    if args.processos <= 0:
+        _init_worker(shared_path, columns, series_cols)
+        results = (_render(uf, args.saida, args.formatos, args.top) for uf in ufs)
+        for uf, written, seconds in results:
+            print(f"{uf}: {written} arquivos em {seconds:.2f} s", flush=True)
+    else:
+        # spawn: o pyarrow mantém threads próprias, que não sobrevivem a fork
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(args.processos, len(ufs)), mp_context=context,
+                                 initializer=_init_worker, initargs=(shared_path, columns, series_cols)) as pool:
+            futures = [pool.submit(_render, uf, args.saida, args.formatos, args.top) for uf in ufs]
+            for future in as_completed(futures):
+                uf, written, seconds = future.result()
+                print(f"{uf}: {written} arquivos em {seconds:.2f} s", flush=True)
+
+    if "html" in args.formatos:
+        write_index(args.saida, ufs)
+    print(f"Relatório em {args.saida} ({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
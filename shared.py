@@ -0,0 +1,132 @@
+import glob
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Frame limpo publicado uma vez por versão dos dados como arquivo Arrow IPC
+# sem compressão. Todas as sessões e todos os processos do servidor mapeiam o
+# mesmo arquivo: as páginas ficam no cache do sistema operacional uma única
+# vez e as colunas numéricas viram arrays NumPy somente leitura apontando
+# direto para o mapeamento (sem cópia).
+SHARED_SUFFIX = ".arrow"
+# Versões antigas só são apagadas depois deste prazo, para que processos que
+# ainda não viram a atualização possam terminar o rerun em andamento
+STALE_GRACE_SECONDS = 600
+
+_maps = {}
+_maps_lock = threading.Lock()
+# Um lock por arquivo publicado: só uma thread do processo faz a conversão
+_publish_locks = {}
+
+
+def shared_path_for(snapshot_path, token, suffix=SHARED_SUFFIX):
+    return f"{os.path.splitext(snapshot_path)[0]}.{token}{suffix}"
+
+
+def _arrow_column(s):
+    # NaN continua valor (sem bitmap de nulos), o que permite a conversão
+    # sem cópia de volta para float; texto e categorias seguem o padrão
+    if s.dtype.kind in "fiub":
+        return pa.array(s.to_numpy(), from_pandas=False)
+    return pa.array(s)
+
+
+def publish_frame(df, path):
+    # Grava em arquivo temporário exclusivo (mkstemp) e troca atomicamente;
+    # processos que publicarem a mesma versão ao mesmo tempo geram arquivos
+    # idênticos, e nenhum escritor trunca o temporário de outro
+    table = pa.table({col: _arrow_column(df[col]) for col in df.columns})
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=name + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def _publish_lock(path):
+    with _maps_lock:
+        return _publish_locks.setdefault(path, threading.Lock())
+
+
+def ensure_published(path, build):
+    # Publica build() em path se ainda não existir. Sessões do mesmo processo
+    # esperam a conversão em andamento em vez de repeti-la
+    if os.path.exists(path):
+        return path
+    with _publish_lock(path):
+        if not os.path.exists(path):
+            publish_frame(build(), path)
+            release_stale(path)
+    return path
+
+
+def ensure_linked(source, path):
+    # Cópia fixa de source em path (link físico quando o sistema de arquivos
+    # permite). O snapshot é trocado com os.replace, então o link continua
+    # apontando para o conteúdo desta versão depois de uma atualização
+    if os.path.exists(path):
+        return path
+    with _publish_lock(path):
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, path)
+            release_stale(path)
+    return path
+
+
+def attach_table(path):
+    # Um mapeamento por arquivo e processo, reaproveitado entre sessões
+    with _maps_lock:
+        table = _maps.get(path)
+        if table is None:
+            table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+            _maps[path] = table
+        return table
+
+
+def attach_frame(path, columns=None):
+    table = attach_table(path)
+    if columns is not None:
+        table = table.select(list(columns))
+    # split_blocks evita consolidar colunas num bloco novo (que copiaria tudo)
+    return table.to_pandas(split_blocks=True)
+
+
+def release_stale(path, grace=STALE_GRACE_SECONDS):
+    # Remove versões antigas publicadas ao lado (mesma extensão); quem ainda
+    # as mapeia continua lendo normalmente até soltar o mapeamento
+    stem, suffix = os.path.splitext(path)
+    base = stem.rsplit(".", 1)[0]
+    now = time.time()
+    with _maps_lock:
+        for old in glob.glob(f"{glob.escape(base)}.*{suffix}"):
+            # Só arquivos publicados (token hexadecimal), nunca outros
+            # arquivos do usuário com o mesmo prefixo
+            token = old[len(base) + 1:-len(suffix)]
+            if old == path or not re.fullmatch(r"[0-9a-f]+", token):
+                continue
+            _maps.pop(old, None)
+            _publish_locks.pop(old, None)
+            try:
+                if now - os.path.getmtime(old) > grace:
+                    os.remove(old)
+            except OSError:
+                pass
+
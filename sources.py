@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from ingest import normalize_frame, parquet_path_for, read_columns, read_csv_planned, write_parquet
+from pipeline import clean_frame
+from shared import attach_frame, ensure_linked, ensure_published, shared_path_for
+
+# Chave estável de cada município entre exportações do IBGE
+KEY_COL = "codigo_ibge"
+# Chave do metadado do snapshot com a impressão digital da fonte
+FINGERPRINT_KEY = b"ibge_fonte"
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DataSource:
+    # Uma fonte de dados em arquivo local. A impressão digital barata (mtime e
+    # tamanho) é conferida a cada rerun; o hash do conteúdo só é calculado
+    # quando ela muda, para ignorar arquivos apenas "tocados".
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def stat(self):
+        st = os.stat(self.path)
+        return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+    def content_hash(self):
+        return file_sha1(self.path)
+
+    def read(self):
+        raise NotImplementedError
+
+    def snapshot_path(self):
+        # Parquet normalizado que as sessões leem (mapeado em memória)
+        return os.path.splitext(self.path)[0] + ".snapshot.parquet"
+
+
+class CsvSource(DataSource):
+
+    def read(self):
+        return read_csv_planned(self.path)
+
+    def snapshot_path(self):
+        # Mesmo parquet que ingest.csv_to_parquet gera para o CSV
+        return parquet_path_for(self.path)
+
+
+class ParquetSource(DataSource):
+
+    def read(self):
+        return normalize_frame(pq.read_table(self.path).to_pandas())
+
+
+class SqliteSource(DataSource):
+
+    def __init__(self, path, table="municipios"):
+        super().__init__(path)
+        self.table = table
+
+    def read(self):
+        with closing(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)) as conn:
+            return normalize_frame(pd.read_sql_query(f'SELECT * FROM "{self.table}"', conn))
+
+
+class DuckDbSource(DataSource):
+
+    def __init__(self, path, table="municipios"):
+        super().__init__(path)
+        self.table = table
+
+    def read(self):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("Fonte DuckDB requer o pacote duckdb (pip install duckdb)")
+        with duckdb.connect(self.path, read_only=True) as conn:
+            return normalize_frame(conn.execute(f'SELECT * FROM "{self.table}"').df())
+
+
+SOURCE_TYPES = {
+    ".csv": CsvSource,
+    ".parquet": ParquetSource,
+    ".sqlite": SqliteSource,
+    ".sqlite3": SqliteSource,
+    ".db": SqliteSource,
+    ".duckdb": DuckDbSource,
+}
+
+
+def source_for(path, **options):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SOURCE_TYPES:
+        raise ValueError(f"Tipo de fonte de dados desconhecido: {path}")
+    return SOURCE_TYPES[ext](path, **options)
+
+
+class Changeset:
+    # Diferença entre dois snapshots, em posições de linha. O novo snapshot
+    # mantém a ordem do anterior: removidos saem, alterados ficam no lugar
+    # (updated são posições novas) e novos municípios vão para o fim.
+    # full=True quando não há como comparar (esquema mudou, sem chave,
+    # snapshot gravado por outro processo).
+
+    def __init__(self, n_old=0, removed=(), updated=(), added=0, full=False):
+        self.n_old = n_old
+        self.full = full
+        self.removed = np.asarray(removed, dtype=np.int64)
+        self.updated = np.asarray(updated, dtype=np.int64)
+        self.added = added
+
+    def __len__(self):
+        return len(self.removed) + len(self.updated) + self.added
+
+    def __repr__(self):
+        if self.full:
+            return "Changeset(full)"
+        return f"Changeset(removed={len(self.removed)}, updated={len(self.updated)}, added={self.added})"
+
+    def kept(self):
+        # Linhas antigas que continuam no snapshot
+        kept = np.ones(self.n_old, dtype=bool)
+        kept[self.removed] = False
+        return kept
+
+    def new_positions(self):
+        # Posição nova de cada linha antiga (-1 se removida)
+        kept = self.kept()
+        out = np.full(self.n_old, -1, dtype=np.int64)
+        out[kept] = np.arange(int(kept.sum()))
+        return out
+
+    def stale_old(self):
+        # Linhas antigas cujos valores não valem mais (removidas ou alteradas)
+        kept = self.kept()
+        stale = ~kept
+        stale[np.flatnonzero(kept)[self.updated]] = True
+        return stale
+
+    def touched_new(self):
+        # Linhas novas a (re)indexar: alteradas e acrescentadas
+        n_kept = self.n_old - len(self.removed)
+        return np.concatenate([self.updated, np.arange(n_kept, n_kept + self.added)])
+
+
+def diff_frames(old, new, key=KEY_COL):
+    # Compara por código do município usando um hash por linha; devolve o
+    # novo frame já na ordem do snapshot e o Changeset
+    if key not in old.columns or key not in new.columns or list(old.columns) != list(new.columns):
+        return new, Changeset(full=True)
+    if old[key].duplicated().any() or new[key].duplicated().any():
+        return new, Changeset(full=True)
+
+    new_pos = pd.Index(new[key]).get_indexer(old[key])
+    kept = np.flatnonzero(new_pos >= 0)
+    removed = np.flatnonzero(new_pos < 0)
+    added = np.setdiff1d(np.arange(len(new)), new_pos[kept], assume_unique=True)
+    order = np.concatenate([new_pos[kept], added])
+    new = new.take(order).reset_index(drop=True)
+
+    old_hash = pd.util.hash_pandas_object(old.take(kept), index=False).to_numpy()
+    new_hash = pd.util.hash_pandas_object(new.iloc[:len(kept)], index=False).to_numpy()
+    updated = np.flatnonzero(old_hash != new_hash)
+    return new, Changeset(len(old), removed, updated, len(added))
+
+
+class Dataset:
+    # Snapshot em parquet de uma fonte, com atualização incremental: só uma
+    # mudança real no conteúdo gera nova versão, e a nova exportação é
+    # comparada com o snapshot por codigo_ibge (Changeset). Cubo e índices
+    # são corrigidos só nas linhas alteradas (derived); colunas derivadas,
+    # grade, elevações e séries são remontadas a cada versão. O frame limpo
+    # é publicado num arquivo Arrow mapeado por todas as sessões e
+    # processos (ver shared.py).
+
+    def __init__(self, source, max_frames=16, max_derived=16):
+        self.source = source
+        self.path = source.snapshot_path()
+        self.version = 0
+        self.max_frames = max_frames
+        self.max_derived = max_derived
+        self._frames = {}
+        self._derived = {}
+        self._changes = {}
+        self._fingerprint = self._stored_fingerprint()
+        self._lock = threading.Lock()
+
+    def _stored_fingerprint(self):
+        if not os.path.exists(self.path):
+            return None
+        metadata = pq.read_schema(self.path).metadata or {}
+        raw = metadata.get(FINGERPRINT_KEY)
+        return json.loads(raw) if raw else None
+
+    def _unchanged(self, stat):
+        known = self._fingerprint or {}
+        return all(known.get(k) == v for k, v in stat.items()) and os.path.exists(self.path)
+
+    def refresh(self):
+        # Confere a fonte; devolve o Changeset aplicado ou None se nada mudou.
+        # Sem a fonte (implantações que publicam só o snapshot), nunca recarrega.
+        if not self.source.exists():
+            return None
+        stat = self.source.stat()
+        if self._unchanged(stat):
+            return None
+
+        with self._lock:
+            if self._unchanged(stat):
+                return None
+            fingerprint = dict(stat, sha1=self.source.content_hash())
+            metadata = {FINGERPRINT_KEY: json.dumps(fingerprint).encode()}
+            known = self._fingerprint or {}
+            stored = self._stored_fingerprint() or {}
+            if stored.get("sha1") == fingerprint["sha1"] and known.get("sha1") != fingerprint["sha1"]:
+                # Outro processo já gravou esta versão no snapshot
+                self._fingerprint = stored
+                return self._bump(Changeset(full=True))
+            if known.get("sha1") == fingerprint["sha1"] and os.path.exists(self.path):
+                # Arquivo só "tocado": atualiza a impressão digital gravada,
+                # sem nova versão
+                write_parquet(read_columns(self.path), self.path, metadata)
+                self._fingerprint = fingerprint
+                return None
+            new = self.source.read()
+            if os.path.exists(self.path):
+                new, changes = diff_frames(read_columns(self.path), new)
+            else:
+                changes = Changeset(full=True)
+            write_parquet(new, self.path, metadata)
+            self._fingerprint = fingerprint
+            if not len(changes) and not changes.full:
+                # Conteúdo diferente, mesmos municípios e valores
+                return None
+            return self._bump(changes)
+
+    def _bump(self, changes):
+        # Frames são remapeados da nova publicação
+        self._frames = {}
+        self.version += 1
+        self._changes[self.version] = changes
+        self._changes.pop(self.version - 2, None)
+        return changes
+
+    def derived(self, key, version, build, patch=None):
+        # Estrutura derivada do frame (cubo, índices) na versão pedida: se a
+        # da versão anterior está guardada e a atualização tem Changeset
+        # incremental, patch(anterior, changes) a corrige; senão build()
+        with self._lock:
+            cached = self._derived.get(key)
+            changes = self._changes.get(version)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if (patch is not None and cached is not None and cached[0] == version - 1
+                and changes is not None and not changes.full):
+            obj = patch(cached[1], changes)
+        else:
+            obj = build()
+        with self._lock:
+            current = self._derived.get(key)
+            if current is None or current[0] <= version:
+                self._derived.pop(key, None)
+                if len(self._derived) >= self.max_derived:
+                    self._derived.pop(next(iter(self._derived)))
+                self._derived[key] = (version, obj)
+        return obj
+
+    def _token(self):
+        fingerprint = self._fingerprint or {}
+        if "sha1" in fingerprint:
+            return fingerprint["sha1"][:16]
+        st = os.stat(self.path)
+        return f"{st.st_mtime_ns:x}{st.st_size:x}"
+
+    def shared_path(self):
+        # Arquivo Arrow da versão atual do snapshot, publicado se ainda não
+        # existir (o primeiro processo a precisar dele paga a conversão)
+        path = shared_path_for(self.path, self._token())
+        return ensure_published(path, lambda: clean_frame(read_columns(self.path)))
+
+    def export_path(self):
+        # Snapshot parquet (sem perdas) fixo na versão atual, mantido como o
+        # arquivo Arrow por STALE_GRACE_SECONDS após uma atualização: é dele
+        # que saem as exportações das máscaras desta versão
+        path = shared_path_for(self.path, self._token(), ".parquet")
+        return ensure_linked(self.path, path)
+
+    def columns(self):
+        return pq.read_schema(self.path).names
+
+    def frame(self, columns):
+        # Frame tipado e compartilhado (somente leitura) da versão atual
+        columns = tuple(columns)
+        while True:
+            with self._lock:
+                frame = self._frames.get(columns)
+                version = self.version
+            if frame is not None:
+                return frame
+            frame = attach_frame(self.shared_path(), columns)
+            with self._lock:
+                # Se o snapshot mudou durante a leitura, lê de novo
+                if version == self.version:
+                    if len(self._frames) >= self.max_frames:
+                        self._frames.pop(next(iter(self._frames)))
+                    return self._frames.setdefault(columns, frame)
@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+
+# Índice espacial em grade regular sobre latitude/longitude: as linhas ficam
+# ordenadas pelo código da célula, então cada faixa de latitude da janela de
+# busca é um trecho contíguo encontrado por busca binária. Só os candidatos
+# dessas células têm a distância (haversine) calculada.
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+# ≈ 28 km; com os ~5,5 mil municípios dá poucos pontos por célula ocupada
+SPATIAL_CELL_DEG = 0.25
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _ranges(starts, ends):
+    # Concatena os intervalos [start, end) sem laço em Python
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return offsets + np.arange(total)
+
+
+class SpatialIndex:
+    # Montado uma vez por frame. Consultas devolvem posições de linha do frame
+    # (ordenadas pela distância) e as distâncias em km; mask restringe aos
+    # municípios filtrados e exclude tira uma linha (o próprio centro).
+    # A grade não dá a volta no antimeridiano, o que não afeta o Brasil.
+
+    def __init__(self, df, cell_deg=SPATIAL_CELL_DEG):
+        self.cell_deg = cell_deg
+        lat = df["latitude"].to_numpy(dtype=np.float64, na_value=np.nan)
+        lon = df["longitude"].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        self.lat0 = float(lat[valid].min()) if len(valid) else 0.0
+        self.lon0 = float(lon[valid].min()) if len(valid) else 0.0
+        iy = np.floor((lat[valid] - self.lat0) / cell_deg).astype(np.int64)
+        ix = np.floor((lon[valid] - self.lon0) / cell_deg).astype(np.int64)
+        self.ny = int(iy.max(initial=0)) + 1
+        self.nx = int(ix.max(initial=0)) + 1
+        codes = iy * self.nx + ix
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.rows = valid[order]
+        # Coordenadas na ordem da grade, para acesso contíguo nas consultas
+        self.lat = lat[self.rows]
+        self.lon = lon[self.rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _candidates(self, lat, lon, radius_km):
+        # Posições (na ordem da grade) das células que cobrem o círculo
+        dlat = radius_km / KM_PER_DEG
+        widest = min(abs(lat) + dlat, 89.0)
+        dlon = min(radius_km / (KM_PER_DEG * math.cos(math.radians(widest))), 360.0)
+        iy0 = max(math.floor((lat - dlat - self.lat0) / self.cell_deg), 0)
+        iy1 = min(math.floor((lat + dlat - self.lat0) / self.cell_deg), self.ny - 1)
+        ix0 = max(math.floor((lon - dlon - self.lon0) / self.cell_deg), 0)
+        ix1 = min(math.floor((lon + dlon - self.lon0) / self.cell_deg), self.nx - 1)
+        if iy0 > iy1 or ix0 > ix1:
+            return np.empty(0, dtype=np.int64)
+        band = np.arange(iy0, iy1 + 1, dtype=np.int64) * self.nx
+        starts = np.searchsorted(self.codes, band + ix0, side="left")
+        ends = np.searchsorted(self.codes, band + ix1, side="right")
+        return _ranges(starts, ends)
+
+    def within(self, lat, lon, radius_km, mask=None, exclude=None):
+        # Municípios a até radius_km do ponto
+        idx = self._candidates(lat, lon, radius_km)
+        dist = haversine_km(lat, lon, self.lat[idx], self.lon[idx])
+        rows = self.rows[idx]
+        keep = dist <= radius_km
+        if mask is not None:
+            keep &= mask[rows]
+        if exclude is not None:
+            keep &= rows != exclude
+        rows, dist = rows[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return rows[order], dist[order]
+
+    def nearest(self, lat, lon, k, mask=None, exclude=None):
+        # K mais próximos: raio dobrando a partir de uma célula até haver k
+        # municípios dentro dele (todos os de dentro do raio são exatos)
+        radius = self.cell_deg * KM_PER_DEG
+        while True:
+            rows, dist = self.within(lat, lon, radius, mask, exclude)
+            if len(rows) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+                return rows[:k], dist[:k]
+            radius *= 2
+
+
+def region_summary(dist, pop, idh):
+    # Agregados da região consultada; arrays já indexados pelas linhas dela.
+    # IDH médio simples e ponderado pela população (ausentes ignorados).
+    pop = np.asarray(pop, dtype=np.float64)
+    idh = np.asarray(idh, dtype=np.float64)
+    weighted = ~np.isnan(idh) & (np.nan_to_num(pop) > 0)
+    has_idh = ~np.isnan(idh)
+    return {
+        "municipios": len(dist),
+        "populacao": float(np.nansum(pop)),
+        "idh_medio": float(idh[has_idh].mean()) if has_idh.any() else np.nan,
+        "idh_ponderado": (float(np.average(idh[weighted], weights=pop[weighted]))
+                          if weighted.any() else np.nan),
+        "distancia_max_km": float(dist.max()) if len(dist) else 0.0,
+    }
@@ -0,0 +1,185 @@
+import numpy as np
+
+# Resumos de distribuição por grupo calculados no servidor, para que box e
+# violino enviem só estatísticas (custo proporcional ao número de grupos)
+MAX_OUTLIERS = 40
+KDE_GRID_POINTS = 64
+KDE_FINE_BINS = 512
+
+
+def box_summaries(values, groups, n_groups, max_outliers=MAX_OUTLIERS):
+    # Quartis (interpolação linear, como o quartilemethod padrão do Plotly),
+    # cercas de Tukey (1,5 IQR) e até max_outliers pontos externos por grupo
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+    ok = ~np.isnan(values) & (groups >= 0) & (groups < n_groups)
+    values, groups = values[ok], groups[ok]
+
+    order = np.lexsort((values, groups))
+    v, g = values[order], groups[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    present = counts > 0
+
+    def quantile(p):
+        pos = starts + p * np.maximum(counts - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        out = np.full(n_groups, np.nan)
+        out[present] = v[lo[present]] + (v[hi[present]] - v[lo[present]]) * (pos - lo)[present]
+        return out
+
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+    low_limit = q1 - 1.5 * iqr
+    high_limit = q3 + 1.5 * iqr
+
+    below = np.bincount(g, weights=v < low_limit[g], minlength=n_groups).astype(np.int64)
+    above = np.bincount(g, weights=v > high_limit[g], minlength=n_groups).astype(np.int64)
+    lowerfence = np.full(n_groups, np.nan)
+    upperfence = np.full(n_groups, np.nan)
+    lowerfence[present] = v[(starts + below)[present]]
+    upperfence[present] = v[(starts + counts - 1 - above)[present]]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(g, weights=v, minlength=n_groups) / counts
+
+    # Outliers mais extremos de cada lado, limitados a max_outliers no total
+    # (a cota que um lado não usa fica para o outro)
+    half = max_outliers // 2
+    outliers = []
+    for i in range(n_groups):
+        n_low = min(below[i], max(half, max_outliers - above[i]))
+        n_high = min(above[i], max_outliers - n_low)
+        end = starts[i] + counts[i]
+        outliers.append(np.concatenate([v[starts[i]:starts[i] + n_low], v[end - n_high:end]]))
+
+    return {
+        "count": counts,
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        "mean": mean,
+        "lowerfence": lowerfence,
+        "upperfence": upperfence,
+        "outliers": outliers,
+    }
+
+
+def kde_summaries(values, groups, n_groups, grid_points=KDE_GRID_POINTS, fine_bins=KDE_FINE_BINS):
+    # KDE gaussiana por grupo em resolução fixa: os valores são contados numa
+    # grade fina, suavizados por convolução (banda de Silverman) e
+    # reamostrados em grid_points pontos. Como no spanmode='soft' do
+    # px.violin, a grade vai de mín - 2 bandas a máx + 2 bandas, para que as
+    # caudas afinem em vez de terminar cortadas no mín e no máx
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+    ok = ~np.isnan(values) & (groups >= 0) & (groups < n_groups)
+    values, groups = values[ok], groups[ok]
+
+    grids = [np.empty(0)] * n_groups
+    densities = [np.empty(0)] * n_groups
+    if not len(values):
+        return grids, densities
+
+    counts = np.bincount(groups, minlength=n_groups)
+    lo = np.full(n_groups, np.inf)
+    hi = np.full(n_groups, -np.inf)
+    np.minimum.at(lo, groups, values)
+    np.maximum.at(hi, groups, values)
+
+    # Banda por grupo; sem dispersão (valores iguais) usa 1/fine_bins do
+    # intervalo, ou 1 quando só há um valor
+    n = np.maximum(counts, 1)
+    sums = np.bincount(groups, weights=values, minlength=n_groups)
+    sq = np.bincount(groups, weights=values * values, minlength=n_groups)
+    std = np.sqrt(np.maximum(sq / n - (sums / n) ** 2, 0.0))
+    fallback = np.where(hi > lo, (hi - lo) / fine_bins, 1.0)
+    bandwidth = np.where(std > 0, 1.06 * std * n ** (-1 / 5), fallback)
+    bandwidth[counts == 0] = 1.0
+    lo = np.where(counts > 0, lo - 2 * bandwidth, 0.0)
+    hi = np.where(counts > 0, hi + 2 * bandwidth, 1.0)
+
+    width = (hi - lo) / fine_bins
+    bins = np.clip(((values - lo[groups]) / width[groups]).astype(np.int64), 0, fine_bins - 1)
+    hist = np.bincount(groups * fine_bins + bins, minlength=n_groups * fine_bins)
+    hist = hist.reshape(n_groups, fine_bins).astype(np.float64)
+
+    for i in np.flatnonzero(counts):
+        sigma = max(bandwidth[i] / width[i], 0.5)
+        radius = min(int(np.ceil(4 * sigma)), (fine_bins - 1) // 2)
+        kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+        smooth = np.convolve(hist[i], kernel / kernel.sum(), mode='same') / (counts[i] * width[i])
+
+        centers = lo[i] + (np.arange(fine_bins) + 0.5) * width[i]
+        grid = np.linspace(lo[i], hi[i], grid_points)
+        grids[i] = grid
+        densities[i] = np.interp(grid, centers, smooth)
+    return grids, densities
+
+
+def thin_scatter(x, y, max_points, bins=48, log_x=True, seed=0):
+    # Amostra de um scatter que preserva a densidade: cada célula de uma grade
+    # bins x bins (eixo x em log) recebe cota proporcional à sua contagem, com
+    # pelo menos um ponto enquanto o orçamento permitir, e os extremos e
+    # outliers de y em cada faixa de x são sempre mantidos. Devolve
+    # max_points posições de linhas em ordem crescente (todas, se houver
+    # menos; os 4 extremos, se o orçamento for menor que isso).
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    if log_x:
+        x = np.log10(np.maximum(x, 1.0))
+
+    def bin_of(v):
+        lo, hi = v.min(), v.max()
+        if hi <= lo:
+            return np.zeros(len(v), dtype=np.int64)
+        return np.minimum(((v - lo) / (hi - lo) * bins).astype(np.int64), bins - 1)
+
+    xb, yb = bin_of(x), bin_of(y)
+    keep = np.zeros(n, dtype=bool)
+    keep[[x.argmin(), x.argmax(), y.argmin(), y.argmax()]] = True
+
+    # Outliers de Tukey por faixa de x, os mais extremos primeiro, limitados
+    # a um quarto do orçamento
+    stats = box_summaries(y, xb, bins, max_outliers=0)
+    iqr = stats["q3"] - stats["q1"]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = np.maximum(stats["q1"][xb] - y, y - stats["q3"][xb]) / iqr[xb] - 1.5
+    outlier = np.flatnonzero(score > 0)
+    if len(outlier) > max_points // 4:
+        outlier = outlier[np.argsort(-score[outlier], kind='stable')[:max_points // 4]]
+    keep[outlier] = True
+
+    # Restante do orçamento distribuído pelas células
+    rest = np.flatnonzero(~keep)
+    budget = max(max_points - int(keep.sum()), 0)
+    cell = xb[rest] * bins + yb[rest]
+    counts = np.bincount(cell, minlength=bins * bins)
+    occupied = np.flatnonzero(counts)
+    quota = np.zeros(bins * bins, dtype=np.int64)
+    if len(occupied) <= budget:
+        # Um ponto por célula ocupada e o que sobra proporcional ao restante
+        # de cada uma (maiores restos de arredondamento levam a sobra), de
+        # modo que a soma das cotas é o orçamento
+        extra = budget - len(occupied)
+        share = (counts[occupied] - 1) * extra / max(len(rest) - len(occupied), 1)
+        quota[occupied] = 1 + np.floor(share).astype(np.int64)
+        leftover = budget - int(quota.sum())
+        if leftover > 0:
+            remainder = share - np.floor(share)
+            quota[occupied[np.argsort(-remainder, kind='stable')[:leftover]]] += 1
+        quota = np.minimum(quota, counts)
+    else:
+        # Mais células que orçamento: um ponto nas células mais densas
+        quota[occupied[np.argsort(-counts[occupied], kind='stable')[:budget]]] = 1
+    rank = np.random.default_rng(seed).permutation(len(rest))
+    order = np.lexsort((rank, cell))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.empty(len(rest), dtype=np.int64)
+    position[order] = np.arange(len(rest)) - starts[cell[order]]
+    keep[rest[position < quota[cell]]] = True
+    return np.flatnonzero(keep)
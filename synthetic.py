@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+# Dados sintéticos no formato de dados_lista.csv, para o benchmark e os
+# testes (municípios sorteados por UF, com ausentes como no export do IBGE)
+UFS = {
+    # UF: (peso no sorteio, latitude, longitude do centro aproximado)
+    "SP": (645, -22.3, -48.6), "MG": (853, -18.5, -44.6), "RS": (497, -29.7, -53.2),
+    "BA": (417, -12.5, -41.7), "PR": (399, -24.6, -51.6), "SC": (295, -27.2, -50.4),
+    "GO": (246, -15.9, -49.8), "PI": (224, -7.7, -42.7), "PB": (223, -7.1, -36.8),
+    "MA": (217, -5.4, -45.4), "PE": (185, -8.4, -37.9), "CE": (184, -5.2, -39.5),
+    "RN": (167, -5.8, -36.5), "PA": (144, -4.0, -52.4), "MT": (141, -12.6, -55.9),
+    "TO": (139, -10.2, -48.3), "AL": (102, -9.6, -36.6), "RJ": (92, -22.3, -42.7),
+    "MS": (79, -20.5, -54.8), "ES": (78, -19.6, -40.7), "SE": (75, -10.6, -37.4),
+    "AM": (62, -4.2, -64.8), "RO": (52, -10.9, -62.8), "AC": (22, -9.2, -70.3),
+    "AP": (16, 1.4, -51.8), "RR": (15, 2.1, -61.4), "DF": (1, -15.8, -47.9),
+}
+BIOMAS = ["Mata Atlântica", "Cerrado", "Caatinga", "Amazônia", "Pampa", "Pantanal"]
+FIRST_YEAR = 2018
+
+
+def synthetic_frame(n_rows, n_years=4, seed=0, missing=0.01):
+    rng = np.random.default_rng(seed)
+    ufs = list(UFS)
+    weights = np.array([UFS[uf][0] for uf in ufs], dtype=np.float64)
+    estado = rng.choice(len(ufs), n_rows, p=weights / weights.sum())
+    centers = np.array([UFS[uf][1:] for uf in ufs])
+    data = {
+        "codigo_ibge": np.arange(1100000, 1100000 + n_rows),
+        "municipio": [f"Município {i}" for i in range(n_rows)],
+        "estado": np.array(ufs)[estado],
+        "latitude": (centers[estado, 0] + rng.normal(0, 1.5, n_rows)).round(6),
+        "longitude": (centers[estado, 1] + rng.normal(0, 1.5, n_rows)).round(6),
+        "bioma_predominante": rng.choice(BIOMAS, n_rows, p=[0.3, 0.25, 0.2, 0.15, 0.06, 0.04]),
+    }
+    # Populações log-normais (cauda de metrópoles) com crescimento anual próprio
+    base = np.exp(rng.normal(9.3, 1.2, n_rows))
+    growth = rng.normal(0.008, 0.01, n_rows)
+    pib = np.exp(rng.normal(9.9, 0.55, n_rows))
+    for k in range(n_years):
+        year = FIRST_YEAR + k
+        data[f"populacao_estimada_{year}"] = (base * (1 + growth) ** k).round()
+        data[f"pib_per_capita_{year}"] = (pib * rng.normal(1.02, 0.04, n_rows) ** k).round(2)
+    data["idh_2000"] = rng.beta(8, 5, n_rows).round(3)
+    data["idh_2010"] = np.minimum(data["idh_2000"] + rng.uniform(0.03, 0.15, n_rows), 0.95).round(3)
+
+    df = pd.DataFrame(data)
+    # Ausentes como no export do IBGE ("-")
+    for col in df.columns:
+        if col.startswith(("populacao_estimada_", "pib_per_capita_", "idh_")):
+            values = df[col].astype(object)
+            values[rng.random(n_rows) < missing] = "-"
+            df[col] = values
+    return df
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Os módulos do dashboard ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import is_year_col, normalize_frame  # noqa: E402
+from pipeline import clean_frame  # noqa: E402
+from synthetic import synthetic_frame  # noqa: E402
+
+POP_COL = "populacao_estimada_2019"
+PIB_COL = "pib_per_capita_2019"
+IDH_COL = "idh_2010"
+BIOMA_COL = "bioma_predominante"
+
+
+@pytest.fixture(scope="session")
+def export_frame():
+    # Export sintético como sai do CSV ("-" nos ausentes), com populações
+    # exatamente nas bordas das faixas de porte, algumas metrópoles e
+    # municípios sem estado ou sem bioma
+    df = synthetic_frame(6000, n_years=2, seed=7)
+    for col in ("populacao_estimada_2018", POP_COL):
+        df.loc[:6, col] = [20000.0, 20001.0, 100000.0, 500000.0, 500001.0, 0.0, "-"]
+        df.loc[7:30, col] = 750000.0 + np.arange(24)
+    df.loc[50:59, "estado"] = np.nan
+    df.loc[60:79, BIOMA_COL] = np.nan
+    return df
+
+
+@pytest.fixture(scope="session")
+def baseline_frame(export_frame):
+    # Frame como o app original o via: texto lido do CSV e colunas anuais
+    # convertidas com pd.to_numeric(errors="coerce")
+    df = export_frame.copy()
+    for col in df.columns:
+        if is_year_col(col):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+@pytest.fixture(scope="session")
+def session_frame(export_frame):
+    # Frame tipado que o dashboard carrega (categorias, float32, ...)
+    return clean_frame(normalize_frame(export_frame.copy()))
+
+
+@pytest.fixture(scope="session")
+def pop_col():
+    return POP_COL
+
+
+@pytest.fixture(scope="session")
+def bioma_col():
+    return BIOMA_COL
+
+
+@pytest.fixture(scope="session")
+def metric_cols():
+    # Colunas anuais agregadas e ranqueadas: população, PIB e IDH (este com
+    # 3 casas decimais e muitos empates)
+    return [POP_COL, PIB_COL, IDH_COL]
+
+
+@pytest.fixture(params=[POP_COL, PIB_COL, IDH_COL])
+def metric_col(request):
+    return request.param
+
+
+@pytest.fixture(params=[[], ["SP"], ["SP", "MG", "BA", "RJ", "AC"], ["AC", "XX"]], ids=lambda s: "+".join(s) or "todos")
+def estado_sel(request):
+    return request.param
+
+
+@pytest.fixture(params=[0, 1, 20000, 20001, 100000, 500000, 500001])
+def min_pop(request):
+    return request.param
+
+
+def baseline_filter(df, estado_sel, pop_col, min_pop):
+    # Filtro do app original: isin nos estados e população ausente como 0
+    if estado_sel:
+        df = df[df["estado"].isin(estado_sel)]
+    return df[df[pop_col].fillna(0) >= min_pop]
+
+
+@pytest.fixture
+def baseline_filtered(baseline_frame, estado_sel, min_pop):
+    return baseline_filter(baseline_frame, estado_sel, POP_COL, min_pop)
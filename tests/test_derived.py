@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import synthetic_frame
+from ingest import normalize_frame
+from pipeline import PORTE_BINS, PORTE_LABELS, PORTE_MISSING, DerivedColumns, clean_frame, porte_codes
+
+# porte_codes, porte_at, labels_at e rows devem dar o mesmo que pd.cut, a
+# concatenação "Município - UF" e df[mask].dropna(subset=...)
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return clean_frame(normalize_frame(synthetic_frame(5000, n_years=2, seed=1)))
+
+
+def test_porte_codes_match_pd_cut():
+    pop = np.array([np.nan, -5, 0, 1, 19999.5, 20000, 20000.5, 100000, 100001,
+                    500000, 500001, 1e9, np.inf])
+    expected = pd.cut(pop, PORTE_BINS, labels=PORTE_LABELS)
+    codes = porte_codes(pop)
+    np.testing.assert_array_equal(np.where(codes == PORTE_MISSING, -1, codes), expected.codes)
+
+
+def test_porte_at_matches_pd_cut(frame):
+    pop_col = "populacao_estimada_2019"
+    derived = DerivedColumns(frame, [pop_col], [pop_col])
+    rows = np.arange(len(frame))
+    porte = derived.porte_at(pop_col, rows)
+    expected = pd.cut(frame[pop_col], PORTE_BINS, labels=PORTE_LABELS).cat
+    assert list(porte.categories) == list(expected.categories)
+    np.testing.assert_array_equal(porte.codes, expected.codes)
+
+
+def test_labels_at_matches_concatenation(frame):
+    derived = DerivedColumns(frame)
+    rows = np.random.default_rng(0).choice(len(frame), 200, replace=False)
+    expected = (frame["municipio"].astype(str) + " - " + frame["estado"].astype(str)).to_numpy()[rows]
+    np.testing.assert_array_equal(derived.labels_at(rows), expected)
+
+
+def test_rows_match_dropna(frame):
+    cols = ["populacao_estimada_2019", "pib_per_capita_2019", "idh_2010"]
+    derived = DerivedColumns(frame, value_cols=cols)
+    mask = frame["estado"].isin(["SP", "MG", "BA"]).to_numpy()
+    for subset in (cols[:1], cols[1:], cols):
+        expected = frame[mask].dropna(subset=subset).index.to_numpy()
+        np.testing.assert_array_equal(derived.rows(mask, *subset), expected)
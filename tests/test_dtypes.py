@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import synthetic_frame
+from ingest import normalize_frame, read_csv_planned
+from pipeline import clean_frame
+
+# A leitura tipada de um CSV com "-" nos ausentes deve chegar ao mesmo frame
+# limpo que pd.read_csv seguido de normalize_frame
+
+
+def legacy_read(path):
+    return normalize_frame(pd.read_csv(path, sep=",", encoding="utf-8"))
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "dados.csv"
+    synthetic_frame(3000, n_years=3, seed=2).to_csv(path, index=False)
+    return str(path)
+
+
+def test_planned_read_matches_legacy(csv_path):
+    pd.testing.assert_frame_equal(clean_frame(read_csv_planned(csv_path)), clean_frame(legacy_read(csv_path)))
+
+
+def test_planned_read_falls_back_on_unexpected_text(tmp_path, csv_path):
+    df = pd.read_csv(csv_path, dtype=str)
+    df.loc[7, "pib_per_capita_2019"] = "n/d"
+    path = str(tmp_path / "sujo.csv")
+    df.to_csv(path, index=False)
+    planned = read_csv_planned(path)
+    assert np.isnan(planned.loc[7, "pib_per_capita_2019"])
+    pd.testing.assert_frame_equal(clean_frame(planned), clean_frame(legacy_read(path)))
+
+
+def test_memory_plan_dtypes(csv_path):
+    df = clean_frame(read_csv_planned(csv_path))
+    assert df["codigo_ibge"].dtype == "int32"
+    assert df["populacao_estimada_2020"].dtype == "float64"
+    assert df["pib_per_capita_2020"].dtype == "float32"
+    assert df["idh_2010"].dtype == "float32"
+    assert df["latitude"].dtype == "float32"
+    assert isinstance(df["estado"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["bioma_predominante"].dtype, pd.CategoricalDtype)
+    # Nomes únicos continuam texto
+    assert not isinstance(df["municipio"].dtype, pd.CategoricalDtype)
+
+
+def test_missing_codes_stay_nullable(tmp_path, csv_path):
+    df = pd.read_csv(csv_path, dtype=str)
+    df.loc[3, "codigo_ibge"] = None
+    path = str(tmp_path / "sem_codigo.csv")
+    df.to_csv(path, index=False)
+    codes = clean_frame(read_csv_planned(path))["codigo_ibge"]
+    assert codes.dtype == "Int32"
+    assert codes.isna().sum() == 1
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import synthetic_frame
+from export import write_export
+from ingest import NA_VALUES
+from sources import Dataset, source_for
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "dados.csv"
+    synthetic_frame(3000, n_years=2, seed=5).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def dataset(csv_path):
+    dataset = Dataset(source_for(csv_path))
+    dataset.refresh()
+    return dataset
+
+
+@pytest.mark.parametrize("fmt", ["csv", "csv.gz"])
+def test_unfiltered_export_round_trips_source(dataset, csv_path, tmp_path, fmt):
+    # Coordenadas com 6 casas e PIB com 2 casas voltam exatamente como na fonte
+    out = write_export(dataset.export_path(), np.ones(3000, dtype=bool), fmt, str(tmp_path / f"saida.{fmt}"))
+    pd.testing.assert_frame_equal(pd.read_csv(out), pd.read_csv(csv_path, na_values=NA_VALUES))
+
+
+def test_parquet_export_keeps_float64(dataset, csv_path, tmp_path):
+    mask = np.zeros(3000, dtype=bool)
+    mask[::7] = True
+    out = pd.read_parquet(write_export(dataset.export_path(), mask, "parquet", str(tmp_path / "saida.parquet")))
+    source = pd.read_csv(csv_path, na_values=NA_VALUES)[mask].reset_index(drop=True)
+    for col in ("latitude", "longitude", "pib_per_capita_2019"):
+        assert out[col].dtype == "float64"
+        np.testing.assert_array_equal(out[col].to_numpy(), source[col].to_numpy())
+
+
+def test_export_path_keeps_its_version_after_refresh(dataset, csv_path, tmp_path):
+    old_path = dataset.export_path()
+    df = pd.read_csv(csv_path, dtype=str)
+    pd.concat([df, df.tail(5)]).to_csv(csv_path, index=False)
+    assert dataset.refresh().full
+
+    # A máscara do rerun anterior continua valendo para o arquivo da versão dela
+    assert dataset.export_path() != old_path
+    out = write_export(old_path, np.ones(3000, dtype=bool), "csv", str(tmp_path / "antiga.csv"))
+    assert len(pd.read_csv(out)) == 3000
+
+
+def test_mask_length_mismatch_raises(dataset, tmp_path):
+    with pytest.raises(ValueError, match="2999 linhas"):
+        write_export(dataset.export_path(), np.ones(2999, dtype=bool), "csv", str(tmp_path / "saida.csv"))
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from indexes import FilterIndex, RankingIndex
+
+# Máscaras e rankings dos índices contra os filtros e o nlargest/nsmallest
+# que o app aplicava ao frame
+
+
+@pytest.fixture(scope="module")
+def filter_index(session_frame):
+    return FilterIndex(session_frame, [c for c in session_frame.columns if c.startswith("populacao_estimada_")])
+
+
+@pytest.fixture(scope="module")
+def ranking(session_frame, metric_cols):
+    return RankingIndex(session_frame, metric_cols)
+
+
+def test_mask_matches_isin_and_fillna(filter_index, session_frame, baseline_filtered, estado_sel, min_pop, pop_col):
+    mask = filter_index.mask(estado_sel, pop_col, min_pop)
+    assert mask.dtype == bool and len(mask) == len(session_frame)
+    np.testing.assert_array_equal(np.flatnonzero(mask), baseline_filtered.index.to_numpy())
+
+
+def test_mask_without_population_filter(filter_index, baseline_frame, estado_sel):
+    mask = filter_index.mask(estado_sel, None, 0)
+    expected = baseline_frame["estado"].isin(estado_sel) if estado_sel else np.ones(len(baseline_frame), dtype=bool)
+    np.testing.assert_array_equal(mask, np.asarray(expected))
+
+
+@pytest.mark.parametrize("k", [1, 10, 15, 50])
+def test_top_k_matches_nlargest(filter_index, ranking, baseline_filtered, estado_sel, min_pop, pop_col, metric_col, k):
+    # Empates (muitos no IDH) resolvidos pela ordem original
+    mask = filter_index.mask(estado_sel, pop_col, min_pop)
+    valid = baseline_filtered.dropna(subset=[metric_col])
+    np.testing.assert_array_equal(ranking.top_k(metric_col, mask, k), valid.nlargest(k, metric_col).index.to_numpy())
+    np.testing.assert_array_equal(ranking.bottom_k(metric_col, mask, k), valid.nsmallest(k, metric_col).index.to_numpy())
+
+
+def test_top_k_without_mask(ranking, baseline_frame):
+    valid = baseline_frame.dropna(subset=["idh_2010"])
+    np.testing.assert_array_equal(ranking.top_k("idh_2010", None, 600), valid.nlargest(600, "idh_2010").index.to_numpy())
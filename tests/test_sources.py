@@ -0,0 +1,165 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import synthetic_frame
+from cube import AggregateCube
+from indexes import FilterIndex, RankingIndex
+from ingest import read_columns, read_csv_planned
+from pipeline import clean_frame
+from sources import Dataset, source_for
+
+COLUMNS = ("municipio", "estado", "populacao_estimada_2019")
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "dados.csv"
+    synthetic_frame(4000, n_years=2, seed=4).to_csv(path, index=False)
+    return str(path)
+
+
+def frames_in_threads(dataset, n_threads=6):
+    # Todas as threads pedem o frame ao mesmo tempo logo após a atualização
+    barrier = threading.Barrier(n_threads)
+    frames, errors = [], []
+
+    def run():
+        barrier.wait()
+        try:
+            frames.append(dataset.frame(COLUMNS))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return frames, errors
+
+
+@pytest.mark.parametrize("trial", range(5))
+def test_concurrent_frame_after_refresh(csv_path, trial):
+    dataset = Dataset(source_for(csv_path))
+    dataset.refresh()
+    frames, errors = frames_in_threads(dataset)
+    assert errors == []
+    expected = clean_frame(read_columns(dataset.path))[list(COLUMNS)]
+    for frame in frames:
+        pd.testing.assert_frame_equal(frame, expected)
+
+
+def rewrite_value(csv_path, row, col, value):
+    df = pd.read_csv(csv_path, dtype=str)
+    df.loc[row, col] = value
+    df.to_csv(csv_path, index=False)
+
+
+def test_refresh_loads_only_content_changes(csv_path):
+    dataset = Dataset(source_for(csv_path))
+    assert dataset.refresh().full
+    assert dataset.version == 1
+    assert dataset.refresh() is None
+
+    # Arquivo regravado com o mesmo conteúdo: só a impressão digital muda
+    os.utime(csv_path, ns=(0, 1_000_000_000))
+    assert dataset.refresh() is None
+    assert dataset.version == 1
+
+    rewrite_value(csv_path, 10, "populacao_estimada_2019", "123456")
+    changes = dataset.refresh()
+    assert not changes.full and len(changes) == 1
+    np.testing.assert_array_equal(changes.updated, [10])
+    assert dataset.version == 2
+    assert dataset.frame(COLUMNS)["populacao_estimada_2019"].iloc[10] == 123456
+    pd.testing.assert_frame_equal(read_columns(dataset.path), read_csv_planned(csv_path))
+
+
+def test_refresh_reuses_snapshot_written_by_another_process(csv_path):
+    writer = Dataset(source_for(csv_path))
+    writer.refresh()
+    reader = Dataset(source_for(csv_path))
+    assert reader.refresh() is None
+
+    rewrite_value(csv_path, 0, "idh_2010", "0.5")
+    assert not writer.refresh().full
+    mtime = os.path.getmtime(writer.path)
+    # O segundo processo vê a fonte nova, mas o snapshot já está gravado
+    # (sem o Changeset dele, remonta tudo)
+    assert reader.refresh().full
+    assert os.path.getmtime(reader.path) == mtime
+    assert reader.frame(("idh_2010",))["idh_2010"].iloc[0] == pytest.approx(0.5)
+
+
+def edit_export(csv_path, seed=0):
+    # Nova exportação: valores alterados (inclusive trocando de faixa de
+    # porte, empatando com outros e ficando ausentes), um município que
+    # muda de estado, removidos e novos no meio do arquivo
+    rng = np.random.default_rng(seed)
+    df = pd.read_csv(csv_path, dtype=str)
+    rows = rng.choice(len(df), 40, replace=False)
+    df.loc[rows[:10], "populacao_estimada_2019"] = ["20000", "20001", "500001", "15", "-", "100000", "750000",
+                                                    df.loc[rows[11], "populacao_estimada_2019"], "3", "20000"]
+    df.loc[rows[10:20], "idh_2010"] = df.loc[rows[20:30], "idh_2010"].to_numpy()
+    df.loc[rows[20:25], "pib_per_capita_2019"] = "-"
+    df.loc[rows[25:28], "bioma_predominante"] = "Pampa"
+    df.loc[rows[28], "estado"] = "AC" if df.loc[rows[28], "estado"] != "AC" else "SP"
+    added = df.iloc[rows[30:35]].copy()
+    added["codigo_ibge"] = [str(9900000 + 100 * seed + i) for i in range(len(added))]
+    df = df.drop(index=rows[35:])
+    df = pd.concat([df.iloc[:1000], added, df.iloc[1000:]])
+    df.to_csv(csv_path, index=False)
+
+
+def test_patched_cube_and_indexes_match_fresh_build(csv_path, pop_col, bioma_col):
+    columns = ("estado", bioma_col, "populacao_estimada_2018", pop_col, "pib_per_capita_2019", "idh_2010")
+    metric_cols = list(columns[2:])
+    dataset = Dataset(source_for(csv_path))
+
+    def structures():
+        df = dataset.frame(columns)
+        version = dataset.version
+        return (
+            dataset.derived("cubo", version, lambda: AggregateCube(df, pop_col, metric_cols, bioma_col),
+                            lambda cube, changes: cube.patch(df, changes)),
+            dataset.derived("filtros", version, lambda: FilterIndex(df, metric_cols[:2]),
+                            lambda index, changes: index.patch(df, changes)),
+            dataset.derived("rankings", version, lambda: RankingIndex(df, metric_cols),
+                            lambda index, changes: index.patch(df, changes)),
+        )
+
+    dataset.refresh()
+    structures()
+    for seed in range(3):
+        edit_export(csv_path, seed)
+        changes = dataset.refresh()
+        assert not changes.full and len(changes.removed) == 5 and changes.added == 5
+        cube, filter_index, ranking = structures()
+
+        df = dataset.frame(columns)
+        fresh_cube = AggregateCube(df, pop_col, metric_cols, bioma_col)
+        fresh_filters = FilterIndex(df, metric_cols[:2])
+        fresh_ranking = RankingIndex(df, metric_cols)
+
+        assert list(filter_index.estado_bitmaps) == list(fresh_filters.estado_bitmaps)
+        for uf, bits in fresh_filters.estado_bitmaps.items():
+            np.testing.assert_array_equal(filter_index.estado_bitmaps[uf], bits)
+        for col in metric_cols[:2]:
+            np.testing.assert_array_equal(filter_index.pop_order[col], fresh_filters.pop_order[col])
+            np.testing.assert_array_equal(filter_index.pop_sorted[col], fresh_filters.pop_sorted[col])
+        for col in metric_cols:
+            np.testing.assert_array_equal(ranking.desc[col], fresh_ranking.desc[col])
+            np.testing.assert_array_equal(ranking.asc[col], fresh_ranking.asc[col])
+
+        for estado_sel in ([], ["SP", "AC"]):
+            for min_pop in (0, 20000, 20001, 500000):
+                view, fresh = cube.select(estado_sel, min_pop), fresh_cube.select(estado_sel, min_pop)
+                assert view.n() == fresh.n()
+                for by in ("estado", "bioma", "porte"):
+                    for col in metric_cols:
+                        pd.testing.assert_series_equal(view.count(col, by), fresh.count(col, by))
+                        pd.testing.assert_series_equal(view.mean(col, by), fresh.mean(col, by), rtol=1e-9)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from spatial import SpatialIndex, haversine_km, region_summary
+
+# within e nearest devolvem as mesmas linhas e distâncias que uma varredura
+# haversine de todos os pontos, com e sem máscara e centro excluído
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(3)
+    n = 4000
+    lat = rng.uniform(-33.7, 5.3, n)
+    lon = rng.uniform(-73.9, -34.8, n)
+    lat[rng.random(n) < 0.02] = np.nan
+    # Pontos repetidos e colados na borda da grade
+    lat[:5], lon[:5] = -20.0, -45.0
+    return pd.DataFrame({"latitude": lat, "longitude": lon})
+
+
+def brute_force(df, lat, lon, mask=None, exclude=None):
+    dist = haversine_km(lat, lon, df["latitude"].to_numpy(), df["longitude"].to_numpy())
+    keep = ~np.isnan(dist)
+    if mask is not None:
+        keep &= mask
+    if exclude is not None:
+        keep[exclude] = False
+    rows = np.flatnonzero(keep)
+    order = np.argsort(dist[rows], kind="stable")
+    return rows[order], dist[rows][order]
+
+
+CENTERS = [(-20.0, -45.0), (-23.55, -46.63), (5.3, -73.9), (-33.7, -34.8), (-10.0, -30.0), (0.0, -60.0)]
+
+
+@pytest.mark.parametrize("radius", [1, 30, 120, 600])
+@pytest.mark.parametrize("lat,lon", CENTERS)
+def test_within_matches_brute_force(points, lat, lon, radius):
+    index = SpatialIndex(points)
+    mask = np.random.default_rng(radius).random(len(points)) < 0.7
+    for m, exclude in ((None, None), (mask, 0)):
+        rows, dist = index.within(lat, lon, radius, m, exclude)
+        expected_rows, expected_dist = brute_force(points, lat, lon, m, exclude)
+        inside = expected_dist <= radius
+        assert set(rows.tolist()) == set(expected_rows[inside].tolist())
+        np.testing.assert_allclose(dist, expected_dist[inside])
+
+
+@pytest.mark.parametrize("k", [1, 10, 50])
+@pytest.mark.parametrize("lat,lon", CENTERS)
+def test_nearest_matches_brute_force(points, lat, lon, k):
+    index = SpatialIndex(points)
+    mask = np.random.default_rng(k).random(len(points)) < 0.5
+    for m, exclude in ((None, None), (mask, 1)):
+        rows, dist = index.nearest(lat, lon, k, m, exclude)
+        _, expected_dist = brute_force(points, lat, lon, m, exclude)
+        assert len(rows) == k
+        np.testing.assert_allclose(dist, expected_dist[:k])
+
+
+def test_region_summary_weights_by_population():
+    summary = region_summary(np.array([0.0, 5.0, 9.0]), [100.0, 300.0, np.nan], [0.5, 0.7, 0.9])
+    assert summary["municipios"] == 3
+    assert summary["populacao"] == 400.0
+    assert summary["idh_medio"] == pytest.approx(0.7)
+    assert summary["idh_ponderado"] == pytest.approx(0.65)
+    assert summary["distancia_max_km"] == 9.0
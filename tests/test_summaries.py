@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from summaries import box_summaries, kde_summaries, thin_scatter
+
+# Resumos por grupo contra o cálculo direto sobre os valores de cada grupo
+# (np.percentile linear, como o quartilemethod padrão do Plotly)
+
+
+@pytest.fixture(scope="module")
+def grouped():
+    # Grupos de tamanhos e caudas diferentes, com ausentes, um grupo vazio,
+    # um com um único valor e um sem dispersão
+    rng = np.random.default_rng(3)
+    parts = [
+        (0, rng.lognormal(9, 1.2, 3000)),
+        (1, rng.normal(0.7, 0.05, 500)),
+        (3, np.array([42.0])),
+        (4, np.full(20, 5.0)),
+        (5, np.concatenate([rng.normal(0, 1, 200), [50.0, 60.0, -40.0]])),
+    ]
+    values = np.concatenate([v for _, v in parts] + [[np.nan] * 10])
+    groups = np.concatenate([np.full(len(v), g) for g, v in parts] + [np.zeros(10, dtype=np.int64)])
+    return values, groups, 6
+
+
+def group_values(values, groups, i):
+    return np.sort(values[(groups == i) & ~np.isnan(values)])
+
+
+def test_box_quartiles_and_fences(grouped):
+    values, groups, n_groups = grouped
+    stats = box_summaries(values, groups, n_groups)
+    for i in range(n_groups):
+        v = group_values(values, groups, i)
+        assert stats["count"][i] == len(v)
+        if not len(v):
+            assert np.isnan(stats["median"][i])
+            continue
+        q1, median, q3 = np.percentile(v, [25, 50, 75])
+        assert stats["q1"][i] == pytest.approx(q1)
+        assert stats["median"][i] == pytest.approx(median)
+        assert stats["q3"][i] == pytest.approx(q3)
+        assert stats["mean"][i] == pytest.approx(v.mean())
+        # Cercas de Tukey como no Plotly: valores extremos dentro de 1,5 IQR
+        low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        assert stats["lowerfence"][i] == v[v >= low].min()
+        assert stats["upperfence"][i] == v[v <= high].max()
+
+
+@pytest.mark.parametrize("max_outliers", [0, 1, 7, 40, 10_000])
+def test_box_outliers_are_capped_extremes(grouped, max_outliers):
+    values, groups, n_groups = grouped
+    stats = box_summaries(values, groups, n_groups, max_outliers=max_outliers)
+    for i in range(n_groups):
+        v = group_values(values, groups, i)
+        out = stats["outliers"][i]
+        outside = v[(v < stats["lowerfence"][i]) | (v > stats["upperfence"][i])] if len(v) else v
+        assert len(out) == min(len(outside), max_outliers)
+        # Só pontos fora das cercas, os mais distantes de cada lado
+        low, high = out[out < stats["q1"][i]], out[out > stats["q3"][i]]
+        np.testing.assert_array_equal(low, v[:len(low)])
+        np.testing.assert_array_equal(high, v[len(v) - len(high):])
+
+
+def test_kde_densities_integrate_to_one(grouped):
+    values, groups, n_groups = grouped
+    grids, densities = kde_summaries(values, groups, n_groups)
+    for i in range(n_groups):
+        v = group_values(values, groups, i)
+        if not len(v):
+            assert len(grids[i]) == 0 and len(densities[i]) == 0
+            continue
+        grid, density = grids[i], densities[i]
+        # Grade além do mín e do máx (caudas), densidade não negativa
+        assert grid[0] < v[0] and grid[-1] > v[-1]
+        assert (density >= 0).all()
+        area = np.sum((density[1:] + density[:-1]) / 2 * np.diff(grid))
+        assert area == pytest.approx(1.0, abs=0.05)
+
+
+def scatter_cases():
+    rng = np.random.default_rng(11)
+    n = 20000
+    # População x PIB como no app; muitos x repetidos; y com poucos extremos
+    yield rng.lognormal(9.3, 1.2, n), rng.lognormal(9.9, 0.55, n)
+    yield np.concatenate([np.full(15000, 5000.0), rng.lognormal(9, 1, 5000)]), rng.normal(0, 1, n)
+    y = rng.normal(0, 1, n)
+    y[rng.choice(n, 30, replace=False)] = rng.normal(0, 50, 30)
+    yield rng.uniform(1, 1e6, n), y
+
+
+@pytest.mark.parametrize("max_points", [4, 50, 2000, 19999])
+@pytest.mark.parametrize("case", range(3))
+def test_thin_scatter_fills_budget_and_keeps_extremes(case, max_points):
+    x, y = list(scatter_cases())[case]
+    rows = thin_scatter(x, y, max_points)
+    assert len(rows) == max_points
+    assert (np.diff(rows) > 0).all()
+    for extreme in (x.argmin(), x.argmax(), y.argmin(), y.argmax()):
+        assert extreme in rows
+
+
+def test_thin_scatter_keeps_everything_under_budget():
+    x, y = next(scatter_cases())
+    np.testing.assert_array_equal(thin_scatter(x[:500], y[:500], 500), np.arange(500))
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import synthetic_frame
+from ingest import normalize_frame
+from pipeline import clean_frame
+from timeseries import TimeSeriesStore
+
+# Taxas e agregados das séries contra o cálculo direto em pandas sobre as
+# colunas anuais do frame
+
+YEARS = [2018, 2019, 2020, 2021]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    df = synthetic_frame(3000, n_years=4, seed=9, missing=0.05)
+    df.loc[:9, "populacao_estimada_2018"] = 0.0
+    df.loc[10:19, "estado"] = np.nan
+    return clean_frame(normalize_frame(df))
+
+
+@pytest.fixture(scope="module")
+def store(frame):
+    return TimeSeriesStore(frame)
+
+
+@pytest.fixture(params=[None, "SP+MG", "min_pop"], ids=lambda p: p or "todos")
+def mask(request, frame):
+    if request.param is None:
+        return None
+    if request.param == "SP+MG":
+        return frame["estado"].isin(["SP", "MG"]).to_numpy()
+    return (frame["populacao_estimada_2019"].fillna(0) >= 20000).to_numpy()
+
+
+def pandas_growth(a, b):
+    return (b / a - 1).where(a > 0)
+
+
+def pandas_cagr(a, b, span):
+    return ((b / a) ** (1 / span) - 1).where((a > 0) & (b > 0))
+
+
+@pytest.mark.parametrize("start, end", [(2018, 2019), (2018, 2021), (2019, 2021)])
+@pytest.mark.parametrize("name, prefix", [("populacao", "populacao_estimada_"), ("pib", "pib_per_capita_")])
+def test_municipio_rates_match_pandas(store, frame, name, prefix, start, end):
+    a, b = frame[f"{prefix}{start}"].astype(np.float64), frame[f"{prefix}{end}"].astype(np.float64)
+    before = frame[f"{prefix}{end - 1}"].astype(np.float64)
+    rates = store.municipio_rates(name, start, end)
+    np.testing.assert_allclose(rates["crescimento"], pandas_growth(a, b), rtol=1e-12)
+    np.testing.assert_allclose(rates["cagr"], pandas_cagr(a, b, end - start), rtol=1e-12)
+    np.testing.assert_allclose(rates["variacao_ultimo_ano"], pandas_growth(before, b), rtol=1e-12)
+
+
+def test_first_year_has_no_last_change(store):
+    assert store.municipio_rates("populacao", 2018, 2018)["variacao_ultimo_ano"].isna().all()
+
+
+@pytest.mark.parametrize("how", ["sum", "mean"])
+@pytest.mark.parametrize("name, prefix", [("populacao", "populacao_estimada_"), ("pib", "pib_per_capita_")])
+def test_by_state_matches_groupby(store, frame, mask, name, prefix, how):
+    cols = [f"{prefix}{year}" for year in YEARS]
+    rows = frame if mask is None else frame[mask]
+    grouped = rows[cols].astype(np.float64).groupby(rows["estado"], observed=True)
+    expected = grouped.sum(min_count=1) if how == "sum" else grouped.mean()
+    expected = expected.dropna(how="all")
+
+    labels, matrix = store.by_state(name, mask, how)
+    assert list(labels) == list(expected.index)
+    np.testing.assert_allclose(matrix, expected.to_numpy(), rtol=1e-9)
+
+    rates = store.state_rates(name, 2018, 2021, mask, how)
+    a, b = expected[cols[0]], expected[cols[-1]]
+    np.testing.assert_allclose(rates["crescimento"], pandas_growth(a, b), rtol=1e-9)
+    np.testing.assert_allclose(rates["cagr"], pandas_cagr(a, b, 3), rtol=1e-9)
+    np.testing.assert_allclose(rates["variacao_ultimo_ano"], pandas_growth(expected[cols[-2]], b), rtol=1e-9)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import SEM_INFORMACAO, AggregateCube
+from ingest import csv_to_parquet
+from pipeline import PORTE_BINS, PORTE_LABELS
+from query import query_backend
+
+# O recorte do cubo e o dos backends SQL (mesma interface) devem devolver o
+# mesmo que o pandas do app original sobre as linhas filtradas (isin nos
+# estados, população ausente como 0): groupby sum/count/mean e, nos backends,
+# nlargest/nsmallest
+
+QUERY_BACKENDS = ["sqlite", "duckdb"]
+
+
+@pytest.fixture(scope="module")
+def snapshot_path(export_frame, tmp_path_factory):
+    csv_path = tmp_path_factory.mktemp("views") / "dados.csv"
+    export_frame.to_csv(csv_path, index=False)
+    return csv_to_parquet(str(csv_path))
+
+
+def query_factory(kind, snapshot_path, pop_col):
+    if kind == "duckdb":
+        pytest.importorskip("duckdb")
+    backend = query_backend(kind, snapshot_path)
+    return lambda estado_sel, min_pop: backend.view(estado_sel, pop_col, min_pop)
+
+
+@pytest.fixture(scope="module", params=["cubo"] + QUERY_BACKENDS)
+def view_factory(request, session_frame, snapshot_path, pop_col, metric_cols, bioma_col):
+    # (estado_sel, min_pop) -> recorte com n, total, sum, count e mean
+    if request.param == "cubo":
+        return AggregateCube(session_frame, pop_col, metric_cols, bioma_col).select
+    return query_factory(request.param, snapshot_path, pop_col)
+
+
+@pytest.fixture(scope="module", params=QUERY_BACKENDS)
+def query_view_factory(request, snapshot_path, pop_col):
+    return query_factory(request.param, snapshot_path, pop_col)
+
+
+def assert_series_close(actual, expected):
+    # O cubo lê as colunas em float32: PIB com 2 casas não é exato
+    assert list(actual.index) == list(expected.index)
+    np.testing.assert_allclose(actual.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64), rtol=1e-6)
+
+
+def test_totals_match_filtered_rows(view_factory, baseline_filtered, estado_sel, min_pop, pop_col):
+    view = view_factory(estado_sel, min_pop)
+    assert view.n() == len(baseline_filtered)
+    assert view.total(pop_col) == pytest.approx(baseline_filtered[pop_col].sum(), rel=1e-12)
+
+
+def test_by_estado_matches_groupby(view_factory, baseline_filtered, estado_sel, min_pop, metric_col):
+    view = view_factory(estado_sel, min_pop)
+    grouped = baseline_filtered.groupby("estado")[metric_col]
+    assert_series_close(view.sum(metric_col, "estado"), grouped.sum())
+    assert_series_close(view.count(metric_col, "estado"), grouped.count())
+    assert_series_close(view.mean(metric_col, "estado"), grouped.mean())
+
+
+def test_by_bioma_matches_groupby(view_factory, baseline_filtered, estado_sel, min_pop, metric_col, bioma_col):
+    view = view_factory(estado_sel, min_pop)
+    bioma = baseline_filtered[bioma_col].fillna(SEM_INFORMACAO)
+    grouped = baseline_filtered.groupby(bioma)[metric_col]
+    # Biomas em ordem alfabética e "Sem informação" no fim
+    by_order = dict(key=lambda idx: idx == SEM_INFORMACAO, kind="stable")
+    assert_series_close(view.sum(metric_col, "bioma"), grouped.sum().sort_index(**by_order))
+    assert_series_close(view.mean(metric_col, "bioma"), grouped.mean().sort_index(**by_order))
+
+
+def test_by_porte_matches_pd_cut(view_factory, baseline_filtered, estado_sel, min_pop, metric_col, pop_col):
+    view = view_factory(estado_sel, min_pop)
+    porte = pd.cut(baseline_filtered[pop_col], PORTE_BINS, labels=PORTE_LABELS)
+    expected = baseline_filtered.groupby(porte, observed=True)[metric_col].mean()
+    # Mesma ordem das faixas, só as presentes no recorte
+    assert_series_close(view.mean(metric_col, "porte"), expected.rename_axis("porte"))
+
+
+def test_top_k_matches_nlargest(query_view_factory, baseline_filtered, estado_sel, min_pop, metric_col):
+    view = query_view_factory(estado_sel, min_pop)
+    valid = baseline_filtered.dropna(subset=[metric_col])
+    for k in (1, 10, 15):
+        top = view.top_k(metric_col, k)
+        expected = valid.nlargest(k, metric_col)
+        np.testing.assert_array_equal(top.index.to_numpy(), expected.index.to_numpy())
+        np.testing.assert_array_equal(top["municipio"].to_numpy(), expected["municipio"].to_numpy())
+        np.testing.assert_array_equal(view.bottom_k(metric_col, k).index.to_numpy(),
+                                      valid.nsmallest(k, metric_col).index.to_numpy())
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from ingest import YEAR_PREFIXES
+
+# Indicador -> prefixo das colunas anuais no CSV largo
+SERIES_PREFIXES = {
+    "populacao": "populacao_estimada_",
+    "pib": "pib_per_capita_",
+    "idh": "idh_",
+}
+
+
+def year_columns(columns, prefix):
+    # [(ano, coluna)] em ordem de ano; colunas sem ano numérico são ignoradas
+    out = []
+    for col in columns:
+        if not col.startswith(prefix):
+            continue
+        try:
+            out.append((int(col[len(prefix):]), col))
+        except ValueError:
+            continue
+    return sorted(out)
+
+
+def series_columns(columns):
+    # Todas as colunas anuais conhecidas, para carregar o frame das séries
+    return [c for c in columns if c.startswith(YEAR_PREFIXES)]
+
+
+class YearSeries:
+    # Um indicador como matriz contígua (município × ano), montada uma vez na
+    # carga; as taxas abaixo são operações vetorizadas sobre colunas da matriz
+
+    def __init__(self, df, prefix):
+        cols = year_columns(df.columns, prefix)
+        self.years = np.array([year for year, _ in cols], dtype=np.int64)
+        self.columns = [col for _, col in cols]
+        self.values = np.empty((len(df), len(cols)), dtype=np.float64)
+        for j, col in enumerate(self.columns):
+            self.values[:, j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def year_pos(self, year):
+        pos = np.searchsorted(self.years, year)
+        if pos >= len(self.years) or self.years[pos] != year:
+            raise KeyError(year)
+        return pos
+
+    def yoy_pct(self, values=None):
+        values = self.values if values is None else values
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = values[:, 1:] / values[:, :-1] - 1.0
+        out[~(values[:, :-1] > 0)] = np.nan
+        return out
+
+    def last_change(self, end, values=None):
+        # Variação relativa do ano anterior da série até end; NaN no primeiro ano
+        values = self.values if values is None else values
+        pos = self.year_pos(end)
+        if pos == 0:
+            return np.full(len(values), np.nan)
+        return self.yoy_pct(values[:, pos - 1:pos + 1])[:, 0]
+
+    def growth(self, start, end, values=None):
+        # Crescimento total entre dois anos (0,10 = +10%)
+        values = self.values if values is None else values
+        a = values[:, self.year_pos(start)]
+        b = values[:, self.year_pos(end)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(a > 0, b / a - 1.0, np.nan)
+
+    def cagr(self, start, end, values=None):
+        # Taxa composta anual; NaN quando algum extremo é ausente ou não positivo
+        values = self.values if values is None else values
+        a = values[:, self.year_pos(start)]
+        b = values[:, self.year_pos(end)]
+        span = end - start
+        if span <= 0:
+            return np.full(len(a), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where((a > 0) & (b > 0), (b / a) ** (1.0 / span) - 1.0, np.nan)
+
+    def group_sums(self, codes, n_groups, mask=None):
+        # Soma e contagem de não ausentes por (grupo, ano), com uma única
+        # bincount sobre a matriz achatada
+        rows = np.flatnonzero(codes >= 0) if mask is None else np.flatnonzero(mask & (codes >= 0))
+        n_years = len(self.years)
+        values = self.values[rows]
+        cells = (codes[rows][:, None] * n_years + np.arange(n_years)).ravel()
+        flat = values.ravel()
+        present = ~np.isnan(flat)
+        size = n_groups * n_years
+        sums = np.bincount(cells[present], weights=flat[present], minlength=size)
+        counts = np.bincount(cells[present], minlength=size)
+        return sums.reshape(n_groups, n_years), counts.reshape(n_groups, n_years)
+
+
+class TimeSeriesStore:
+    # Séries anuais de todos os indicadores disponíveis, com agregação por
+    # estado. Totais (soma) fazem sentido para população; médias para PIB per
+    # capita e IDH.
+
+    def __init__(self, df, prefixes=SERIES_PREFIXES):
+        self.series = {}
+        for name, prefix in prefixes.items():
+            series = YearSeries(df, prefix)
+            if len(series.years):
+                self.series[name] = series
+        self.municipio = df["municipio"].to_numpy() if "municipio" in df.columns else None
+        estado = df["estado"].astype("category") if "estado" in df.columns else None
+        self.estados = list(estado.cat.categories) if estado is not None else []
+        self.estado_codes = (estado.cat.codes.to_numpy().astype(np.int64) if estado is not None
+                             else np.zeros(len(df), dtype=np.int64))
+
+    def __contains__(self, name):
+        return name in self.series
+
+    def years(self, name):
+        return self.series[name].years
+
+    def by_state(self, name, mask=None, how="sum"):
+        # Rótulos e matriz (estado × ano) do agregado; estados sem nenhum valor
+        # no recorte ficam de fora
+        series = self.series[name]
+        n_groups = max(len(self.estados), 1)
+        sums, counts = series.group_sums(self.estado_codes, n_groups, mask)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matrix = sums if how == "sum" else sums / counts
+        matrix = np.where(counts > 0, matrix, np.nan)
+        keep = counts.any(axis=1)
+        labels = np.array(self.estados or [""], dtype=object)[keep]
+        return labels, matrix[keep]
+
+    def state_long(self, name, mask=None, how="sum"):
+        labels, matrix = self.by_state(name, mask, how)
+        years = self.series[name].years
+        return pd.DataFrame({
+            "estado": np.repeat(labels, len(years)),
+            "ano": np.tile(years, len(labels)),
+            "valor": matrix.ravel(),
+        }).dropna(subset=["valor"])
+
+    def state_rates(self, name, start, end, mask=None, how="sum"):
+        # Crescimento, CAGR e variação do último ano do agregado de cada
+        # estado entre start e end
+        labels, matrix = self.by_state(name, mask, how)
+        series = self.series[name]
+        return pd.DataFrame({
+            "estado": labels,
+            "crescimento": series.growth(start, end, matrix),
+            "cagr": series.cagr(start, end, matrix),
+            "variacao_ultimo_ano": series.last_change(end, matrix),
+        })
+
+    def municipio_rates(self, name, start, end, mask=None):
+        # Crescimento, CAGR e variação do último ano do período para cada
+        # município do recorte
+        series = self.series[name]
+        rows = np.arange(len(series.values)) if mask is None else np.flatnonzero(mask)
+        values = series.values[rows]
+        return pd.DataFrame({
+            "municipio": self.municipio[rows] if self.municipio is not None else rows,
+            "estado": np.array(self.estados + [None], dtype=object)[self.estado_codes[rows]],
+            "inicio": values[:, series.year_pos(start)],
+            "fim": values[:, series.year_pos(end)],
+            "crescimento": series.growth(start, end, values),
+            "cagr": series.cagr(start, end, values),
+            "variacao_ultimo_ano": series.last_change(end, values),
+        }, index=rows)